@@ -1,14 +1,18 @@
 # backend/app/api/chat.py
-from fastapi import APIRouter, HTTPException
+import datetime
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from app.services.llm import ask_llm
+from app.services.metrics import stage
 from app.services.conversation_service import (
     create_new_chat, 
     save_chat_message, 
     get_user_chats, 
     get_chat_messages,
     update_chat_title,
-    delete_chat
+    delete_chat,
+    delete_all_user_chats,
+    get_delete_job
 )
 
 router = APIRouter()
@@ -36,7 +40,7 @@ class ChatTitleUpdate(BaseModel):
 @router.post("/new", response_model=NewChatResponse)
 async def create_chat(request: NewChatRequest):
     try:
-        chat_id = create_new_chat(request.user_id)
+        chat_id = await create_new_chat(request.user_id)
         return {"chat_id": chat_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating chat: {str(e)}")
@@ -46,40 +50,52 @@ async def chat_message(request: ChatRequest):
     try:
         # If no chat_id provided, create a new one
         if not request.chat_id:
-            chat_id = create_new_chat(request.user_id)
+            chat_id = await create_new_chat(request.user_id)
         else:
             chat_id = request.chat_id
 
         # Get AI response
-        reply = ask_llm(request.message)
+        with stage("llm"):
+            reply = await ask_llm(request.message, user_id=request.user_id)
         
         # Save conversation to Firestore
-        save_chat_message(request.user_id, chat_id, request.message, reply)
+        with stage("persist"):
+            await save_chat_message(request.user_id, chat_id, request.message, reply)
         
         return {"reply": reply, "chat_id": chat_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
 
 @router.get("/chats/{user_id}")
-async def get_chats(user_id: str):
+async def get_chats(user_id: str, limit: int = Query(20, ge=1, le=100), before: str = None):
     try:
-        chats = get_user_chats(user_id)
-        return {"chats": chats}
+        cursor = datetime.datetime.fromisoformat(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be an ISO timestamp")
+    try:
+        chats = await get_user_chats(user_id, limit=limit, before=cursor)
+        next_before = chats[-1]["updated_at"].isoformat() if chats and len(chats) == limit else None
+        return {"chats": chats, "next_before": next_before}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching chats: {str(e)}")
 
 @router.get("/messages/{user_id}/{chat_id}")
-async def get_messages(user_id: str, chat_id: str):
+async def get_messages(user_id: str, chat_id: str, before: str = None, limit: int = Query(None, ge=1, le=100)):
+    try:
+        cursor = datetime.datetime.fromisoformat(before) if before else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be an ISO timestamp")
     try:
-        messages = get_chat_messages(user_id, chat_id)
-        return {"messages": messages}
+        messages = await get_chat_messages(user_id, chat_id, limit=limit, before=cursor)
+        next_before = messages[0]["timestamp"].isoformat() if messages and len(messages) == limit else None
+        return {"messages": messages, "next_before": next_before}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching messages: {str(e)}")
 
 @router.put("/title")
 async def update_title(request: ChatTitleUpdate):
     try:
-        update_chat_title(request.user_id, request.chat_id, request.title)
+        await update_chat_title(request.user_id, request.chat_id, request.title)
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating title: {str(e)}")
@@ -87,7 +103,26 @@ async def update_title(request: ChatTitleUpdate):
 @router.delete("/{user_id}/{chat_id}")
 async def delete_user_chat(user_id: str, chat_id: str):
     try:
-        delete_chat(user_id, chat_id)
+        result = await delete_chat(user_id, chat_id)
+        if result.get("job_id"):
+            return {"status": "pending", "job_id": result["job_id"]}
         return {"status": "success"}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error deleting chat: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error deleting chat: {str(e)}")
+
+@router.delete("/{user_id}")
+async def delete_all_chats(user_id: str):
+    try:
+        result = await delete_all_user_chats(user_id)
+        if result.get("job_id"):
+            return {"status": "pending", "job_id": result["job_id"]}
+        return {"status": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting chats: {str(e)}")
+
+@router.get("/delete-jobs/{job_id}")
+async def delete_job_status(job_id: str):
+    job = get_delete_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown delete job")
+    return job
\ No newline at end of file
@@ -1,16 +1,29 @@
-from fastapi import APIRouter
-from ..services.llm import ask_llm
+from fastapi import APIRouter, Query, Request, Response
+from ..services.recipe_catalog import recipe_catalog
+from ..services.ingredient_index import get_ingredient_index
+from ..services.static_assets import etag_matches
+from ..services.taste_profiles import RERANK_POOL, personalize
 
 router = APIRouter()
 
 @router.get("/")
-def list_recipes():
-    prompt = (
-        "List 5 popular Indian recipes with their names and categories in JSON format. "
-        "Example: [{\"name\": \"Paneer Butter Masala\", \"category\": \"Main Course\"}, ...]"
-    )
-    try:
-        response = ask_llm(prompt)
-        return {"recipes": response}
-    except Exception as e:
-        return {"error": str(e)}
+async def list_recipes(request: Request, category: str = None, limit: int = None):
+    """Popular recipes from the cached catalog, optionally filtered."""
+    etag, body = recipe_catalog.snapshot().view(category, limit)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/by-ingredients")
+def recipes_by_ingredients(ingredients: str, limit: int = Query(10, ge=1, le=100), match: str = "any", user_id: str = None):
+    """Recipes for a comma-separated pantry, e.g. ?ingredients=chicken,rice,garlic
+
+    With user_id, equally good matches are ordered by the user's taste.
+    """
+    index = get_ingredient_index()
+    if index is None:
+        return {"error": "Ingredient index has not been built"}
+    pantry = [item for item in ingredients.split(",") if item.strip()]
+    pool = index.search(pantry, limit=limit * RERANK_POOL if user_id else limit, match=match)
+    return {"recipes": personalize(user_id, pool, limit, relevance=[r["coverage"] for r in pool])}
@@ -1,8 +1,30 @@
 # backend/app/api/users.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Body, Depends
+from ..services.firestore_db import UserProfile, get_user_profile
+from ..services.taste_profiles import get_taste_profiles
 
 router = APIRouter()
 
+async def _current_profile(user_id: str = "demo_user"):
+    # /me falls back to the demo account when no user_id is given
+    async for profile in get_user_profile(user_id):
+        yield profile
+
 @router.get("/me")
-def get_user():
-    return {"user": "demo_user", "preferences": []}
+async def get_user(profile: UserProfile = Depends(_current_profile)):
+    profiles = get_taste_profiles()
+    return {
+        "user": profile.user_id,
+        "preferences": await profile.get_preferences(),
+        "personalized": profiles is not None and profiles.has(profile.user_id),
+    }
+
+@router.put("/{user_id}/preferences")
+async def update_preferences(preferences: dict = Body(...), profile: UserProfile = Depends(get_user_profile)):
+    """Merge into the stored preferences. `favorite_recipes` and
+    `disliked_recipes` (lists of recipe names) feed the taste profile job."""
+    profile.set_preferences(preferences)
+    # Write before responding: the dependency's own flush runs after the
+    # response has gone out, too late to report a failure
+    await profile.flush()
+    return {"status": "success"}
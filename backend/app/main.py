@@ -1,14 +1,25 @@
 # backend/app/main.py
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.services.llm import ask_llm
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from app.services.llm import ask_llm, stream_llm, llm_flights, stream_flights, get_llm_client, StreamInterrupted
+from app.services.firestore_db import get_db
+from app.services.markdown import clean_all_markdown, clean_markdown_stream
+from app.services.llm_gateway import llm_gateway
+from app.services.context_builder import token_stats, get_encoding
+from app.services.metrics import RequestMetricsMiddleware, render as render_metrics, stage
+from app.services.static_assets import FrontendBundle
+from app.services.chat_export import export_chats, gzip_chunks, import_chats
+from app.services.taste_profiles import get_taste_profiles
+from app.services.retrieval import get_index, recipe_grounding
+from app.api import recipes, users
+from app.services.recipe_catalog import recipe_catalog
 from app.services.conversation_service import (
-    create_new_chat, get_user_chats, save_chat_message,
-    get_chat_messages, update_chat_title, delete_chat
+    create_new_chat, get_user_chats, queue_chat_message,
+    get_chat_messages, get_recent_messages, update_chat_title, delete_chat, write_queue,
+    delete_all_user_chats, get_delete_job
 )
-import os, re
+import os, json, datetime, asyncio
 
 app = FastAPI(title="Recipe Genie API")
 
@@ -19,73 +30,223 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.on_event("startup")
+async def start_write_queue():
+    write_queue.start()
+
+@app.on_event("startup")
+async def warm_recipe_catalog():
+    recipe_catalog.refresh_in_background()
+
+# Build the service clients in the background right after startup, so the
+# process starts serving immediately and the first chat doesn't pay for them
+PREWARM = os.getenv("PREWARM", "1").lower() not in ("0", "false", "no")
+_prewarm_tasks = set()
+
+async def prewarm():
+    steps = {"firestore": get_db, "openai": get_llm_client, "tokenizer": get_encoding,
+             "frontend": frontend.preload, "taste_profiles": get_taste_profiles,
+             "recipe_index": get_index}
+    results = await asyncio.gather(*(asyncio.to_thread(step) for step in steps.values()),
+                                   return_exceptions=True)
+    for name, result in zip(steps, results):
+        if isinstance(result, Exception):
+            print(f"Prewarm of {name} failed: {result}")
+
+@app.on_event("startup")
+async def start_prewarm():
+    if PREWARM:
+        task = asyncio.create_task(prewarm())
+        _prewarm_tasks.add(task)
+        task.add_done_callback(_prewarm_tasks.discard)
+
+@app.on_event("shutdown")
+async def flush_write_queue():
+    await write_queue.stop()
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Recipe Genie backend running ✅"}
 
 @app.post("/chat/new")
-def new_chat(request: dict):
+async def new_chat(request: dict):
     user_id = request.get("user_id")
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id is required")
-    return {"chat_id": create_new_chat(user_id)}
+    return {"chat_id": await create_new_chat(user_id)}
 
 @app.get("/chat/chats/{user_id}")
-def load_user_chats(user_id: str):
-    return {"chats": get_user_chats(user_id)}
+async def load_user_chats(user_id: str, limit: int = Query(20, ge=1, le=100), before: str = None):
+    cursor = None
+    if before:
+        try:
+            cursor = datetime.datetime.fromisoformat(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="before must be an ISO timestamp")
+    chats = await get_user_chats(user_id, limit=limit, before=cursor)
+    # Pass next_before back as ?before= to load the next page
+    next_before = chats[-1]["updated_at"].isoformat() if chats and len(chats) == limit else None
+    return {"chats": chats, "next_before": next_before}
 
 @app.get("/chat/messages/{user_id}/{chat_id}")
-def load_chat_messages(user_id: str, chat_id: str):
-    return {"messages": get_chat_messages(user_id, chat_id)}
+async def load_chat_messages(user_id: str, chat_id: str, before: str = None,
+                             limit: int = Query(None, ge=1, le=100)):
+    cursor = None
+    if before:
+        try:
+            cursor = datetime.datetime.fromisoformat(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="before must be an ISO timestamp")
+    messages = await get_chat_messages(user_id, chat_id, limit=limit, before=cursor)
+    # Pass next_before back as ?before= to load the previous page
+    next_before = messages[0]["timestamp"].isoformat() if messages and len(messages) == limit else None
+    return {"messages": messages, "next_before": next_before}
 
 @app.post("/chat/message")
-def send_message(request: dict, background_tasks: BackgroundTasks):
+async def send_message(request: dict):
     user_id = request.get("user_id")
     chat_id = request.get("chat_id")
     message = request.get("message")
     if not user_id or not message:
         raise HTTPException(status_code=400, detail="Missing fields")
-    history = get_chat_messages(user_id, chat_id) if chat_id else []
-    reply = ask_llm(message, history)
-    reply = clean_all_markdown(reply)
-    background_tasks.add_task(save_chat_message, user_id, chat_id, message, reply)
+    with stage("history"):
+        history = await get_recent_messages(user_id, chat_id) if chat_id else []
+    if not chat_id:
+        with stage("create_chat"):
+            chat_id = await create_new_chat(user_id)
+    grounding = await recipe_grounding(message, user_id)
+    with stage("llm"):
+        reply = await ask_llm(message, history, grounding=grounding, chat_key=(user_id, chat_id), user_id=user_id)
+    with stage("markdown"):
+        reply = clean_all_markdown(reply)
+    with stage("persist"):
+        await queue_chat_message(user_id, chat_id, message, reply, first_turn=not history)
     return {"reply": reply, "chat_id": chat_id}
 
-def clean_all_markdown(text: str):
-    if not text: return text
-    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)
-    text = re.sub(r"\*(.*?)\*", r"\1", text)
-    text = re.sub(r"_(.*?)_", r"\1", text)
-    text = re.sub(r"^#+\s*(.*?)$", r"\1", text, flags=re.MULTILINE)
-    text = re.sub(r"`(.*?)`", r"\1", text)
-    text = re.sub(r"\[(.*?)\]\(.*?\)", r"\1", text)
-    return text.strip()
+@app.post("/chat/message/stream")
+async def stream_message(request: dict):
+    """Stream the reply as NDJSON events: start, token..., then done, or
+    error if the model failed partway (the partial reply is not saved)."""
+    user_id = request.get("user_id")
+    chat_id = request.get("chat_id")
+    message = request.get("message")
+    if not user_id or not message:
+        raise HTTPException(status_code=400, detail="Missing fields")
+    if not chat_id:
+        with stage("create_chat"):
+            chat_id = await create_new_chat(user_id)
+    with stage("history"):
+        history = await get_recent_messages(user_id, chat_id)
+    grounding = await recipe_grounding(message, user_id)
+
+    async def events():
+        yield json.dumps({"type": "start", "chat_id": chat_id}) + "\n"
+        parts = []
+        try:
+            with stage("llm_stream"):
+                async for text in clean_markdown_stream(stream_llm(message, history, grounding=grounding, chat_key=(user_id, chat_id), user_id=user_id)):
+                    parts.append(text)
+                    yield json.dumps({"type": "token", "content": text}) + "\n"
+        except StreamInterrupted as e:
+            # The reply was cut short: tell the client and don't save half a turn
+            yield json.dumps({"type": "error", "chat_id": chat_id, "message": e.message}) + "\n"
+            return
+        reply = "".join(parts)
+        # Persist only once the full reply has been produced
+        with stage("persist"):
+            await queue_chat_message(user_id, chat_id, message, reply, first_turn=not history)
+        yield json.dumps({"type": "done", "chat_id": chat_id}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @app.put("/chat/title")
-def rename_chat(request: dict):
+async def rename_chat(request: dict):
     user_id, chat_id, title = request.get("user_id"), request.get("chat_id"), request.get("title")
     if not all([user_id, chat_id, title]):
         raise HTTPException(status_code=400, detail="Missing parameters")
-    update_chat_title(user_id, chat_id, title)
+    await update_chat_title(user_id, chat_id, title)
     return {"status": "success"}
 
 @app.delete("/chat/{user_id}/{chat_id}")
-def remove_chat(user_id: str, chat_id: str):
-    delete_chat(user_id, chat_id)
+async def remove_chat(user_id: str, chat_id: str):
+    result = await delete_chat(user_id, chat_id)
+    if result.get("job_id"):
+        return {"status": "pending", "job_id": result["job_id"]}
+    return {"status": "success"}
+
+@app.delete("/chat/{user_id}")
+async def remove_all_chats(user_id: str):
+    result = await delete_all_user_chats(user_id)
+    if result.get("job_id"):
+        return {"status": "pending", "job_id": result["job_id"]}
     return {"status": "success"}
 
+@app.get("/chat/export/{user_id}")
+async def export_user_chats(user_id: str, gzip: bool = False):
+    """Download every chat and message as NDJSON (gzipped with ?gzip=true)."""
+    filename = f"recipe-genie-chats-{user_id}.ndjson"
+    if gzip:
+        return StreamingResponse(gzip_chunks(export_chats(user_id)), media_type="application/gzip",
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'})
+    return StreamingResponse(export_chats(user_id), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/chat/import/{user_id}")
+async def import_user_chats(user_id: str, request: Request):
+    """Import an export (NDJSON, gzipped or not) posted as the request body."""
+    try:
+        result = await import_chats(user_id, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid export: {e}")
+    return {"status": "success", **result}
+
+@app.get("/chat/delete-jobs/{job_id}")
+async def delete_job_status(job_id: str):
+    job = get_delete_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown delete job")
+    return job
+
 @app.get("/health")
-def health():
+async def health():
     return {"status": "healthy"}
 
-# Serve React frontend
+@app.get("/health/ready")
+async def ready(db=Depends(get_db), llm_client=Depends(get_llm_client)):
+    """Ready once the Firestore and OpenAI clients exist (prewarmed, or built here)."""
+    return {"status": "ready"}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of counters, histograms and collectors."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/llm")
+async def llm_health():
+    """Gateway queue/wait metrics, coalescing counts and token usage."""
+    return {
+        "gateway": llm_gateway.stats(),
+        "coalescing": {"message": llm_flights.stats(), "stream": stream_flights.stats()},
+        "tokens": token_stats.stats(),
+    }
+
+app.include_router(recipes.router, prefix="/recipes")
+app.include_router(users.router, prefix="/users")
+
+# Serve React frontend from memory (see static_assets for the caching rules)
 frontend_path = os.path.join(os.path.dirname(__file__), "../../frontend/build")
-app.mount("/static", StaticFiles(directory=os.path.join(frontend_path, "static")), name="static")
-
-@app.get("/{full_path:path}")
-def serve_react(full_path: str):
-    index_file = os.path.join(frontend_path, "index.html")
-    if os.path.exists(index_file):
-        return FileResponse(index_file)
-    return {"message": "Frontend build not found"}
+frontend = FrontendBundle(frontend_path)
+
+# Sync routes: a file's first request may read and compress it
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+def serve_static(path: str, request: Request):
+    return frontend.response("static/" + path, request.headers)
+
+@app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+def serve_react(full_path: str, request: Request):
+    if not frontend.available:
+        return {"message": "Frontend build not found"}
+    # Build files (favicon, manifest, ...) as themselves, app routes get index.html
+    return frontend.response(full_path if frontend.has(full_path) else "index.html", request.headers)
@@ -0,0 +1,253 @@
+# backend/app/services/chat_export.py
+"""Streaming export and batched import of a user's chat history.
+
+The export is NDJSON: a header row, then each chat followed by its
+messages, oldest first.
+
+    {"type": "export", "format": "recipe-genie-chats", "version": 1, "user_id": ..., "exported_at": ...}
+    {"type": "chat", "id": ..., "title": ..., "created_at": ..., "updated_at": ..., "message_count": ...}
+    {"type": "message", "chat_id": ..., "id": ..., "sender": ..., "content": ..., "timestamp": ...}
+
+Chats and messages are read in pages with Firestore cursors and written
+out a page at a time, so memory stays flat however long the history is.
+Import reads the same format as a byte stream (gzipped or not) and writes
+it in batched commits. Document IDs are kept, so re-running an import
+after a failure overwrites instead of duplicating. The sidebar summaries
+are rebuilt from the imported chats on the next listing.
+
+Back up or migrate from the command line:
+
+    python -m app.services.chat_export export USER_ID -o chats.ndjson.gz
+    python -m app.services.chat_export import USER_ID chats.ndjson.gz
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import zlib
+
+from .firestore_db import db
+from .conversation_service import _chat_summaries, _forget_chat, _summary_ref
+
+EXPORT_FORMAT = "recipe-genie-chats"
+EXPORT_VERSION = 1
+PAGE_SIZE = 500
+# Firestore accepts at most 500 writes per batch
+IMPORT_BATCH_WRITES = 500
+
+_TIMESTAMP_FIELDS = ("created_at", "updated_at", "timestamp")
+
+
+def _conversations(user_id: str):
+    return db.collection("users").document(user_id).collection("conversations")
+
+
+def _json_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _row(data: dict) -> str:
+    return json.dumps(data, default=_json_value, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+async def _pages(query, page_size: int = PAGE_SIZE):
+    """Yield lists of snapshots, resuming each page after the last document."""
+    cursor = None
+    while True:
+        page = query.limit(page_size)
+        if cursor is not None:
+            page = page.start_after(cursor)
+        docs = [doc async for doc in page.stream()]
+        if docs:
+            yield docs
+        if len(docs) < page_size:
+            return
+        cursor = docs[-1]
+
+
+# ===================== Export =====================
+
+async def export_chats(user_id: str, page_size: int = PAGE_SIZE):
+    """Yield the NDJSON export of a user's chats, one text chunk per page."""
+    yield _row({
+        "type": "export", "format": EXPORT_FORMAT, "version": EXPORT_VERSION, "user_id": user_id,
+        "exported_at": datetime.datetime.now(datetime.timezone.utc),
+    })
+    async for chats in _pages(_conversations(user_id).order_by("__name__"), page_size):
+        for chat in chats:
+            chat_data = chat.to_dict()
+            # Chats waiting for the background delete are already gone for the user
+            if chat_data.get("deleted"):
+                continue
+            yield _row({
+                "type": "chat",
+                "id": chat.id,
+                "title": chat_data.get("title", "New Chat"),
+                "created_at": chat_data.get("created_at"),
+                "updated_at": chat_data.get("updated_at"),
+                "message_count": chat_data.get("message_count", 0),
+            })
+            messages = chat.reference.collection("messages").order_by("timestamp").order_by("__name__")
+            async for page in _pages(messages, page_size):
+                yield "".join(_row({"type": "message", "chat_id": chat.id, "id": doc.id, **doc.to_dict()})
+                              for doc in page)
+
+
+async def gzip_chunks(chunks):
+    """Gzip an async iterator of text chunks incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 16 + 15: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ===================== Import =====================
+
+async def _lines(byte_chunks):
+    """Decode an async iterator of (optionally gzipped) bytes into lines."""
+    decompressor = None
+    buffer = b""
+    first = True
+    async for data in byte_chunks:
+        if first and data:
+            first = False
+            if data[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(31)
+        if decompressor is not None:
+            data = decompressor.decompress(data)
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if decompressor is not None:
+        buffer += decompressor.flush()
+    if buffer:
+        yield buffer
+
+
+def _parse_timestamps(row: dict):
+    for field in _TIMESTAMP_FIELDS:
+        value = row.get(field)
+        if isinstance(value, str):
+            row[field] = datetime.datetime.fromisoformat(value)
+    return row
+
+
+class _ImportBatch:
+    """Buffers import writes and commits them 500 at a time."""
+
+    def __init__(self):
+        self.batch = db.batch()
+        self.size = 0
+        self.commits = 0
+
+    async def set(self, ref, data: dict, merge: bool = False):
+        if self.size >= IMPORT_BATCH_WRITES:
+            await self.commit()
+        self.batch.set(ref, data, merge=merge)
+        self.size += 1
+
+    async def commit(self):
+        if self.size:
+            await self.batch.commit()
+            self.commits += 1
+        self.batch, self.size = db.batch(), 0
+
+
+async def import_chats(user_id: str, byte_chunks) -> dict:
+    """Write an export (any async iterator of bytes) into user_id's chats.
+
+    Raises ValueError on a malformed row; batches before it may already
+    be committed, and importing the file again is safe.
+    """
+    conversations = _conversations(user_id)
+    batch = _ImportBatch()
+    chats = messages = 0
+    chat_id = None
+    # Summaries aren't written row by row, since an import can hold more
+    # chats than the summary document keeps. Clearing the marker in the
+    # first batch makes the next listing rebuild it, even after a failure.
+    await batch.set(_summary_ref(user_id), {"backfilled": False}, merge=True)
+
+    line_number = 0
+    try:
+        async for line in _lines(byte_chunks):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("row is not a JSON object")
+                row = _parse_timestamps(row)
+                kind = row.pop("type")
+                if kind == "export":
+                    if row.get("format") != EXPORT_FORMAT or row.get("version", 0) > EXPORT_VERSION:
+                        raise ValueError(f"unsupported export {row.get('format')} v{row.get('version')}")
+                elif kind == "chat":
+                    chat_id = row.pop("id")
+                    chat = {key: row.get(key) for key in ("title", "created_at", "updated_at", "message_count")}
+                    await batch.set(conversations.document(chat_id), {"id": chat_id, **chat})
+                    _forget_chat(user_id, chat_id)
+                    chats += 1
+                elif kind == "message":
+                    if row.pop("chat_id") != chat_id:
+                        raise ValueError("message does not follow its chat")
+                    message_id = row.pop("id", None)
+                    await batch.set(conversations.document(chat_id).collection("messages").document(message_id), row)
+                    messages += 1
+                else:
+                    raise ValueError(f"unknown row type {kind!r}")
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"line {line_number}: {e}") from None
+        await batch.commit()
+    finally:
+        _chat_summaries.pop(user_id)
+    return {"chats": chats, "messages": messages, "commits": batch.commits}
+
+
+# ===================== CLI =====================
+
+async def _read_file(path: str, chunk_size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while True:
+            data = await asyncio.to_thread(f.read, chunk_size)
+            if not data:
+                return
+            yield data
+
+
+async def _export_to_file(user_id: str, path: str):
+    chunks = export_chats(user_id)
+    if path.endswith(".gz"):
+        chunks = gzip_chunks(chunks)
+    with open(path, "wb") as f:
+        async for chunk in chunks:
+            f.write(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a user's chat history as NDJSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("user_id")
+    export_parser.add_argument("-o", "--out", required=True, help="output file; gzipped if it ends in .gz")
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("user_id")
+    import_parser.add_argument("path", help="NDJSON export, gzipped or not")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(_export_to_file(args.user_id, args.out))
+        print(f"Exported chats of {args.user_id} -> {args.out}")
+    else:
+        result = asyncio.run(import_chats(args.user_id, _read_file(args.path)))
+        print(f"Imported {result['chats']} chats, {result['messages']} messages in {result['commits']} commits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+# backend/app/services/context_builder.py
+"""Assemble the message list sent to the chat model.
+
+Messages are laid out from most to least stable: the fixed system prompt,
+then the chat's running summary, then recent history, then retrieved
+recipes and the new prompt. Providers cache prompts by prefix, so keeping
+the unchanging parts first lets consecutive requests share the cached part.
+
+History is fitted into HISTORY_TOKEN_BUDGET tokens, newest first. Turns
+that don't fit are folded into a rolling per-chat summary. A fold moves
+history down to HISTORY_REFILL of the budget, so the following turns
+append to an unchanged summary and the prefix stays cacheable until the
+next fold.
+"""
+import os
+import re
+import datetime
+import threading
+from functools import lru_cache
+
+from .cache import TTLCache
+
+# === Budgets (tokens) ===
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "200"))
+SUMMARY_LINE_CHARS = 120
+# Share of the history budget left in use after folding turns into the summary
+HISTORY_REFILL = 2 / 3
+
+# Chat-format overhead per message and for priming the reply (OpenAI cookbook)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# === Tokenizer ===
+# tiktoken is optional; without it, fall back to a word/punctuation estimate
+# that lands close to the real count for English text. Loaded on first use
+# (or by the startup prewarm); the BPE tables take a while to read.
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return sum(1 + len(word) // 8 for word in _WORD_RE.findall(text))
+
+
+def count_message_tokens(messages: list) -> int:
+    return sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in messages) + TOKENS_PER_REPLY
+
+
+# ===================== Summaries =====================
+
+# chat_key -> (timestamp of the newest folded message, summary lines)
+_summaries = TTLCache(maxsize=5000, ttl=6 * 3600)
+
+
+def _summary_line(message: dict) -> str:
+    # First non-empty line is the question, or the dish/intro of a reply
+    text = next((line.strip() for line in message["content"].splitlines() if line.strip()), "")
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rstrip() + "..."
+    speaker = "User" if message["role"] == "user" else "Assistant"
+    return f"- {speaker}: {text}"
+
+
+def _trim_summary(lines: list) -> list:
+    """The newest lines that fit in SUMMARY_TOKEN_BUDGET."""
+    kept, used = [], 0
+    for line in reversed(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > SUMMARY_TOKEN_BUDGET:
+            break
+        kept.append(line)
+        used += cost
+    kept.reverse()
+    return kept
+
+
+def _summary_text(lines: list) -> str:
+    return "Earlier in this conversation:\n" + "\n".join(lines) if lines else ""
+
+
+def summarize_turns(messages: list) -> str:
+    """Condense older messages into a few lines, newest kept when trimming."""
+    return _summary_text(_trim_summary([_summary_line(m) for m in messages]))
+
+
+# ===================== Usage tracking =====================
+
+class TokenStats:
+    """Running totals of the tokens each request sends and receives."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.summarized_requests = 0
+
+    def record(self, usage: dict):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.get("prompt_tokens") or usage["total"]
+            self.cached_prompt_tokens += usage.get("cached_prompt_tokens") or 0
+            self.completion_tokens += usage.get("completion_tokens") or 0
+            if usage["summarized_messages"]:
+                self.summarized_requests += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "avg_prompt_tokens": round(self.prompt_tokens / requests, 1),
+                "summarized_requests": self.summarized_requests,
+            }
+
+
+token_stats = TokenStats()
+
+
+# ===================== Builder =====================
+
+def fit_history(history: list, budget: int = None):
+    """Split history into (older, recent) so recent fits in `budget` tokens."""
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    used, cut = 0, len(history)
+    for i in range(len(history) - 1, -1, -1):
+        cost = count_tokens(history[i]["content"]) + TOKENS_PER_MESSAGE
+        if used + cost > budget:
+            break
+        used += cost
+        cut = i
+    return history[:cut], history[cut:]
+
+
+def _history_tokens(messages: list) -> int:
+    return sum(count_tokens(m["content"]) + TOKENS_PER_MESSAGE for m in messages)
+
+
+def _as_utc(value: datetime.datetime):
+    # Turns remembered in process carry naive utcnow() times; Firestore returns aware ones
+    return value.replace(tzinfo=datetime.timezone.utc) if value.tzinfo is None else value
+
+
+def _folded(message: dict, through) -> bool:
+    timestamp = message.get("timestamp")
+    return timestamp is not None and _as_utc(timestamp) <= through
+
+
+def split_history(history: list, chat_key=None):
+    """Return (summary, recent, summarized) for a chat's history.
+
+    With a chat_key the summary rolls: messages already folded into it are
+    skipped, and new ones are only folded when the rest overflows the
+    budget. Without one, everything that doesn't fit is summarized afresh.
+    """
+    if chat_key is None:
+        older, recent = fit_history(history)
+        return summarize_turns(older), recent, len(older)
+
+    state = _summaries.get(chat_key)
+    through, lines = state if state is not None else (None, [])
+    start = 0
+    if through is not None:
+        while start < len(history) and _folded(history[start], through):
+            start += 1
+    pending = history[start:]
+    if _history_tokens(pending) <= HISTORY_TOKEN_BUDGET:
+        return _summary_text(lines), pending, start
+
+    older, recent = fit_history(pending, int(HISTORY_TOKEN_BUDGET * HISTORY_REFILL))
+    lines = _trim_summary(lines + [_summary_line(m) for m in older])
+    if older[-1].get("timestamp") is not None:
+        _summaries.set(chat_key, (_as_utc(older[-1]["timestamp"]), lines))
+    return _summary_text(lines), recent, start + len(older)
+
+
+def build_context(system_prompt: str, prompt: str, history: list = None, context: list = None, chat_key=None):
+    """Return (messages, usage) for one chat completion request.
+
+    usage breaks the estimated input tokens down by section and counts how
+    many history messages were summarized rather than sent verbatim.
+    """
+    summary, recent, summarized = split_history(history or [], chat_key)
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": summary})
+    for msg in recent:
+        messages.append({"role": msg["role"], "content": msg["content"]})
+    context_text = ""
+    if context:
+        context_text = "Recipes from our collection that may help:\n\n" + "\n\n".join(context)
+        messages.append({"role": "system", "content": context_text})
+    messages.append({"role": "user", "content": prompt})
+
+    usage = {
+        "system": count_tokens(system_prompt),
+        "summary": count_tokens(summary),
+        "history": sum(count_tokens(m["content"]) for m in recent),
+        "context": count_tokens(context_text),
+        "prompt": count_tokens(prompt),
+        "total": count_message_tokens(messages),
+        "history_messages": len(recent),
+        "summarized_messages": summarized,
+    }
+    return messages, usage
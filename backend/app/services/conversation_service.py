@@ -1,110 +1,712 @@
 # backend/app/services/conversation_service.py
+import os
+import time
 import uuid
 import datetime
+import asyncio
+import threading
+from collections import OrderedDict, deque
 from .firestore_db import db, firestore
+from .cache import TTLCache
+from .metrics import stage, register_collector, cache_metrics
 
-def create_new_chat(user_id: str, title: str = "New Chat"):
+# === Chat summaries ===
+# users/{user_id}/meta/chat_summaries holds a `chats` map of chat_id ->
+# {title, created_at, updated_at, message_count, snippet}. It is written in
+# the same batch as every change to a chat, so the sidebar is one document
+# read, or none when the per-user cache below is warm.
+#
+# `backfilled: true` marks a map built from the conversations collection.
+# Chat writes merge into the document whether or not it exists, so its
+# existence alone doesn't say the map is complete. Only the newest
+# MAX_SUMMARIES chats are kept, so the document stays far below Firestore's
+# 1 MiB limit. `truncated: true` means older chats were dropped from the map,
+# and listing past them reads the conversations collection.
+SNIPPET_CHARS = 80
+MAX_SUMMARIES = 1000
+_chat_summaries = TTLCache(maxsize=5000, ttl=30)
+
+def _summary_ref(user_id: str):
+    return db.collection("users").document(user_id).collection("meta").document("chat_summaries")
+
+def _snippet(text: str):
+    text = " ".join(text.split())
+    return text[:SNIPPET_CHARS] + "..." if len(text) > SNIPPET_CHARS else text
+
+def _patch_cached_summary(user_id: str, chat_id: str, entry: dict = None):
+    """Apply a summary write to the cached copy; entry=None removes the chat."""
+    chats = _chat_summaries.get(user_id)
+    if chats is None:
+        return
+    if entry is None:
+        chats.pop(chat_id, None)
+        return
+    cached = chats.setdefault(chat_id, {"id": chat_id, "title": "New Chat", "message_count": 0})
+    for key, value in entry.items():
+        if isinstance(value, firestore.Increment):
+            cached[key] = cached.get(key, 0) + value.value
+        else:
+            cached[key] = value
+
+async def _load_summaries(user_id: str):
+    """The user's chat summaries (chat_id -> summary), backfilled on first use."""
+    chats = _chat_summaries.get(user_id)
+    if chats is not None:
+        return chats
+    doc = await _summary_ref(user_id).get()
+    data = doc.to_dict() if doc.exists else {}
+    chats = {
+        chat_id: {"id": chat_id, "title": "New Chat", "message_count": 0, **entry}
+        for chat_id, entry in (data.get("chats") or {}).items()
+    }
+    truncated = bool(data.get("truncated"))
+    if not data.get("backfilled"):
+        chats, truncated = await _backfill_summaries(user_id, chats)
+    elif len(chats) > MAX_SUMMARIES:
+        chats, truncated = await _prune_summaries(user_id, chats), True
+    chats = _SummaryMap(chats)
+    chats.truncated = truncated
+    _chat_summaries.set(user_id, chats)
+    # Turns still waiting in the write-behind queue aren't in Firestore yet
+    for turn in write_queue.pending_for(user_id):
+        _patch_cached_summary(user_id, turn["chat_id"], _pending_summary(turn))
+    return chats
+
+def _pending_summary(turn: dict):
+    summary = {
+        "updated_at": turn["timestamp"],
+        "message_count": firestore.Increment(1),
+        "snippet": _snippet(turn["bot_reply"]),
+    }
+    if turn["first_turn"]:
+        summary["title"] = _title_from(turn["user_message"])
+    return summary
+
+class _SummaryMap(dict):
+    """A user's cached summaries; `truncated` is True if older chats aren't in it."""
+    truncated = False
+
+def _summary_from_doc(doc):
+    chat_data = doc.to_dict()
+    return {
+        "id": doc.id,
+        "title": chat_data.get("title", "New Chat"),
+        "created_at": chat_data.get("created_at"),
+        "updated_at": chat_data.get("updated_at"),
+        "message_count": chat_data.get("message_count", 0),
+        "snippet": "",
+    }
+
+def _newest(chats: dict, count: int):
+    ordered = sorted(chats, key=lambda chat_id: _sort_key(chats[chat_id]), reverse=True)
+    return ordered[:count], ordered[count:]
+
+def _sort_key(chat: dict):
+    updated_at = chat.get("updated_at")
+    return _as_utc(updated_at) if updated_at is not None else datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+async def _backfill_summaries(user_id: str, existing: dict):
+    """Build the summary map from the conversations collection.
+
+    Runs once per user, the first time the map is read without the
+    `backfilled` marker. Entries already in the document were written by
+    newer chat changes, so they win over the collection's copy.
+    """
+    chats = {}
+    async for doc in db.collection("users").document(user_id).collection("conversations").stream():
+        if not doc.to_dict().get("deleted"):
+            chats[doc.id] = _summary_from_doc(doc)
+    for chat_id, entry in existing.items():
+        if chat_id in chats:
+            chats[chat_id].update(entry)
+    keep, dropped = _newest(chats, MAX_SUMMARIES)
+    chats = {chat_id: chats[chat_id] for chat_id in keep}
+    stored = {chat_id: {k: v for k, v in entry.items() if k != "id"} for chat_id, entry in chats.items()}
+    # Entries merged in by writes that didn't survive the cut must go too
+    for chat_id in existing:
+        if chat_id not in chats:
+            stored[chat_id] = firestore.DELETE_FIELD
+    await _summary_ref(user_id).set({"chats": stored, "backfilled": True, "truncated": bool(dropped)},
+                                    merge=True)
+    return chats, bool(dropped)
+
+async def _prune_summaries(user_id: str, chats: dict):
+    """Drop all but the newest MAX_SUMMARIES entries from the stored map."""
+    keep, dropped = _newest(chats, MAX_SUMMARIES)
+    await _summary_ref(user_id).set(
+        {"chats": {chat_id: firestore.DELETE_FIELD for chat_id in dropped}, "truncated": True}, merge=True)
+    return {chat_id: chats[chat_id] for chat_id in keep}
+
+async def create_new_chat(user_id: str, title: str = "New Chat"):
     """Create a new chat conversation"""
     chat_id = str(uuid.uuid4())
+    now = datetime.datetime.utcnow()
     chat_data = {
         "id": chat_id,
         "title": title,
-        "created_at": datetime.datetime.utcnow(),
-        "updated_at": datetime.datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
         "message_count": 0  # Initialize with 0 messages
     }
-    
-    db.collection("users").document(user_id).collection("conversations").document(chat_id).set(chat_data)
+    summary = {"title": title, "created_at": now, "updated_at": now, "message_count": 0, "snippet": ""}
+
+    batch = db.batch()
+    batch.set(db.collection("users").document(user_id).collection("conversations").document(chat_id), chat_data)
+    batch.set(_summary_ref(user_id), {"chats": {chat_id: summary}}, merge=True)
+    await batch.commit()
+    _patch_cached_summary(user_id, chat_id, summary)
+    with _recent_lock:
+        _seed_chat((user_id, chat_id))
     return chat_id
 
-def get_user_chats(user_id: str, limit: int = 20):
-    """Get user's recent chats"""
-    chats_ref = db.collection("users").document(user_id).collection("conversations")
-    docs = chats_ref.order_by("updated_at", direction=firestore.Query.DESCENDING).limit(limit).stream()
-    
-    chats = []
-    for doc in docs:
-        chat_data = doc.to_dict()
-        chat_data["id"] = doc.id
-        chats.append(chat_data)
-    
-    return chats
+async def get_user_chats(user_id: str, limit: int = 20, before: datetime.datetime = None):
+    """Get user's recent chats, newest first.
+
+    Pass the updated_at of the last chat of a page as `before` to get the
+    next page.
+    """
+    chats = await _load_summaries(user_id)
+    ordered = sorted(
+        (chat for chat in chats.values() if chat.get("updated_at") is not None),
+        key=lambda chat: _as_utc(chat["updated_at"]),
+        reverse=True,
+    )
+    if before is not None:
+        before = _as_utc(before)
+        ordered = [chat for chat in ordered if _as_utc(chat["updated_at"]) < before]
+    page = [dict(chat) for chat in ordered[:limit]]
+    if len(page) < limit and chats.truncated:
+        # Past the oldest summarized chat: page through the collection itself
+        oldest = min((_as_utc(chat["updated_at"]) for chat in chats.values() if chat.get("updated_at")),
+                     default=None)
+        cursor = min((value for value in (before, oldest) if value is not None), default=None)
+        page += await _older_chats(user_id, cursor, limit - len(page), skip=chats)
+    return page
+
+async def _older_chats(user_id: str, before, count: int, skip: dict):
+    query = (db.collection("users").document(user_id).collection("conversations")
+             .order_by("updated_at", direction=firestore.Query.DESCENDING))
+    found = []
+    while len(found) < count:
+        page_query = query.limit(count)
+        if before is not None:
+            page_query = page_query.start_after({"updated_at": before})
+        docs = [doc async for doc in page_query.stream()]
+        for doc in docs:
+            if doc.id not in skip and not doc.to_dict().get("deleted") and len(found) < count:
+                found.append(_summary_from_doc(doc))
+        if len(docs) < count:
+            break
+        before = docs[-1].to_dict()["updated_at"]
+    return found
 
-def update_chat_title(user_id: str, chat_id: str, title: str):
+def _as_utc(value: datetime.datetime):
+    # Naive datetimes in this module are UTC (utcnow); Firestore returns aware ones
+    return value.replace(tzinfo=datetime.timezone.utc) if value.tzinfo is None else value
+
+async def update_chat_title(user_id: str, chat_id: str, title: str):
     """Update chat title"""
     chat_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id)
-    chat_ref.update({
+    fields = {
         "title": title,
         "updated_at": datetime.datetime.utcnow()
-    })
+    }
+    batch = db.batch()
+    batch.update(chat_ref, fields)
+    batch.set(_summary_ref(user_id), {"chats": {chat_id: fields}}, merge=True)
+    await batch.commit()
+    _patch_cached_summary(user_id, chat_id, fields)
+
+# === Deletion ===
+# Firestore allows 500 writes per batch; several batches are committed at once
+DELETE_BATCH_SIZE = 500
+DELETE_CONCURRENCY = 4
+# Chats with more messages than this are deleted by a background job
+BACKGROUND_DELETE_MESSAGES = 1000
 
-def delete_chat(user_id: str, chat_id: str):
-    """Delete a chat and all its messages"""
+_delete_jobs = TTLCache(maxsize=1000, ttl=3600)
+_background_tasks = set()
+
+async def _delete_collection(collection_ref, progress: dict = None):
+    """Delete every document in a collection in concurrent 500-write batches.
+
+    Document references are listed page by page without reading their
+    contents, so memory stays bounded by the in-flight batches.
+    """
+    semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+    pending = set()
+    deleted = 0
+
+    async def commit(refs):
+        nonlocal deleted
+        try:
+            batch = db.batch()
+            for ref in refs:
+                batch.delete(ref)
+            await batch.commit()
+            deleted += len(refs)
+            if progress is not None:
+                progress["deleted_messages"] += len(refs)
+        finally:
+            semaphore.release()
+
+    refs = []
+    async for ref in collection_ref.list_documents(page_size=DELETE_BATCH_SIZE):
+        refs.append(ref)
+        if len(refs) == DELETE_BATCH_SIZE:
+            await semaphore.acquire()
+            pending.add(asyncio.create_task(commit(refs)))
+            refs = []
+    if refs:
+        await semaphore.acquire()
+        pending.add(asyncio.create_task(commit(refs)))
+    if pending:
+        # Surface the first failure once every batch has finished
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+    return deleted
+
+async def _delete_chat_now(user_id: str, chat_id: str, progress: dict = None):
     chat_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id)
-    
-    # Delete all messages in the chat
-    messages_ref = chat_ref.collection("messages")
-    docs = messages_ref.stream()
-    for doc in docs:
-        doc.reference.delete()
-    
-    # Delete the chat document
-    chat_ref.delete()
-
-def save_chat_message(user_id: str, chat_id: str, user_message: str, bot_reply: str):
-    """Save a complete chat message exchange"""
-    # Update chat metadata
+    # Delete all messages in the chat, then the chat document
+    await _delete_collection(chat_ref.collection("messages"), progress)
+    await chat_ref.delete()
+    if progress is not None:
+        progress["deleted_chats"] += 1
+
+def _start_delete_job(user_id: str, chat_ids, coro_factory):
+    job_id = uuid.uuid4().hex
+    progress = {
+        "job_id": job_id,
+        "user_id": user_id,
+        "chat_ids": chat_ids,
+        "status": "running",
+        "deleted_chats": 0,
+        "deleted_messages": 0,
+    }
+    _delete_jobs.set(job_id, progress)
+
+    async def run():
+        try:
+            await coro_factory(progress)
+            progress["status"] = "done"
+        except Exception as e:
+            print(f"Delete job {job_id} failed: {e}")
+            progress["status"] = "failed"
+            progress["error"] = str(e)
+
+    task = asyncio.get_running_loop().create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return progress
+
+def get_delete_job(job_id: str):
+    """Progress of a background deletion, or None if unknown or expired."""
+    return _delete_jobs.get(job_id)
+
+async def delete_chat(user_id: str, chat_id: str):
+    """Delete a chat and all its messages.
+
+    Small chats are deleted before returning. Large ones are marked deleted
+    straight away (so they drop out of listings) and removed by a background
+    job; the returned dict has the job_id to poll with get_delete_job.
+    """
     chat_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id)
-    
-    # Get current chat data to check if it's the first message
-    chat_doc = chat_ref.get()
-    
-    if not chat_doc.exists or chat_doc.to_dict().get("message_count", 0) == 0:
-        # This is the first message - generate title from user message
-        title = user_message[:30] + "..." if len(user_message) > 30 else user_message
-        chat_ref.set({
-            "id": chat_id,
-            "title": title,
-            "updated_at": datetime.datetime.utcnow(),
-            "message_count": 1,
-            "created_at": datetime.datetime.utcnow()
-        })
-    else:
-        # Update existing chat
-        chat_ref.update({
-            "updated_at": datetime.datetime.utcnow(),
-            "message_count": firestore.Increment(1)
-        })
-    
-    # Save the actual messages
+    _forget_chat(user_id, chat_id)
+    # A queued turn flushed after this would bring the chat back
+    write_queue.discard(user_id, chat_id)
+    chat_doc = await chat_ref.get()
+    # message_count counts turns; each turn is two messages
+    messages = 2 * (chat_doc.to_dict() or {}).get("message_count", 0) if chat_doc.exists else 0
+
+    # Drop it from the sidebar summary straight away
+    batch = db.batch()
+    batch.set(_summary_ref(user_id), {"chats": {chat_id: firestore.DELETE_FIELD}}, merge=True)
+    if messages > BACKGROUND_DELETE_MESSAGES:
+        batch.set(chat_ref, {"deleted": True, "updated_at": datetime.datetime.utcnow()}, merge=True)
+    await batch.commit()
+    _patch_cached_summary(user_id, chat_id, None)
+
+    if messages <= BACKGROUND_DELETE_MESSAGES:
+        await _delete_chat_now(user_id, chat_id)
+        return {"status": "done"}
+
+    job = _start_delete_job(user_id, [chat_id], lambda progress: _delete_chat_now(user_id, chat_id, progress))
+    return {"status": job["status"], "job_id": job["job_id"]}
+
+async def delete_all_user_chats(user_id: str):
+    """Delete every chat of a user in a background job; returns its progress."""
+    conversations_ref = db.collection("users").document(user_id).collection("conversations")
+    chat_ids = [ref.id async for ref in conversations_ref.list_documents()]
+    if not chat_ids:
+        return {"status": "done", "deleted_chats": 0}
+
+    write_queue.discard(user_id)
+    # Hide them from listings right away
+    await _summary_ref(user_id).delete()
+    _chat_summaries.pop(user_id)
+    for chat_ids_chunk in [chat_ids[i:i + DELETE_BATCH_SIZE] for i in range(0, len(chat_ids), DELETE_BATCH_SIZE)]:
+        batch = db.batch()
+        for chat_id in chat_ids_chunk:
+            batch.set(conversations_ref.document(chat_id), {"deleted": True}, merge=True)
+            _forget_chat(user_id, chat_id)
+        await batch.commit()
+
+    async def delete_all(progress):
+        # Chats are deleted DELETE_CONCURRENCY at a time, each with its own concurrent batches
+        semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+        async def delete_one(chat_id):
+            async with semaphore:
+                await _delete_chat_now(user_id, chat_id, progress)
+
+        for result in await asyncio.gather(*(delete_one(chat_id) for chat_id in chat_ids),
+                                           return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+
+    job = _start_delete_job(user_id, chat_ids, delete_all)
+    return {"status": job["status"], "job_id": job["job_id"]}
+
+def _title_from(user_message: str):
+    return user_message[:30] + "..." if len(user_message) > 30 else user_message
+
+def _turn_writes(chat_ref, chat_id: str, turns: list, first_turn: bool):
+    """Build the (ref, data, merge) writes for one or more turns of a single chat,
+    plus the chat's entry for the user's summary document.
+
+    Message IDs are derived from the turn ID, so replaying a commit after a
+    failure overwrites the same documents instead of duplicating them.
+    """
+    now = datetime.datetime.utcnow()
+    chat_data = {
+        "id": chat_id,
+        "updated_at": now,
+        "message_count": firestore.Increment(len(turns)),
+    }
+    if first_turn:
+        chat_data["title"] = _title_from(turns[0]["user_message"])
+        chat_data["created_at"] = now
+    writes = [(chat_ref, chat_data, True)]
+    summary = {k: v for k, v in chat_data.items() if k != "id"}
+    summary["snippet"] = _snippet(turns[-1]["bot_reply"])
+
     messages_ref = chat_ref.collection("messages")
-    
-    # Save user message
-    messages_ref.add({
-        "sender": "user",
-        "content": user_message,
-        "timestamp": datetime.datetime.utcnow()
-    })
-    
-    # Save bot reply
-    messages_ref.add({
-        "sender": "assistant",
-        "content": bot_reply,
+    for turn in turns:
+        timestamp = turn["timestamp"]
+        writes.append((messages_ref.document(f"{turn['turn_id']}-user"), {
+            "sender": "user",
+            "content": turn["user_message"],
+            "timestamp": timestamp
+        }, False))
+        writes.append((messages_ref.document(f"{turn['turn_id']}-assistant"), {
+            "sender": "assistant",
+            "content": turn["bot_reply"],
+            # Keep the reply strictly after the question when sorting
+            "timestamp": timestamp + datetime.timedelta(microseconds=1)
+        }, False))
+    return writes, summary
+
+def _is_first_turn(chat_doc):
+    return not chat_doc.exists or chat_doc.to_dict().get("message_count", 0) == 0
+
+def _new_turn(user_message: str, bot_reply: str, turn_id: str = None):
+    return {
+        "turn_id": turn_id or uuid.uuid4().hex,
+        "user_message": user_message,
+        "bot_reply": bot_reply,
         "timestamp": datetime.datetime.utcnow()
-    })
+    }
+
+async def save_chat_message(user_id: str, chat_id: str, user_message: str, bot_reply: str,
+                      first_turn: bool = None, turn_id: str = None):
+    """Save a complete chat message exchange in a single atomic commit.
+
+    Pass first_turn when the caller already knows whether the chat had any
+    history; otherwise it is looked up with one read.
+    """
+    chat_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id)
+    if first_turn is None:
+        first_turn = _is_first_turn(await chat_ref.get())
+
+    batch = db.batch()
+    turn = _new_turn(user_message, bot_reply, turn_id)
+    writes, summary = _turn_writes(chat_ref, chat_id, [turn], first_turn)
+    for ref, data, merge in writes:
+        batch.set(ref, data, merge=merge)
+    batch.set(_summary_ref(user_id), {"chats": {chat_id: summary}}, merge=True)
+    await batch.commit()
+    _remember_turn(user_id, chat_id, turn, first_turn)
+    _patch_cached_summary(user_id, chat_id, summary)
+
+class ChatWriteQueue:
+    """Write-behind queue that coalesces chat turns into bulk commits.
+
+    Turns from any number of users are buffered and flushed every
+    flush_interval seconds (or sooner once a full batch is waiting), with
+    several turns for the same chat folded into one metadata write.
+    """
+
+    # Firestore accepts at most 500 writes per batch
+    MAX_BATCH_WRITES = 500
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, flush_interval: float = 0.1):
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+
+    async def put(self, user_id: str, chat_id: str, user_message: str, bot_reply: str,
+                  first_turn: bool = None, turn_id: str = None):
+        turn = _new_turn(user_message, bot_reply, turn_id)
+        turn.update({"user_id": user_id, "chat_id": chat_id, "first_turn": first_turn, "attempts": 0})
+        # Update the caches now so the next turn and the sidebar see this
+        # one before the flush
+        _remember_turn(user_id, chat_id, turn, first_turn)
+        _patch_cached_summary(user_id, chat_id, _pending_summary(turn))
+        self._pending.append(turn)
+        if self._task is None:
+            # Nothing is draining the queue, so write it through now
+            await self.flush()
+        elif len(self._pending) * 2 >= self.MAX_BATCH_WRITES:
+            self._wakeup.set()
+
+    def start(self):
+        """Start the background flusher on the running event loop."""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out anything still queued, retries included."""
+        if self._task is not None:
+            # Let a flush in progress finish rather than cancel it mid-commit
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # Failed batches re-queue their turns until MAX_ATTEMPTS, so this ends
+        while self._pending:
+            await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Chat write queue flush failed: {e}")
+
+    def pending_for(self, user_id: str):
+        return [turn for turn in self._pending if turn["user_id"] == user_id]
 
-def get_chat_messages(user_id: str, chat_id: str):
-    """Get all messages for a specific chat"""
+    def discard(self, user_id: str, chat_id: str = None):
+        """Drop queued turns of one chat, or of every chat of the user."""
+        self._pending = [
+            turn for turn in self._pending
+            if turn["user_id"] != user_id or (chat_id is not None and turn["chat_id"] != chat_id)
+        ]
+
+    async def flush(self):
+        turns, self._pending = self._pending, []
+        if not turns:
+            return
+        with stage("firestore_flush"):
+            try:
+                await self._flush(turns)
+            except Exception as e:
+                # Failed before any batch was committed: every turn is still unwritten
+                self._requeue(turns, e)
+
+    def _requeue(self, turns: list, error: Exception):
+        retry = [turn for turn in turns if turn["attempts"] + 1 < self.MAX_ATTEMPTS]
+        for turn in retry:
+            turn["attempts"] += 1
+        print(f"Chat write batch failed ({len(turns)} turns, retrying {len(retry)}): {error}")
+        self._pending[:0] = retry
+
+    async def _flush(self, turns: list):
+
+        # Group turns by chat, preserving arrival order
+        chats = {}
+        for turn in turns:
+            chats.setdefault((turn["user_id"], turn["chat_id"]), []).append(turn)
+
+        # Resolve unknown first-turn flags with a single multi-document read
+        refs = {
+            key: db.collection("users").document(key[0]).collection("conversations").document(key[1])
+            for key in chats
+        }
+        unknown = [refs[key] for key, chat_turns in chats.items() if chat_turns[0]["first_turn"] is None]
+        first_turns = {}
+        if unknown:
+            async for doc in db.get_all(unknown):
+                first_turns[doc.reference.path] = _is_first_turn(doc)
+
+        # Batches are all built before any is committed, so an error up to
+        # the gather below means nothing was written
+        commits = []
+        batch, batch_turns, summaries, size = db.batch(), [], {}, 0
+        for key, chat_turns in chats.items():
+            user_id, chat_id = key
+            first_turn = chat_turns[0]["first_turn"]
+            if first_turn is None:
+                first_turn = first_turns.get(refs[key].path, True)
+            writes, summary = _turn_writes(refs[key], chat_id, chat_turns, first_turn)
+            # One summary write per user per batch, shared by all their chats
+            needed = len(writes) + (user_id not in summaries)
+            if size and size + needed > self.MAX_BATCH_WRITES:
+                commits.append((batch, batch_turns, summaries))
+                batch, batch_turns, summaries, size = db.batch(), [], {}, 0
+                needed = len(writes) + 1
+            for ref, data, merge in writes:
+                batch.set(ref, data, merge=merge)
+            summaries.setdefault(user_id, {})[chat_id] = summary
+            batch_turns.extend(chat_turns)
+            size += needed
+        if size:
+            commits.append((batch, batch_turns, summaries))
+        await asyncio.gather(*(self._commit(*commit) for commit in commits))
+
+    async def _commit(self, batch, turns, summaries):
+        """Commit one batch; never raises, failed turns go back on the queue."""
+        try:
+            for user_id, entries in summaries.items():
+                batch.set(_summary_ref(user_id), {"chats": entries}, merge=True)
+            await batch.commit()
+            # Cached summaries may have been loaded before this commit landed
+            for user_id in summaries:
+                _chat_summaries.pop(user_id)
+        except Exception as e:
+            # A failed batch wrote nothing, so the turns can be retried as-is
+            self._requeue(turns, e)
+
+write_queue = ChatWriteQueue()
+
+async def queue_chat_message(user_id: str, chat_id: str, user_message: str, bot_reply: str,
+                             first_turn: bool = None, turn_id: str = None):
+    """Hand a chat exchange to the write-behind queue."""
+    await write_queue.put(user_id, chat_id, user_message, bot_reply, first_turn, turn_id)
+
+def _message_from_doc(message_data: dict):
+    return {
+        "role": message_data["sender"],
+        "content": message_data["content"],
+        "timestamp": message_data["timestamp"]
+    }
+
+async def get_chat_messages(user_id: str, chat_id: str, limit: int = None, before: datetime.datetime = None):
+    """Get messages for a specific chat, oldest first.
+
+    Without limit/before every message is returned. With them, only the
+    newest `limit` messages older than `before` are fetched, which is how
+    the UI pages backwards through long chats.
+    """
     messages_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id).collection("messages")
-    docs = messages_ref.order_by("timestamp").stream()
-    
-    messages = []
-    for doc in docs:
-        message_data = doc.to_dict()
-        messages.append({
-            "role": message_data["sender"],
-            "content": message_data["content"],
-            "timestamp": message_data["timestamp"]
-        })
-    
-    return messages
\ No newline at end of file
+    if limit is None and before is None:
+        return [_message_from_doc(doc.to_dict()) async for doc in messages_ref.order_by("timestamp").stream()]
+
+    query = messages_ref.order_by("timestamp", direction=firestore.Query.DESCENDING)
+    if before is not None:
+        query = query.start_after({"timestamp": before})
+    if limit is not None:
+        query = query.limit(limit)
+    messages = [_message_from_doc(doc.to_dict()) async for doc in query.stream()]
+    messages.reverse()
+    return messages
+
+# === Recent-history cache ===
+# The LLM is given the last HISTORY_WINDOW messages, so keep that tail per
+# chat in process and append new turns to it instead of re-reading. The
+# window is wider than the token budget usually holds, so it is the budget
+# that decides which turns go into the context builder's summary.
+# Turns handled by other workers or instances only show up on a reload, so
+# an entry is reloaded once it is RECENT_MESSAGES_TTL seconds old.
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "40"))
+RECENT_MESSAGES_TTL = float(os.getenv("RECENT_MESSAGES_TTL", "30"))
+MAX_CACHED_CHATS = 2000
+_recent_messages = OrderedDict()  # (user_id, chat_id) -> (loaded at, deque of messages)
+_recent_lock = threading.Lock()
+_recent_stats = {"hits": 0, "misses": 0}
+
+async def get_recent_messages(user_id: str, chat_id: str, limit: int = HISTORY_WINDOW):
+    """Get the last `limit` (at most HISTORY_WINDOW) messages of a chat.
+
+    Served from the in-process cache when possible, otherwise with a single
+    bounded query, so the cost doesn't grow with the length of the chat.
+    """
+    key = (user_id, chat_id)
+    with _recent_lock:
+        entry = _recent_messages.get(key)
+        if entry is not None and time.monotonic() - entry[0] < RECENT_MESSAGES_TTL:
+            _recent_messages.move_to_end(key)
+            _recent_stats["hits"] += 1
+            return list(entry[1])[-limit:]
+        _recent_stats["misses"] += 1
+
+    # Turns in the write-behind queue aren't in Firestore yet. Look before and
+    # after the query so a turn flushed in between is still seen once.
+    queued = {id(turn): turn for turn in write_queue.pending_for(user_id) if turn["chat_id"] == chat_id}
+    messages = await get_chat_messages(user_id, chat_id, limit=HISTORY_WINDOW)
+    queued.update((id(turn), turn) for turn in write_queue.pending_for(user_id) if turn["chat_id"] == chat_id)
+    with _recent_lock:
+        cached = _seed_chat(key)
+        cached.extend(messages)
+        newest = _as_utc(messages[-1]["timestamp"]) if messages else None
+        for turn in sorted(queued.values(), key=lambda turn: _as_utc(turn["timestamp"])):
+            if newest is None or _as_utc(turn["timestamp"]) > newest:
+                cached.extend(_turn_messages(turn))
+        return list(cached)[-limit:]
+
+def _seed_chat(key):
+    # Caller holds _recent_lock
+    cached = deque(maxlen=HISTORY_WINDOW)
+    _recent_messages[key] = (time.monotonic(), cached)
+    _recent_messages.move_to_end(key)
+    if len(_recent_messages) > MAX_CACHED_CHATS:
+        _recent_messages.popitem(last=False)
+    return cached
+
+def _turn_messages(turn: dict):
+    return [
+        {"role": "user", "content": turn["user_message"], "timestamp": turn["timestamp"]},
+        {
+            "role": "assistant",
+            "content": turn["bot_reply"],
+            "timestamp": turn["timestamp"] + datetime.timedelta(microseconds=1)
+        },
+    ]
+
+def _remember_turn(user_id: str, chat_id: str, turn: dict, first_turn: bool):
+    key = (user_id, chat_id)
+    with _recent_lock:
+        entry = _recent_messages.get(key)
+        if entry is None:
+            if not first_turn:
+                # Unknown history; the next read loads it, queued turns included
+                return
+            cached = _seed_chat(key)
+        else:
+            cached = entry[1]
+        cached.extend(_turn_messages(turn))
+
+def _forget_chat(user_id: str, chat_id: str):
+    with _recent_lock:
+        _recent_messages.pop((user_id, chat_id), None)
+
+@register_collector
+def _collect_metrics():
+    return (
+        cache_metrics("chat_summaries", _chat_summaries.stats())
+        + cache_metrics("recent_messages", {**_recent_stats, "size": len(_recent_messages)})
+        + [("recipe_genie_write_queue_pending", "gauge", "Chat turns waiting for the write-behind flush",
+            [({}, len(write_queue._pending))])]
+    )
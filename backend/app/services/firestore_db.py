@@ -1,27 +1,328 @@
+import copy
 import datetime
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
 
-# === Determine the correct Firebase credentials path ===
-# Use Render's mounted secret file if available, otherwise fall back to local.
-cred_path = "/etc/secrets/serviceAccountKey.json"
-if not os.path.exists(cred_path):
-    current_dir = os.path.dirname(__file__)
-    cred_path = os.path.join(current_dir, "serviceAccountKey.json")
+from .cache import TTLCache
+from .metrics import FIRESTORE_OPS, Counter, register_collector, cache_metrics
 
-# === Initialize Firebase only once ===
-if not firebase_admin._apps:
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
+# === Pick the Firestore backend ===
+# FIRESTORE_BACKEND=memory runs against an in-process fake (local dev and
+# benchmarks); anything else uses the real async Firestore client.
+FIRESTORE_BACKEND = os.getenv("FIRESTORE_BACKEND", "firebase").lower()
 
-# Firestore client
-db = firestore.client()
+
+def _connect():
+    """Create the configured client; returns (client, module holding its sentinels)."""
+    if FIRESTORE_BACKEND == "memory":
+        from . import memory_firestore
+
+        return memory_firestore.AsyncClient(), memory_firestore
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore, firestore_async
+
+    # === Determine the correct Firebase credentials path ===
+    # Use Render's mounted secret file if available, otherwise fall back to local.
+    cred_path = "/etc/secrets/serviceAccountKey.json"
+    if not os.path.exists(cred_path):
+        current_dir = os.path.dirname(__file__)
+        cred_path = os.path.join(current_dir, "serviceAccountKey.json")
+
+    # === Initialize Firebase only once ===
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(cred_path)
+        firebase_admin.initialize_app(cred)
+
+    # Async Firestore client, so requests never block the event loop
+    return firestore_async.client(), firestore
+
+
+# ===================== Client =====================
+# The client is created on first use (or by the startup prewarm) instead of
+# at import, since importing firebase_admin is a large part of a cold start.
+
+_client = None
+_module = None
+_client_lock = threading.Lock()
+
+
+def get_db():
+    """The shared Firestore client; also usable as a FastAPI dependency."""
+    global _client, _module
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client, _module = _connect()
+                _client = _Tracked(client)
+    return _client
+
+
+def get_firestore_module():
+    """Module with the sentinels (Increment, SERVER_TIMESTAMP, ...) for the client."""
+    get_db()
+    return _module
+
+
+def set_db(client, module):
+    """Use `client` and its sentinel `module` (e.g. memory_firestore in tests)."""
+    global _client, _module
+    with _client_lock:
+        _client, _module = _Tracked(client), module
+    _profiles.clear()
+
+
+class _Deferred:
+    """Stands in for an object that is only created when first used."""
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+# Module-level names kept for existing callers; both resolve lazily
+db = _Deferred(get_db)
+firestore = _Deferred(get_firestore_module)
+
+
+# ===================== Read/write accounting =====================
+# db is wrapped so every document read and write is counted in
+# recipe_genie_firestore_ops_total without touching each call site.
+
+_CHAINED = {
+    "collection", "document", "where", "order_by", "limit", "limit_to_last", "offset",
+    "select", "start_at", "start_after", "end_at", "end_before", "parent",
+}
+_WRITES = {"set", "update", "delete", "create"}
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, _Tracked) else value
+
+
+class _Tracked:
+    """Proxy for the client, references and queries that counts reads/writes."""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == "parent":
+            return _Tracked(attr)
+        if not callable(attr):
+            return attr
+        if name in _CHAINED:
+            return lambda *args, **kwargs: _Tracked(attr(*args, **kwargs))
+        if name == "batch":
+            return lambda *args, **kwargs: _TrackedBatch(attr(*args, **kwargs))
+        if name == "get":
+            return lambda *args, **kwargs: self._get(attr, *args, **kwargs)
+        if name == "stream":
+            return lambda *args, **kwargs: self._count_docs(attr(*args, **kwargs))
+        if name == "get_all":
+            return lambda references, *args, **kwargs: self._count_docs(
+                attr([_unwrap(ref) for ref in references], *args, **kwargs))
+        if name in _WRITES or name == "add":
+            return lambda *args, **kwargs: self._write(attr, *args, **kwargs)
+        return attr
+
+    async def _get(self, method, *args, **kwargs):
+        result = await method(*args, **kwargs)
+        FIRESTORE_OPS.inc(len(result) if isinstance(result, list) else 1, op="read")
+        return result
+
+    async def _count_docs(self, docs):
+        async for doc in docs:
+            FIRESTORE_OPS.inc(op="read")
+            yield doc
+
+    async def _write(self, method, *args, **kwargs):
+        result = await method(*args, **kwargs)
+        FIRESTORE_OPS.inc(op="write")
+        return result
+
+
+class _TrackedBatch:
+    def __init__(self, batch):
+        self._batch = batch
+        self._writes = 0
+
+    def __len__(self):
+        return self._writes
+
+    def __getattr__(self, name):
+        attr = getattr(self._batch, name)
+        if name in _WRITES:
+            def write(reference, *args, **kwargs):
+                self._writes += 1
+                return attr(_unwrap(reference), *args, **kwargs)
+            return write
+        return attr
+
+    async def commit(self):
+        result = await self._batch.commit()
+        FIRESTORE_OPS.inc(self._writes, op="write")
+        FIRESTORE_OPS.inc(op="commit")
+        return result
+
+
+# ===================== User profiles =====================
+# users/{user_id} holds the user's `preferences` and conversation `state`.
+# A UserProfile is one request's view of that document: it is read at most
+# once (and usually not at all, from the short-TTL cache below), and every
+# change made during the request goes out as one set(merge=True) when the
+# request ends. The cache is updated with each write, and dropped on a
+# failed one, so this process reads its own writes; other instances catch
+# up within the TTL.
+
+_profiles = TTLCache(maxsize=5000, ttl=float(os.getenv("USER_PROFILE_TTL", "30")))
+PROFILE_OPS = Counter("recipe_genie_user_profile_ops_total",
+                      "User profile loads and field updates vs. the Firestore reads and writes they cost")
+class _Delete:
+    """Marks a field for removal; survives the deep copies below."""
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+_DELETE = _Delete()
+
+
+def _user_ref(user_id: str):
+    return db.collection("users").document(user_id)
+
+
+def _merge_fields(target: dict, updates: dict):
+    """Apply a merge patch the way set(merge=True) does: maps merge, _DELETE removes."""
+    for key, value in updates.items():
+        if value is _DELETE:
+            target.pop(key, None)
+        elif isinstance(value, dict) and value:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            _merge_fields(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+def _to_firestore(value):
+    if value is _DELETE:
+        return firestore.DELETE_FIELD
+    if isinstance(value, dict):
+        return {key: _to_firestore(item) for key, item in value.items()}
+    return value
+
+
+class UserProfile:
+    """Batched, cached access to users/{user_id}; use with `async with`.
+
+    set_preferences/set_state merge into the stored maps, as the old
+    one-write-per-call helpers did; clear_state removes the field.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self._data = None      # this request's view, pending changes included
+        self._pending = {}     # field -> merge patch value or _DELETE
+        self._replaced = set() # fields cleared and then set again
+
+    async def load(self) -> dict:
+        if self._data is None:
+            PROFILE_OPS.inc(op="load")
+            stored = _profiles.get(self.user_id)
+            if stored is None:
+                doc = await _user_ref(self.user_id).get()
+                PROFILE_OPS.inc(op="read")
+                stored = doc.to_dict() if doc.exists else {}
+                _profiles.set(self.user_id, stored)
+            self._data = copy.deepcopy(stored)
+            _merge_fields(self._data, self._pending)
+        return self._data
+
+    async def get_preferences(self) -> dict:
+        return (await self.load()).get("preferences", {})
+
+    async def get_state(self) -> dict:
+        return (await self.load()).get("state", {})
+
+    def set_preferences(self, preferences: dict):
+        self._stage("preferences", preferences)
+
+    def set_state(self, state: dict):
+        self._stage("state", state)
+
+    def clear_state(self):
+        self._stage("state", _DELETE)
+
+    def _stage(self, field: str, value):
+        PROFILE_OPS.inc(op="field_update")
+        previous = self._pending.get(field)
+        if previous is _DELETE and value is not _DELETE:
+            self._replaced.add(field)
+        if isinstance(previous, dict) and isinstance(value, dict):
+            patch = copy.deepcopy(previous)
+            _merge_fields(patch, value)
+            value = patch
+        self._pending[field] = copy.deepcopy(value)
+        if self._data is not None:
+            _merge_fields(self._data, {field: value})
+
+    async def flush(self):
+        """Write every pending change in one set(merge=True)."""
+        if not self._pending:
+            return
+        patch = self._pending
+        if self._replaced:
+            # A merge can't replace a map, so delete the stored keys the new
+            # value doesn't have
+            stored = _profiles.get(self.user_id)
+            if stored is None:
+                doc = await _user_ref(self.user_id).get()
+                PROFILE_OPS.inc(op="read")
+                stored = doc.to_dict() if doc.exists else {}
+            patch = dict(patch)
+            for field in self._replaced:
+                old = stored.get(field)
+                if isinstance(old, dict) and isinstance(patch.get(field), dict):
+                    patch[field] = {**{key: _DELETE for key in old}, **patch[field]}
+        self._pending, self._replaced = {}, set()
+        try:
+            await _user_ref(self.user_id).set(_to_firestore(patch), merge=True)
+        except Exception:
+            _profiles.pop(self.user_id)
+            raise
+        PROFILE_OPS.inc(op="write")
+        stored = _profiles.get(self.user_id)
+        if stored is not None:
+            updated = copy.deepcopy(stored)
+            _merge_fields(updated, patch)
+            _profiles.set(self.user_id, updated)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.flush()
+
+
+async def get_user_profile(user_id: str):
+    """FastAPI dependency: the request's UserProfile, flushed after the handler."""
+    async with UserProfile(user_id) as profile:
+        yield profile
+
+
+@register_collector
+def _collect_metrics():
+    return cache_metrics("user_profiles", _profiles.stats())
 
 
 # ===================== Utility Functions =====================
 
-def save_chat(user_id: str, chat_id: str, user_message: str, bot_reply: str):
+async def save_chat(user_id: str, chat_id: str, user_message: str, bot_reply: str):
     chat_ref = (
         db.collection("users")
         .document(user_id)
@@ -31,84 +332,80 @@ def save_chat(user_id: str, chat_id: str, user_message: str, bot_reply: str):
     )
 
     # Save user message
-    chat_ref.add({
+    await chat_ref.add({
         "sender": "user",
         "message": user_message,
         "timestamp": datetime.datetime.utcnow()
     })
 
     # Save bot reply
-    chat_ref.add({
+    await chat_ref.add({
         "sender": "bot",
         "message": bot_reply,
         "timestamp": datetime.datetime.utcnow()
     })
 
 
-def save_user_preferences(user_id: str, preferences: dict):
+async def save_user_preferences(user_id: str, preferences: dict):
     """Save or update user preferences in Firestore."""
-    pref_ref = db.collection("users").document(user_id)
-    pref_ref.set({"preferences": preferences}, merge=True)
+    async with UserProfile(user_id) as profile:
+        profile.set_preferences(preferences)
 
 
-def get_user_preferences(user_id: str) -> dict:
+async def get_user_preferences(user_id: str) -> dict:
     """Fetch user preferences from Firestore. Returns empty dict if none found."""
-    pref_ref = db.collection("users").document(user_id).get()
-    if pref_ref.exists:
-        return pref_ref.to_dict().get("preferences", {})
-    return {}
+    return await UserProfile(user_id).get_preferences()
 
 
 # --- Conversation state handling ---
-def save_conversation_state(user_id: str, state: dict):
+async def save_conversation_state(user_id: str, state: dict):
     """Save temporary conversation state for a user."""
-    db.collection("users").document(user_id).set({"state": state}, merge=True)
+    async with UserProfile(user_id) as profile:
+        profile.set_state(state)
 
 
-def get_conversation_state(user_id: str) -> dict:
+async def get_conversation_state(user_id: str) -> dict:
     """Get the stored conversation state for a user."""
-    doc = db.collection("users").document(user_id).get()
-    if doc.exists:
-        return doc.to_dict().get("state", {})
-    return {}
+    return await UserProfile(user_id).get_state()
 
 
-def clear_conversation_state(user_id: str):
+async def clear_conversation_state(user_id: str):
     """Clear stored conversation state after it's resolved."""
-    db.collection("users").document(user_id).update({"state": firestore.DELETE_FIELD})
+    async with UserProfile(user_id) as profile:
+        profile.clear_state()
 
 
-def save_chat_message(user_id: str, chat_id: str, user_message: str, bot_reply: str):
+async def save_chat_message(user_id: str, chat_id: str, user_message: str, bot_reply: str):
     """Save a complete chat message exchange"""
     chat_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id)
-    
+
     # Generate title from first message if it's the first message
-    chat_doc = chat_ref.get()
+    chat_doc = await chat_ref.get()
     if not chat_doc.exists or chat_doc.to_dict().get("message_count", 0) == 0:
         title = user_message[:30] + "..." if len(user_message) > 30 else user_message
-        chat_ref.set({
+        await chat_ref.set({
             "title": title,
             "updated_at": datetime.datetime.utcnow(),
             "message_count": 1
         }, merge=True)
     else:
-        chat_ref.update({
+        await chat_ref.update({
             "updated_at": datetime.datetime.utcnow(),
             "message_count": firestore.Increment(1)
         })
-    
+
     # Save the actual messages
     messages_ref = chat_ref.collection("messages")
-    
+
     # Save user message
-    messages_ref.add({
+    await messages_ref.add({
         "sender": "user",
         "content": user_message,
         "timestamp": datetime.datetime.utcnow()
     })
-    
+
     # Save bot reply
-    messages_ref.add({
+    await messages_ref.add({
         "sender": "assistant",
         "content": bot_reply,
         "timestamp": datetime.datetime.utcnow()
@@ -0,0 +1,230 @@
+# backend/app/services/ingredient_index.py
+"""Offline ingredient -> recipe inverted index.
+
+Posting lists are sorted int32 recipe IDs stored back to back in a single
+array (CSR layout: `offsets[t]:offsets[t + 1]` is term t's slice), so a
+pantry search is a handful of array slices plus a set intersection or a
+count, with no network call.
+
+Build it once from data/recipes.csv and/or a TheMealDB dump:
+
+    python -m app.services.ingredient_index --csv ../data/recipes.csv --mealdb meals.json
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../../../data")
+INDEX_PATH = os.getenv("INGREDIENT_INDEX_PATH", os.path.join(DATA_DIR, "ingredient_index.npz"))
+RECIPES_CSV = os.path.join(DATA_DIR, "recipes.csv")
+
+UNITS = {
+    "cup", "cups", "tbsp", "tsp", "tablespoon", "tablespoons", "teaspoon", "teaspoons",
+    "g", "kg", "gram", "grams", "ml", "l", "litre", "liter", "oz", "lb", "lbs",
+    "pinch", "clove", "cloves", "handful", "bunch", "can", "tin", "slice", "slices",
+    "small", "medium", "large", "fresh", "chopped", "sliced", "diced", "to", "taste", "of",
+}
+
+
+def _singular(word: str) -> str:
+    if word.endswith("oes") or word.endswith("ies"):
+        return word[:-3] + ("o" if word.endswith("oes") else "y")
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient(text: str) -> str:
+    """'2 cups Chopped Tomatoes (ripe)' -> 'tomato'."""
+    text = re.sub(r"\(.*?\)", " ", text.lower())
+    words = re.findall(r"[a-z]+", text)
+    return " ".join(_singular(w) for w in words if w not in UNITS)
+
+
+def split_ingredients(text: str) -> list:
+    return [part for part in re.split(r"[,;|\n]", text or "") if part.strip()]
+
+
+def recipes_from_csv(path: str):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield {
+                "name": row["name"],
+                "category": row.get("category", ""),
+                "source": "csv",
+                "ingredients": split_ingredients(row.get("ingredients", "")),
+            }
+
+
+def recipes_from_mealdb(path: str):
+    """Meals from a TheMealDB dump: a JSON list of meals or {"meals": [...]}."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for meal in data.get("meals", []) if isinstance(data, dict) else data:
+        yield {
+            "name": meal["strMeal"],
+            "category": meal.get("strCategory") or "",
+            "source": "mealdb",
+            "idMeal": meal.get("idMeal"),
+            "ingredients": [
+                meal[f"strIngredient{n}"] for n in range(1, 21)
+                if (meal.get(f"strIngredient{n}") or "").strip()
+            ],
+        }
+
+
+class IngredientIndex:
+    def __init__(self, recipes: list, terms: list, offsets: np.ndarray,
+                 postings: np.ndarray, ingredient_counts: np.ndarray):
+        self.recipes = recipes
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.ingredient_counts = ingredient_counts
+
+    @classmethod
+    def build(cls, recipes):
+        """Index an iterable of {"name", "category", "ingredients": [...]} dicts.
+
+        Each ingredient is indexed under its full normalized name and under
+        each of its words, so "chicken" also finds "chicken thigh".
+        """
+        recipe_list, term_ids, pairs, counts = [], {}, [], []
+        for recipe_id, recipe in enumerate(recipes):
+            names = {normalize_ingredient(i) for i in recipe["ingredients"]}
+            names.discard("")
+            keys = set(names)
+            for name in names:
+                keys.update(name.split())
+            for key in keys:
+                pairs.append((term_ids.setdefault(key, len(term_ids)), recipe_id))
+            counts.append(len(names))
+            recipe_list.append({k: v for k, v in recipe.items() if k != "ingredients"})
+
+        terms = sorted(term_ids, key=term_ids.get)
+        if pairs:
+            pairs = np.array(pairs, dtype=np.int32)
+            # Sorting by (term, recipe) lays each posting list out sorted
+            pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+            postings = pairs[:, 1].copy()
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(pairs[:, 0], minlength=len(terms)))])
+        else:
+            postings = np.zeros(0, dtype=np.int32)
+            offsets = np.zeros(1, dtype=np.int64)
+        return cls(recipe_list, terms, offsets.astype(np.int64), postings,
+                   np.array(counts, dtype=np.int16))
+
+    def save(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        terms = sorted(self.terms, key=self.terms.get)
+        meta = json.dumps({"terms": terms, "recipes": self.recipes}, ensure_ascii=False)
+        np.savez_compressed(path, offsets=self.offsets, postings=self.postings,
+                            ingredient_counts=self.ingredient_counts, meta=np.array(meta))
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH):
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        return cls(meta["recipes"], meta["terms"], data["offsets"], data["postings"],
+                   data["ingredient_counts"])
+
+    def posting(self, ingredient: str) -> np.ndarray:
+        term = self.terms.get(normalize_ingredient(ingredient))
+        if term is None:
+            return self.postings[:0]
+        return self.postings[self.offsets[term]:self.offsets[term + 1]]
+
+    def search(self, pantry: list, limit: int = 10, match: str = "any") -> list:
+        """Recipes for the given pantry, best coverage first.
+
+        match="all" keeps only recipes that use every pantry item (posting
+        list intersection); match="any" ranks every recipe using at least one.
+        Coverage is the share of a recipe's ingredients found in the pantry.
+        """
+        if limit <= 0:
+            return []
+        items = list(dict.fromkeys(normalize_ingredient(p) for p in pantry))
+        items = [item for item in items if item]
+        if not items:
+            return []
+        lists = [self.posting(item) for item in items]
+        if match == "all":
+            ids = lists[0]
+            for posting in lists[1:]:
+                ids = np.intersect1d(ids, posting, assume_unique=True)
+            matched = np.full(len(ids), len(items), dtype=np.int32)
+        else:
+            counts = np.bincount(np.concatenate(lists), minlength=len(self.recipes))
+            ids = np.flatnonzero(counts)
+            matched = counts[ids]
+        if not len(ids):
+            return []
+
+        totals = np.maximum(self.ingredient_counts[ids], 1)
+        coverage = np.minimum(matched / totals, 1.0)
+        # Coverage first, then number of pantry items used; only the top
+        # `limit` candidates get fully sorted
+        score = coverage * 64 + np.minimum(matched, 63) / 64
+        if len(score) > limit:
+            top = np.argpartition(-score, limit - 1)[:limit]
+        else:
+            top = np.arange(len(score))
+        order = top[np.argsort(-score[top], kind="stable")]
+        return [
+            {**self.recipes[ids[i]], "matched": int(matched[i]), "coverage": round(float(coverage[i]), 3)}
+            for i in order
+        ]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_ingredient_index():
+    """The process-wide index: loaded from INDEX_PATH, else built from
+    data/recipes.csv. None when neither exists."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if os.path.exists(INDEX_PATH):
+                    _index = IngredientIndex.load(INDEX_PATH)
+                elif os.path.exists(RECIPES_CSV):
+                    _index = IngredientIndex.build(recipes_from_csv(RECIPES_CSV))
+    return _index
+
+
+def search_recipes_by_pantry(pantry: list, limit: int = 10, match: str = "any") -> list:
+    index = get_ingredient_index()
+    if index is None:
+        return []
+    return index.search(pantry, limit=limit, match=match)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the ingredient inverted index")
+    parser.add_argument("--csv", help="recipes CSV with name, ingredients, category columns")
+    parser.add_argument("--mealdb", help="TheMealDB dump (JSON)")
+    parser.add_argument("--out", default=INDEX_PATH)
+    args = parser.parse_args()
+    if not args.csv and not args.mealdb:
+        parser.error("give --csv and/or --mealdb")
+
+    def recipes():
+        if args.csv:
+            yield from recipes_from_csv(args.csv)
+        if args.mealdb:
+            yield from recipes_from_mealdb(args.mealdb)
+
+    index = IngredientIndex.build(recipes())
+    index.save(args.out)
+    print(f"Indexed {len(index.recipes)} recipes, {len(index.terms)} ingredient terms -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
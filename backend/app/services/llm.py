@@ -1,20 +1,55 @@
 # backend/app/services/llm.py
+import asyncio
 import os
-from openai import OpenAI
+import threading
 from dotenv import load_dotenv
+from .response_cache import response_cache, normalize_prompt, history_fingerprint
+from .singleflight import SingleFlight, StreamFlight
+from .llm_gateway import llm_gateway, GatewayBusy, is_rate_limit
+from .metrics import LLM_TOKENS, log_event, register_collector
+from .context_builder import build_context, token_stats
 
 load_dotenv()
 
-# Initialize OpenAI client
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("❌ OPENAI_API_KEY not found in environment variables")
+# === OpenAI client ===
+# Built on first use (or by the startup prewarm) rather than at import:
+# importing openai alone takes about a second of every cold start.
+_client = None
+_client_lock = threading.Lock()
 
-# Define client globally
-client = OpenAI(api_key=api_key)
 
-def ask_llm(prompt: str, history: list = None) -> str:
-    system_prompt = """You are Recipe Genie, an expert AI chef assistant.
+def get_llm_client():
+    """The shared AsyncOpenAI client; also usable as a FastAPI dependency."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("❌ OPENAI_API_KEY not found in environment variables")
+                from openai import AsyncOpenAI
+
+                # Async so LLM calls never block the event loop. Retries are done by
+                # llm_gateway, which also knows about our rate limits. OPENAI_BASE_URL
+                # can point the app at a local fake server.
+                _client = AsyncOpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None,
+                                      max_retries=0)
+    return _client
+
+
+def set_llm_client(client):
+    """Use `client` (e.g. a fake in tests) for every LLM call from now on."""
+    global _client
+    with _client_lock:
+        _client = client
+
+MODEL = "gpt-4o-mini"
+MAX_TOKENS = 800
+TEMPERATURE = 0.7
+# Print each request's token breakdown (section estimates + provider usage)
+LOG_TOKEN_USAGE = os.getenv("LOG_TOKEN_USAGE", "").lower() in ("1", "true", "yes")
+
+SYSTEM_PROMPT = """You are Recipe Genie, an expert AI chef assistant.
 
 CRITICAL BEHAVIOR RULES:
 1. FOOD & COOKING ONLY: You answer anything about food, dishes, ingredients, cooking techniques, recipes, meal planning, nutrition, food comparisons, food culture, kitchen equipment, and where to buy ingredients. This includes questions like "what is the difference between X and Y" when X and Y are food items.
@@ -43,26 +78,167 @@ FORMATTING RULES:
 - For cooking questions: answer directly and concisely, no full recipe unless asked
 - For clarifications: answer the specific question only"""
 
+
+def _build_messages(prompt: str, history: list = None, context: list = None, chat_key=None):
+    return build_context(SYSTEM_PROMPT, prompt, history, context, chat_key)
+
+
+def _token_estimate(usage: dict) -> int:
+    # What the tokens/min limit is charged up front: input plus the most output
+    return usage["total"] + MAX_TOKENS
+
+
+def _record_usage(usage: dict, reported=None):
+    """Fold the provider's token counts into our estimate and record it."""
+    if reported is not None:
+        usage["prompt_tokens"] = reported.prompt_tokens
+        usage["completion_tokens"] = reported.completion_tokens
+        details = getattr(reported, "prompt_tokens_details", None)
+        usage["cached_prompt_tokens"] = getattr(details, "cached_tokens", 0) or 0
+        llm_gateway.settle(_token_estimate(usage), reported.prompt_tokens + reported.completion_tokens)
+    token_stats.record(usage)
+    LLM_TOKENS.inc(usage.get("prompt_tokens") or usage["total"], kind="prompt")
+    LLM_TOKENS.inc(usage.get("completion_tokens") or 0, kind="completion")
+    LLM_TOKENS.inc(usage.get("cached_prompt_tokens") or 0, kind="cached_prompt")
+    if LOG_TOKEN_USAGE:
+        log_event("llm_usage", **usage)
+
+
+def _friendly_error(e: Exception) -> str:
+    # Return a clean error message without technical details
+    error_msg = str(e)
+    if (isinstance(e, GatewayBusy) or is_rate_limit(e)) and "quota" not in error_msg.lower():
+        return "I'm receiving too many requests right now. Please wait a moment and try again. For immediate help, consider checking cooking websites or recipe apps."
+    if "quota" in error_msg.lower() or "billing" in error_msg.lower():
+        return "I apologize, but there's currently an issue with my recipe service. Please check your OpenAI API quota and billing details. In the meantime, you might want to check reliable cooking websites for recipe information."
+    elif "rate limit" in error_msg.lower():
+        return "I'm receiving too many requests right now. Please wait a moment and try again. For immediate help, consider checking cooking websites or recipe apps."
+    else:
+        return "I'm experiencing some technical difficulties at the moment. Please try again in a few moments or check online cooking resources for immediate assistance."
+
+
+# Identical requests in flight at the same time share one upstream call
+llm_flights = SingleFlight()
+stream_flights = StreamFlight()
+
+
+def _flight_key(prompt: str, history: list = None, context: list = None):
+    return normalize_prompt(prompt), history_fingerprint(history), tuple(context or ())
+
+
+def _cache_context(context: list, grounding):
+    # Grounded replies are keyed on what their context depends on, so the
+    # cache can be checked before retrieval runs
+    return [grounding.key] if grounding is not None else context
+
+
+async def _cache_call(method, *args):
+    # The disk store does SQLite I/O; keep it off the event loop
+    if response_cache.store.blocking:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def _complete(prompt: str, history: list, context: list, chat_key, use_cache: bool, user_id: str,
+                    grounding=None) -> str:
+    if grounding is not None:
+        context = await grounding.documents()
+    messages, usage = _build_messages(prompt, history, context, chat_key)
+    response = await llm_gateway.call(user_id, _token_estimate(usage), lambda: get_llm_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+    ))
+    reply = response.choices[0].message.content.strip()
+    _record_usage(usage, response.usage)
+    if use_cache and not (grounding is not None and grounding.failed):
+        await _cache_call(response_cache.put, prompt, history, reply, _cache_context(context, grounding))
+    return reply
+
+
+async def _stream_completion(prompt: str, history: list, context: list, chat_key, user_id: str):
+    messages, usage = _build_messages(prompt, history, context, chat_key)
+    reported = None
+    stream = llm_gateway.stream(user_id, _token_estimate(usage), lambda: get_llm_client().chat.completions.create(
+        model=MODEL,
+        messages=messages,
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+        stream=True,
+        stream_options={"include_usage": True},
+    ))
+    async for chunk in stream:
+        if chunk.usage is not None:
+            reported = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+    _record_usage(usage, reported)
+
+
+async def ask_llm(prompt: str, history: list = None, use_cache: bool = True, context: list = None,
+                  chat_key=None, user_id: str = None, grounding=None) -> str:
+    """Answer `prompt`.
+
+    chat_key (e.g. (user_id, chat_id)) keys the history summary; user_id
+    is who waits in the gateway's fair queue. grounding (a retrieval
+    Grounding) supplies the recipe context, fetched only on a cache miss.
+    """
+    use_cache = use_cache and response_cache is not None
+    cache_context = _cache_context(context, grounding)
+    if use_cache:
+        cached = await _cache_call(response_cache.get, prompt, history, cache_context)
+        if cached is not None:
+            return cached
     try:
-        messages = [{"role": "system", "content": system_prompt}]
-        if history:
-            for msg in history[-10:]:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-        messages.append({"role": "user", "content": prompt})
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            max_tokens=800,
-            temperature=0.7,
+        return await llm_flights.do(
+            _flight_key(prompt, history, cache_context),
+            lambda: _complete(prompt, history, context, chat_key, use_cache, user_id, grounding),
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
-        # Return a clean error message without technical details
-        error_msg = str(e)
-        if "quota" in error_msg.lower() or "billing" in error_msg.lower():
-            return "I apologize, but there's currently an issue with my recipe service. Please check your OpenAI API quota and billing details. In the meantime, you might want to check reliable cooking websites for recipe information."
-        elif "rate limit" in error_msg.lower():
-            return "I'm receiving too many requests right now. Please wait a moment and try again. For immediate help, consider checking cooking websites or recipe apps."
-        else:
-            return "I'm experiencing some technical difficulties at the moment. Please try again in a few moments or check online cooking resources for immediate assistance."
\ No newline at end of file
+        return _friendly_error(e)
+
+
+class StreamInterrupted(Exception):
+    """The model stream failed after part of the reply had been yielded."""
+
+    def __init__(self, cause: Exception):
+        super().__init__(str(cause))
+        self.message = _friendly_error(cause)
+
+
+async def stream_llm(prompt: str, history: list = None, context: list = None, chat_key=None,
+                     user_id: str = None, grounding=None):
+    """Yield reply text deltas as they arrive from the model.
+
+    If it fails before the first delta, the same friendly error text as
+    ask_llm is yielded instead. A failure after that raises
+    StreamInterrupted, since what was yielded is only part of a reply.
+    """
+    if grounding is not None:
+        context = await grounding.documents()
+    emitted = False
+    try:
+        stream = stream_flights.subscribe(
+            _flight_key(prompt, history, context),
+            lambda: _stream_completion(prompt, history, context, chat_key, user_id),
+        )
+        async for delta in stream:
+            emitted = True
+            yield delta
+    except Exception as e:
+        if emitted:
+            log_event("llm_stream_interrupted", error=str(e))
+            raise StreamInterrupted(e) from e
+        yield _friendly_error(e)
+
+
+@register_collector
+def _collect_metrics():
+    return [("recipe_genie_llm_coalesced_total", "counter", "LLM calls served by another caller's in-flight request", [
+        ({"mode": "message"}, llm_flights.stats()["coalesced"]),
+        ({"mode": "stream"}, stream_flights.stats()["coalesced"]),
+    ])]
@@ -0,0 +1,324 @@
+# backend/app/services/llm_gateway.py
+"""Client-side throttling, retries and fair scheduling for OpenAI calls.
+
+Every completion goes through llm_gateway:
+
+- a fair queue caps concurrent upstream calls at OPENAI_MAX_CONCURRENCY
+  and hands free slots to waiting users round-robin, so one user's burst
+  can't starve everyone else;
+- two token buckets keep us under the account's requests/min
+  (OPENAI_RPM) and tokens/min (OPENAI_TPM) limits instead of finding
+  them by getting 429s;
+- rate-limit, timeout, connection and 5xx errors are retried with
+  jittered exponential backoff, never sooner than the server's
+  retry-after, which also pauses every other caller until it expires.
+
+A request's estimated tokens are charged once, however many attempts it
+takes; settle() corrects the charge on success and a request that fails
+outright gets it back.
+"""
+import os
+import time
+import random
+import asyncio
+import contextlib
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from .metrics import Histogram, register_collector
+
+QUEUE_WAIT_SECONDS = Histogram("recipe_genie_llm_queue_wait_seconds",
+                               "Time from asking for an LLM slot to holding it, rate limits included")
+
+
+class GatewayBusy(Exception):
+    """Raised when a call waited longer than queue_timeout for a slot."""
+
+
+# ===================== Token bucket =====================
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` is available and take it; returns seconds waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        # The lock keeps waiters FIFO, so big requests aren't starved by small ones
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                delay = (amount - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= amount
+        return waited
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) once real usage is known."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens - amount)
+
+
+# ===================== Fair queue =====================
+
+class FairQueue:
+    """Concurrency limit whose free slots rotate between waiting users."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.max_depth = 0
+        self._waiting = OrderedDict()  # user -> deque of futures
+
+    @property
+    def depth(self):
+        return sum(len(waiters) for waiters in self._waiting.values())
+
+    async def acquire(self, user):
+        if self.active < self.limit and not self._waiting:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user, deque()).append(future)
+        self.max_depth = max(self.max_depth, self.depth)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we gave up; pass it on
+                self.release()
+            else:
+                self._discard(user, future)
+            raise
+
+    def _discard(self, user, future):
+        waiters = self._waiting.get(user)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._waiting[user]
+
+    def release(self):
+        while self._waiting:
+            user, waiters = self._waiting.popitem(last=False)
+            future = waiters.popleft()
+            if waiters:
+                # Back of the line until every other waiting user had a turn
+                self._waiting[user] = waiters
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+# ===================== Gateway =====================
+
+@lru_cache(maxsize=None)
+def retryable_errors():
+    """OpenAI errors worth retrying; openai is imported on first failure, not at startup."""
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, retryable_errors()[0])
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class LLMGateway:
+    def __init__(self, rpm: int = 500, tpm: int = 200_000, max_concurrency: int = 32,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 queue_timeout: float = 30.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue = FairQueue(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self._paused_until = 0.0
+
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent_waits = deque(maxlen=1000)
+
+    # --- Scheduling ---
+
+    @contextlib.asynccontextmanager
+    async def slot(self, user_id: str, tokens: int = 0):
+        """Hold one upstream slot for `user_id`, after the rate limits allow it.
+
+        `tokens` is charged to the tokens/min bucket; retries pass 0.
+        """
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self.queue.acquire(user_id or "anonymous"), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise GatewayBusy("Timed out waiting for an LLM slot") from None
+        try:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.requests.acquire(1)
+            if tokens:
+                await self.tokens.acquire(tokens)
+            self._record_wait(time.monotonic() - start)
+            yield
+        finally:
+            self.queue.release()
+
+    def _record_wait(self, waited: float):
+        self.calls += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self._recent_waits.append(waited)
+        QUEUE_WAIT_SECONDS.observe(waited)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter, but never sooner than the server asked for
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if is_rate_limit(error):
+            self.rate_limited += 1
+            if retry_after:
+                delay = max(delay, retry_after)
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        elif retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the tokens/min bucket once the real token count is known."""
+        if actual:
+            self.tokens.adjust(actual - estimated)
+
+    def _refund(self, tokens: int):
+        # The request failed without using its estimate
+        self.tokens.adjust(-tokens)
+
+    # --- Calls ---
+
+    async def call(self, user_id: str, tokens: int, factory):
+        """Await factory() in a slot, retrying transient failures."""
+        charged = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self.slot(user_id, 0 if charged else tokens):
+                        charged = True
+                        return await factory()
+                except retryable_errors() as e:
+                    if attempt == self.max_retries:
+                        self.failures += 1
+                        raise
+                    delay = self._backoff(attempt, e)
+                self.retries += 1
+                await asyncio.sleep(delay)
+        except Exception:
+            if charged:
+                self._refund(tokens)
+            raise
+
+    async def stream(self, user_id: str, tokens: int, factory):
+        """Iterate the stream factory() opens, holding a slot until it ends.
+
+        Opening the stream is retried like call(); once chunks have been
+        yielded a failure is raised, since they can't be taken back (and
+        the tokens they used are kept charged).
+        """
+        charged = started = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self.slot(user_id, 0 if charged else tokens):
+                        charged = True
+                        async for chunk in await factory():
+                            started = True
+                            yield chunk
+                        return
+                except retryable_errors() as e:
+                    if attempt == self.max_retries or started:
+                        self.failures += 1
+                        raise
+                    delay = self._backoff(attempt, e)
+                self.retries += 1
+                await asyncio.sleep(delay)
+        except Exception:
+            if charged and not started:
+                self._refund(tokens)
+            raise
+
+    def stats(self):
+        waits = sorted(self._recent_waits)
+        return {
+            "queue_depth": self.queue.depth,
+            "max_queue_depth": self.queue.max_depth,
+            "in_flight": self.queue.active,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "failures": self.failures,
+            "wait_avg_ms": round(self.wait_total / self.calls * 1000, 1) if self.calls else 0.0,
+            "wait_p95_ms": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 1) if waits else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+llm_gateway = LLMGateway(
+    rpm=int(os.getenv("OPENAI_RPM", "500")),
+    tpm=int(os.getenv("OPENAI_TPM", "200000")),
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+    queue_timeout=float(os.getenv("OPENAI_QUEUE_TIMEOUT", "30")),
+)
+
+
+@register_collector
+def _collect_metrics():
+    stats = llm_gateway.stats()
+    return [
+        ("recipe_genie_llm_queue_depth", "gauge", "Calls waiting for an LLM slot", [({}, stats["queue_depth"])]),
+        ("recipe_genie_llm_in_flight", "gauge", "LLM calls holding a slot", [({}, stats["in_flight"])]),
+        ("recipe_genie_llm_calls_total", "counter", "LLM calls by outcome", [
+            ({"outcome": "started"}, stats["calls"]),
+            ({"outcome": "retried"}, stats["retries"]),
+            ({"outcome": "rate_limited"}, stats["rate_limited"]),
+            ({"outcome": "failed"}, stats["failures"]),
+        ]),
+    ]
@@ -0,0 +1,211 @@
+# backend/app/services/markdown.py
+"""Strip markdown from LLM replies so the chat shows plain text.
+
+A single left-to-right scan jumps straight to the characters that can
+start markup and, at each, tries only the small precompiled pattern for
+the constructs that character can begin (headers and bullets at line
+starts; escapes, inline code, links/images, bold and italic inline).
+That replaces one full regex pass per construct. Emphasis follows
+CommonMark's flanking rules closely enough that ordinary text survives:
+"2*3 cups" keeps its asterisk and "garam_masala" its underscore. Fenced
+code blocks lose their ``` lines but keep their contents verbatim.
+
+MarkdownStream applies the same cleaning to streamed deltas. It carries
+the unfinished line and the in-fence state between chunks, and releases
+plain text as soon as nothing after it can change how it is cleaned. Each
+chunk is scanned once, so streaming a line costs about as much as
+cleaning it whole rather than growing with the number of chunks.
+"* " and "+ " list markers become the "• " bullets the system prompt asks
+for.
+"""
+import re
+
+# Header ("## ") or bullet ("* ", "+ ") marker at the start of a line
+_LINE_START = re.compile(r"""
+    [ \t]{0,3}(?:\#{1,6}(?:[ \t]+|$)|\#{2,6}(?=[^\s\#]))
+  | (?P<indent>[ \t]*)[*+][ \t]+
+""", re.MULTILINE | re.VERBOSE)
+
+_LINK = r"""\[([^\]\n]*)\]\([^)\s]*(?:[ \t]+"[^"\n]*")?\)"""
+
+# Inline constructs by their first character; group `lastindex` is the
+# text to keep
+_INLINE = {
+    "\\": re.compile(r"\\([\\`*_\[\]()#!])"),
+    "`": re.compile(r"(?<!`)(`+)(?!`)(.+?)(?<!`)\1(?!`)"),
+    "[": re.compile(_LINK),
+    "!": re.compile("!" + _LINK),
+    "*": re.compile(r"""
+        \*\*\*(?=[^\s*])(.+?)(?<=[^\s*])\*\*\*
+      | \*\*(?=[^\s*])(.+?)(?<=\S)\*\*(?!\*)
+      | (?<![\w*])\*(?=[^\s*])([^*\n]*?[^\s*])\*(?![\w*])
+    """, re.VERBOSE),
+    "_": re.compile(r"""
+        (?<!\w)__(?=[^\s_])(.+?)(?<=[^\s_])__(?!\w)
+      | (?<![\w_])_(?=[^\s_])([^_\n]*?[^\s_])_(?![\w_])
+    """, re.VERBOSE),
+}
+# Escaped characters and code spans are kept as-is, not cleaned further
+_VERBATIM = "\\`"
+_CANDIDATE = re.compile(r"[\\`*_\[!#+]")
+
+_FENCE = re.compile(r"[ \t]{0,3}(?:```|~~~)")
+# Characters that can start an inline construct (or end an image's "!")
+_SPECIAL = re.compile(r"!?[\\`*_\[]")
+
+
+def _clean_text(text: str) -> str:
+    out = []
+    last = pos = 0
+    while True:
+        candidate = _CANDIDATE.search(text, pos)
+        if candidate is None:
+            break
+        i = candidate.start()
+        ch = text[i]
+        m = None
+        if ch in "#*+":
+            line_start = text.rfind("\n", 0, i) + 1
+            if line_start >= last and not text[line_start:i].strip(" \t"):
+                m = _LINE_START.match(text, line_start)
+                if m is not None:
+                    out.append(text[last:line_start])
+                    # "* item" reads oddly as plain text; use the prompt's bullet
+                    out.append("" if m.group("indent") is None else m.group("indent") + "• ")
+                    last = pos = m.end()
+                    continue
+        pattern = _INLINE.get(ch)
+        if pattern is not None:
+            m = pattern.match(text, i)
+        if m is None:
+            pos = i + 1
+            continue
+        kept = m.group(m.lastindex)
+        out.append(text[last:i])
+        # Bold, italic and link text can hold further markup
+        out.append(kept if ch in _VERBATIM else _clean_text(kept))
+        last = pos = m.end()
+    if not out:
+        return text
+    out.append(text[last:])
+    return "".join(out)
+
+
+def clean_all_markdown(text: str):
+    if not text:
+        return text
+    if "```" not in text and "~~~" not in text:
+        return _clean_text(text).strip()
+    stream = MarkdownStream()
+    return stream.feed(text) + stream.close()
+
+
+class MarkdownStream:
+    """Incremental clean_all_markdown: feed() deltas, then close().
+
+    The concatenation of everything returned equals clean_all_markdown of
+    the whole text, including the leading/trailing whitespace strip.
+    """
+
+    def __init__(self):
+        self._line = ""        # unfinished line
+        self._emitted = 0      # cleaned chars of _line already released
+        self._held = False     # _line reached markup; nothing more until "\n"
+        self._scanned = None   # _line[:_scanned] released, once its start is settled
+        self._in_fence = False
+        self._started = False  # any non-whitespace output yet
+        self._pending_ws = ""  # trailing whitespace held back
+
+    def feed(self, chunk: str) -> str:
+        if "\n" not in chunk:
+            # Most deltas are a token or two inside a line
+            self._line += chunk
+            return "" if self._held else self._output(self._partial())
+        out = []
+        lines = (self._line + chunk).split("\n")
+        self._line = lines.pop()
+        for line in lines:
+            out.append(self._finish_line(line + "\n"))
+            self._emitted, self._held, self._scanned = 0, False, None
+        out.append(self._partial())
+        return self._output("".join(out))
+
+    def close(self) -> str:
+        text = self._finish_line(self._line) if self._line else ""
+        self._line, self._emitted, self._scanned = "", 0, None
+        return self._output(text, final=True)
+
+    def _finish_line(self, line: str) -> str:
+        if _FENCE.match(line):
+            self._in_fence = not self._in_fence
+            return ""
+        cleaned = line if self._in_fence else _clean_text(line)
+        return cleaned[self._emitted:]
+
+    def _partial(self) -> str:
+        """Release the start of the unfinished line that can't change any more.
+
+        Each chunk is scanned once: after the line's start is settled only
+        the text past _scanned is searched for markup.
+        """
+        line = self._line
+        lead = ""
+        if self._scanned is None:
+            # Fence lines are dropped whole, and a start of only #, `, ~ or +
+            # may still become a header, fence or bullet
+            if not line.lstrip(" \t").strip("#`~+ \t"):
+                return ""
+            if _FENCE.match(line):
+                self._held = True
+                return ""
+            start = 0
+            if not self._in_fence:
+                marker = _LINE_START.match(line)
+                if marker is not None:
+                    if marker.group("indent") is not None:
+                        if marker.end() == len(line):
+                            return ""  # more indentation may follow the marker
+                        lead = marker.group("indent") + "• "
+                    start = marker.end()
+            self._scanned = start
+        end = len(line)
+        if not self._in_fence:
+            special = _SPECIAL.search(line, self._scanned)
+            if special is not None:
+                end = special.start()
+                self._held = True
+            elif line.endswith("!") and end > self._scanned:
+                end -= 1  # may be the start of an image
+        released = lead + line[self._scanned:end]
+        self._scanned = end
+        self._emitted += len(released)
+        return released
+
+    def _output(self, text: str, final: bool = False) -> str:
+        # Drop leading whitespace, hold trailing whitespace until more text
+        # follows, so the joined output matches clean_all_markdown's strip()
+        if not text:
+            return ""
+        if not self._started:
+            text = text.lstrip()
+        body = text.rstrip()
+        if not body:
+            if not final:
+                self._pending_ws += text
+            return ""
+        self._started = True
+        out = self._pending_ws + body
+        self._pending_ws = "" if final else text[len(body):]
+        return out
+
+
+async def clean_markdown_stream(chunks):
+    """Clean an async iterator of text deltas, yielding cleaned deltas."""
+    stream = MarkdownStream()
+    async for chunk in chunks:
+        text = stream.feed(chunk)
+        if text:
+            yield text
+    text = stream.close()
+    if text:
+        yield text
@@ -0,0 +1,373 @@
+# backend/app/services/memory_firestore.py
+"""In-memory stand-in for Firestore's AsyncClient.
+
+Selected with FIRESTORE_BACKEND=memory. It implements the slice of the
+API this app uses (documents, subcollections, merge writes, Increment and
+DELETE_FIELD transforms, batches, ordered/limited/cursor queries and
+get_all), so the backend can run locally and in benchmarks without
+credentials. Data lives only as long as the process.
+"""
+import asyncio
+import copy
+import datetime
+
+
+class _Sentinel:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+DELETE_FIELD = _Sentinel("DELETE_FIELD")
+SERVER_TIMESTAMP = _Sentinel("SERVER_TIMESTAMP")
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+
+class FieldFilter:
+    def __init__(self, field_path: str, op_string: str, value):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+def _utc(value):
+    # Firestore hands timestamps back as UTC-aware datetimes
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def _split_path(field_path: str) -> list:
+    parts, current, quoted = [], "", False
+    for ch in field_path:
+        if ch == "`":
+            quoted = not quoted
+        elif ch == "." and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+    parts.append(current)
+    return parts
+
+
+def _get_field(data: dict, field_path: str, default=None):
+    for part in _split_path(field_path):
+        if not isinstance(data, dict) or part not in data:
+            return default
+        data = data[part]
+    return data
+
+
+def _order_value(doc_id: str, data: dict, field_path: str):
+    # "__name__" (FieldPath.document_id()) orders by document ID
+    return doc_id if field_path == "__name__" else _get_field(data, field_path)
+
+
+def _apply_value(target: dict, key: str, value):
+    if value is DELETE_FIELD:
+        target.pop(key, None)
+    elif value is SERVER_TIMESTAMP:
+        target[key] = datetime.datetime.now(datetime.timezone.utc)
+    elif isinstance(value, Increment):
+        current = target.get(key)
+        target[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+    else:
+        target[key] = _utc(copy.deepcopy(value))
+
+
+def _merge(target: dict, updates: dict):
+    for key, value in updates.items():
+        if isinstance(value, dict) and value:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            _merge(child, value)
+        else:
+            _apply_value(target, key, value)
+
+
+def _set_path(target: dict, field_path: str, value):
+    parts = _split_path(field_path)
+    for part in parts[:-1]:
+        child = target.get(part)
+        if not isinstance(child, dict):
+            child = target[part] = {}
+        target = child
+    _apply_value(target, parts[-1], value)
+
+
+class _Store:
+    def __init__(self):
+        # collection path -> {document id -> data}
+        self.collections = {}
+
+    def read(self, collection: str, doc_id: str):
+        data = self.collections.get(collection, {}).get(doc_id)
+        return copy.deepcopy(data)
+
+    def set(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        docs = self.collections.setdefault(collection, {})
+        if merge and doc_id in docs:
+            _merge(docs[doc_id], data)
+        else:
+            docs[doc_id] = {}
+            _merge(docs[doc_id], data)
+
+    def update(self, collection: str, doc_id: str, data: dict):
+        docs = self.collections.get(collection, {})
+        if doc_id not in docs:
+            raise KeyError(f"No document to update: {collection}/{doc_id}")
+        for field_path, value in data.items():
+            _set_path(docs[doc_id], field_path, value)
+
+    def delete(self, collection: str, doc_id: str):
+        self.collections.get(collection, {}).pop(doc_id, None)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self._data = data
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        return _order_value(self.id, self._data or {}, field_path)
+
+
+class AsyncDocumentReference:
+    def __init__(self, client, collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self):
+        return AsyncCollectionReference(self._client, self._collection_path)
+
+    def collection(self, name: str):
+        return AsyncCollectionReference(self._client, f"{self.path}/{name}")
+
+    def _snapshot(self):
+        return DocumentSnapshot(self, self._client._store.read(self._collection_path, self.id))
+
+    async def get(self):
+        await asyncio.sleep(0)
+        return self._snapshot()
+
+    async def set(self, document_data: dict, merge: bool = False):
+        await asyncio.sleep(0)
+        self._client._store.set(self._collection_path, self.id, document_data, merge)
+
+    async def update(self, field_updates: dict):
+        await asyncio.sleep(0)
+        self._client._store.update(self._collection_path, self.id, field_updates)
+
+    async def delete(self):
+        await asyncio.sleep(0)
+        self._client._store.delete(self._collection_path, self.id)
+
+
+class AsyncQuery:
+    def __init__(self, client, collection_path: str, orders=(), filters=(), limit=None, start_after=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._orders = list(orders)
+        self._filters = list(filters)
+        self._limit = limit
+        self._start_after = start_after
+
+    def _copy(self, **changes):
+        fields = {
+            "orders": self._orders, "filters": self._filters,
+            "limit": self._limit, "start_after": self._start_after,
+        }
+        fields.update(changes)
+        return AsyncQuery(self._client, self._collection_path, **fields)
+
+    def order_by(self, field_path: str, direction: str = Query.ASCENDING):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def where(self, field_path: str = None, op_string: str = None, value=None, filter: FieldFilter = None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, _utc(value))])
+
+    def limit(self, count: int):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields):
+        if isinstance(document_fields, DocumentSnapshot):
+            values = [document_fields.get(field) for field, _ in self._orders]
+        else:
+            values = [_utc(document_fields.get(field)) for field, _ in self._orders]
+        return self._copy(start_after=values)
+
+    def _matches(self):
+        docs = self._client._store.collections.get(self._collection_path, {})
+        results = []
+        for doc_id, data in docs.items():
+            if any(_order_value(doc_id, data, field) is None for field, _ in self._orders):
+                continue
+            if all(
+                _get_field(data, field) is not None and _OPERATORS[op](_get_field(data, field), value)
+                for field, op, value in self._filters
+            ):
+                results.append((doc_id, data))
+
+        # Stable sorts applied from the last order to the first
+        results.sort(key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            results.sort(key=lambda item, field=field: _order_value(item[0], item[1], field),
+                         reverse=direction == Query.DESCENDING)
+
+        if self._start_after is not None:
+            def after(item):
+                for (field, direction), cursor in zip(self._orders, self._start_after):
+                    value = _order_value(item[0], item[1], field)
+                    if value == cursor:
+                        continue
+                    return value < cursor if direction == Query.DESCENDING else value > cursor
+                return False
+            results = [item for item in results if after(item)]
+        if self._limit is not None:
+            results = results[:self._limit]
+        return [
+            DocumentSnapshot(AsyncDocumentReference(self._client, self._collection_path, doc_id), copy.deepcopy(data))
+            for doc_id, data in results
+        ]
+
+    async def stream(self):
+        for snapshot in self._matches():
+            await asyncio.sleep(0)
+            yield snapshot
+
+    async def get(self):
+        await asyncio.sleep(0)
+        return self._matches()
+
+
+class AsyncCollectionReference(AsyncQuery):
+    def __init__(self, client, path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: str = None):
+        return AsyncDocumentReference(self._client, self._collection_path, document_id or _auto_id())
+
+    async def add(self, document_data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        await ref.set(document_data)
+        return datetime.datetime.now(datetime.timezone.utc), ref
+
+    async def list_documents(self, page_size: int = None):
+        # Like Firestore, includes "missing" documents that only have subcollections
+        doc_ids = dict.fromkeys(self._client._store.collections.get(self._collection_path, {}))
+        prefix = self._collection_path + "/"
+        for path, docs in list(self._client._store.collections.items()):
+            if docs and path.startswith(prefix):
+                doc_ids.setdefault(path[len(prefix):].split("/", 1)[0])
+        for doc_id in doc_ids:
+            await asyncio.sleep(0)
+            yield self.document(doc_id)
+
+
+class AsyncWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data: dict, merge: bool = False):
+        self._writes.append(("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates: dict):
+        self._writes.append(("update", reference, field_updates, None))
+
+    def delete(self, reference):
+        self._writes.append(("delete", reference, None, None))
+
+    async def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("A batch can contain at most 500 writes")
+        await asyncio.sleep(0)
+        store = self._client._store
+        for op, ref, data, merge in self._writes:
+            if op == "update" and store.read(ref._collection_path, ref.id) is None:
+                raise KeyError(f"No document to update: {ref.path}")
+        # Validated up front, so the batch applies all-or-nothing
+        for op, ref, data, merge in self._writes:
+            if op == "set":
+                store.set(ref._collection_path, ref.id, data, merge)
+            elif op == "update":
+                store.update(ref._collection_path, ref.id, data)
+            else:
+                store.delete(ref._collection_path, ref.id)
+        self._writes = []
+
+
+class AsyncClient:
+    def __init__(self):
+        self._store = _Store()
+
+    def collection(self, name: str):
+        return AsyncCollectionReference(self, name)
+
+    def document(self, path: str):
+        collection, doc_id = path.rsplit("/", 1)
+        return AsyncDocumentReference(self, collection, doc_id)
+
+    def batch(self):
+        return AsyncWriteBatch(self)
+
+    async def get_all(self, references):
+        for ref in references:
+            yield ref._snapshot()
+
+
+_id_counter = 0
+
+
+def _auto_id():
+    global _id_counter
+    _id_counter += 1
+    return f"mem{_id_counter:016d}"
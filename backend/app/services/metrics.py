@@ -0,0 +1,267 @@
+# backend/app/services/metrics.py
+"""Metrics, per-stage timings and request-scoped structured logs.
+
+Counters and histograms live in a small in-process registry rendered in
+the Prometheus text format by GET /metrics. Components that already keep
+their own stats (caches, the LLM gateway, the write queue) register a
+collector that is read at scrape time instead of being double-counted.
+
+Wrap a unit of work in `stage("name")` to record its duration in
+recipe_genie_stage_seconds and in the current request's log line.
+RequestMetricsMiddleware gives every request an ID (X-Request-ID, echoed
+back), times it, and logs one JSON line per request with the stage
+breakdown. With PROFILING_ENABLED set, a request sent with
+"X-Profile: 1" is run under a sampling profiler (pyinstrument, falling
+back to cProfile) and the report is written to PROFILE_DIR.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import contextlib
+import contextvars
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ===================== Registry =====================
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = []
+
+
+def _label_text(labels: tuple) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values = {}
+        _metrics[name] = self
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = buckets
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        _metrics[name] = self
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self):
+        out = []
+        with _lock:
+            for key, row in self._values.items():
+                for bound, count in zip(self.buckets, row):
+                    out.append((self.name + "_bucket", key + (("le", repr(bound)),), count))
+                out.append((self.name + "_bucket", key + (("le", "+Inf"),), row[-1]))
+                out.append((self.name + "_sum", key, row[-2]))
+                out.append((self.name + "_count", key, row[-1]))
+        return out
+
+
+def register_collector(fn):
+    """Add fn() -> [(name, kind, help, [(labels dict, value), ...]), ...] to /metrics."""
+    _collectors.append(fn)
+    return fn
+
+
+def render() -> str:
+    lines = []
+    for metric in list(_metrics.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_label_text(labels)} {value}")
+    # Several collectors may report into one family (e.g. every cache)
+    families = {}
+    for collector in _collectors:
+        try:
+            reported = collector()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help, samples in reported:
+            families.setdefault(name, (kind, help, []))[2].extend(samples)
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def cache_metrics(name: str, stats: dict):
+    """Collector families for a cache exposing hits/misses/size stats()."""
+    lookups = [({"cache": name, "result": "hit"}, stats.get("hits", 0)),
+               ({"cache": name, "result": "miss"}, stats.get("misses", 0))]
+    if "semantic_hits" in stats:
+        lookups.append(({"cache": name, "result": "semantic_hit"}, stats["semantic_hits"]))
+    return [
+        ("recipe_genie_cache_requests_total", "counter", "Cache lookups by cache and result", lookups),
+        ("recipe_genie_cache_entries", "gauge", "Entries held per cache", [({"cache": name}, stats.get("size", 0))]),
+    ]
+
+
+# ===================== Metrics =====================
+
+REQUEST_SECONDS = Histogram("recipe_genie_request_seconds", "HTTP request duration by route")
+STAGE_SECONDS = Histogram("recipe_genie_stage_seconds", "Duration of request stages")
+LLM_TOKENS = Counter("recipe_genie_llm_tokens_total", "LLM tokens by kind (prompt, completion, cached_prompt)")
+FIRESTORE_OPS = Counter("recipe_genie_firestore_ops_total", "Firestore document reads and writes")
+
+
+# ===================== Request context =====================
+
+_ID_CHARS = re.compile(r"[^\w.-]")
+request_id_var = contextvars.ContextVar("request_id", default=None)
+_stages_var = contextvars.ContextVar("stages", default=None)
+
+logger = logging.getLogger("recipe_genie")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+
+def log_event(event: str, **fields):
+    """Log one JSON line, tagged with the current request ID."""
+    record = {"ts": round(time.time(), 3), "event": event, "request_id": request_id_var.get()}
+    record.update(fields)
+    logger.info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """Time a block as stage `name`; usable in sync and async code."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        stages = _stages_var.get()
+        if stages is not None:
+            stages[name] = round(stages.get(name, 0.0) + elapsed * 1000, 2)
+
+
+# ===================== Profiling =====================
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+
+@contextlib.contextmanager
+def _profiled(request_id: str):
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if Profiler is not None:
+        profiler = Profiler(interval=0.001, async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = os.path.join(PROFILE_DIR, f"{request_id}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            log_event("profile", path=path)
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(PROFILE_DIR, f"{request_id}.prof")
+            profiler.dump_stats(path)
+            log_event("profile", path=path)
+
+
+# ===================== Middleware =====================
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: request IDs, duration histogram, one log line per request.
+
+    Pure ASGI rather than BaseHTTPMiddleware, so streamed responses are
+    timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        # Client-supplied IDs end up in log lines and profile file names
+        request_id = _ID_CHARS.sub("", headers.get(b"x-request-id", b"").decode("latin-1"))[:64] or uuid.uuid4().hex
+        id_token = request_id_var.set(request_id)
+        stages_token = _stages_var.set({})
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+
+        profile = PROFILING_ENABLED and headers.get(b"x-profile") == b"1"
+        try:
+            with _profiled(request_id) if profile else contextlib.nullcontext():
+                await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=path, status=status)
+            if path != "/metrics":
+                log_event("request", method=scope["method"], path=scope["path"], route=path,
+                          status=status, duration_ms=round(elapsed * 1000, 2), stages=_stages_var.get())
+            _stages_var.reset(stages_token)
+            request_id_var.reset(id_token)
@@ -1,30 +1,123 @@
-import requests
-
-BASE_URL = "https://www.themealdb.com/api/json/v1/1"
-
-def search_meals_by_ingredient(ingredient):
-    url = f"{BASE_URL}/filter.php?i={ingredient}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json().get("meals", [])
-    return []
-
-def get_meal_details(meal_id):
-    url = f"{BASE_URL}/lookup.php?i={meal_id}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        meals = response.json().get("meals", [])
-        return meals[0] if meals else None
-    return None
-
-def suggest_recipe_by_ingredients(ingredients):
-    # Simple example: search for recipes containing the first ingredient
-    if not ingredients:
-        return []
-    meals = search_meals_by_ingredient(ingredients[0])
-    detailed_meals = []
-    for meal in meals:
-        details = get_meal_details(meal['idMeal'])
-        if details:
-            detailed_meals.append(details)
-    return detailed_meals
+# backend/app/services/recipe_api.py
+import asyncio
+import os
+
+import httpx
+
+from .cache import TTLCache
+from .metrics import register_collector, cache_metrics
+from .taste_profiles import RERANK_POOL, personalize
+
+BASE_URL = os.getenv("MEALDB_BASE_URL", "https://www.themealdb.com/api/json/v1/1")
+
+
+class MealDBClient:
+    """Async TheMealDB client sharing one connection pool.
+
+    Detail lookups fan out with bounded concurrency, and both ingredient
+    filters and meal details are cached for `ttl` seconds.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, max_concurrency: int = 8,
+                 ttl: float = 3600, timeout: float = 10.0):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._http = None
+        self._semaphore = None
+        self._filters = TTLCache(maxsize=512, ttl=ttl)
+        self._details = TTLCache(maxsize=4096, ttl=ttl)
+
+    def _client(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def _get(self, path: str, params: dict):
+        client = self._client()
+        async with self._semaphore:
+            response = await client.get(path, params=params)
+        if response.status_code == 200:
+            return response.json().get("meals") or []
+        return None
+
+    async def search_meals_by_ingredient(self, ingredient: str):
+        key = ingredient.strip().lower()
+        meals = self._filters.get(key)
+        if meals is None:
+            meals = await self._get("/filter.php", {"i": key})
+            if meals is None:
+                return []
+            self._filters.set(key, meals)
+        return meals
+
+    async def get_meal_details(self, meal_id):
+        meal = self._details.get(str(meal_id))
+        if meal is None:
+            meals = await self._get("/lookup.php", {"i": meal_id})
+            if not meals:
+                return None
+            meal = meals[0]
+            self._details.set(str(meal_id), meal)
+        return meal
+
+    async def suggest_recipe_by_ingredients(self, ingredients, limit: int = 10, user_id: str = None):
+        """Meals ranked by how many of the given ingredients they use.
+
+        Each ingredient is filtered concurrently and the results are
+        intersected locally; only the top `limit` meals are looked up.
+        With user_id, the user's taste reorders the candidates first.
+        """
+        ingredients = list(dict.fromkeys(i.strip().lower() for i in ingredients if i and i.strip()))
+        if not ingredients:
+            return []
+        results = await asyncio.gather(*(self.search_meals_by_ingredient(i) for i in ingredients))
+
+        matches, names = {}, {}
+        for meals in results:
+            for meal in meals:
+                matches[meal["idMeal"]] = matches.get(meal["idMeal"], 0) + 1
+                names[meal["idMeal"]] = meal.get("strMeal", "")
+        ranked = sorted(matches, key=lambda meal_id: (-matches[meal_id], names[meal_id]))
+        pool = [{"id": meal_id, "name": names[meal_id]} for meal_id in ranked[:limit * RERANK_POOL]]
+        pool = personalize(user_id, pool, limit, relevance=[matches[m["id"]] / len(ingredients) for m in pool])
+        ranked = [meal["id"] for meal in pool]
+
+        details = await asyncio.gather(*(self.get_meal_details(meal_id) for meal_id in ranked))
+        detailed_meals = []
+        for meal_id, meal in zip(ranked, details):
+            if meal:
+                detailed_meals.append({**meal, "matchedIngredients": matches[meal_id]})
+        return detailed_meals
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+meal_db = MealDBClient()
+
+
+@register_collector
+def _collect_metrics():
+    return (cache_metrics("mealdb_filters", meal_db._filters.stats())
+            + cache_metrics("mealdb_details", meal_db._details.stats()))
+
+
+async def search_meals_by_ingredient(ingredient):
+    return await meal_db.search_meals_by_ingredient(ingredient)
+
+
+async def get_meal_details(meal_id):
+    return await meal_db.get_meal_details(meal_id)
+
+
+async def suggest_recipe_by_ingredients(ingredients, limit: int = 10, user_id: str = None):
+    return await meal_db.suggest_recipe_by_ingredients(ingredients, limit, user_id)
@@ -0,0 +1,123 @@
+# backend/app/services/recipe_catalog.py
+"""In-memory snapshot of the popular-recipes catalog behind GET /recipes.
+
+The list comes from the LLM, but it is parsed and validated once per
+refresh rather than generated per request. Readers always get the current
+snapshot immediately; once it is older than `max_age` the next read kicks
+off a background refresh (stale-while-revalidate).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+from .llm import ask_llm
+
+CATALOG_PROMPT = (
+    "List 20 popular Indian recipes with their names and categories in JSON format. "
+    "Reply with the JSON array only. "
+    "Example: [{\"name\": \"Paneer Butter Masala\", \"category\": \"Main Course\"}, ...]"
+)
+
+# Served until the first refresh succeeds, so no request waits on the LLM
+SEED_CATALOG = [
+    {"name": "Paneer Butter Masala", "category": "Main Course"},
+    {"name": "Chicken Biryani", "category": "Main Course"},
+    {"name": "Masala Dosa", "category": "Breakfast"},
+    {"name": "Chole Bhature", "category": "Main Course"},
+    {"name": "Gulab Jamun", "category": "Dessert"},
+    {"name": "Samosa", "category": "Snack"},
+    {"name": "Dal Makhani", "category": "Main Course"},
+    {"name": "Pav Bhaji", "category": "Street Food"},
+]
+
+MAX_VIEWS = 256
+# After a failed refresh, wait this long before trying again
+RETRY_AFTER = 60
+
+
+def parse_catalog(text: str) -> list:
+    """Extract and validate the JSON recipe list from an LLM reply.
+
+    Raises ValueError if the reply doesn't hold a usable list.
+    """
+    match = re.search(r"\[.*\]", text or "", re.DOTALL)
+    if not match:
+        raise ValueError("no JSON array in catalog reply")
+    items = json.loads(match.group(0))
+    recipes = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        name, category = item.get("name"), item.get("category")
+        if isinstance(name, str) and name.strip() and isinstance(category, str):
+            recipes.append({"name": name.strip(), "category": category.strip()})
+    if not recipes:
+        raise ValueError("catalog reply has no valid recipes")
+    return recipes
+
+
+class CatalogSnapshot:
+    def __init__(self, recipes: list):
+        self.recipes = recipes
+        self.fetched_at = time.monotonic()
+        self.body = json.dumps({"recipes": recipes}).encode()
+        self.etag = hashlib.sha1(self.body).hexdigest()[:16]
+        self._views = {}
+
+    def view(self, category: str = None, limit: int = None):
+        """(etag, body) for a filtered view, serialized once per snapshot."""
+        key = ((category or "").lower(), limit)
+        if key == ("", None):
+            return f'"{self.etag}"', self.body
+        cached = self._views.get(key)
+        if cached is None:
+            recipes = self.recipes
+            if category:
+                recipes = [r for r in recipes if r["category"].lower() == key[0]]
+            if limit is not None:
+                recipes = recipes[:max(limit, 0)]
+            body = json.dumps({"recipes": recipes}).encode()
+            cached = (f'"{hashlib.sha1(body).hexdigest()[:16]}"', body)
+            if len(self._views) < MAX_VIEWS:
+                self._views[key] = cached
+        return cached
+
+
+class RecipeCatalog:
+    def __init__(self, fetch=None, max_age: float = 6 * 3600, seed: list = SEED_CATALOG):
+        self._fetch = fetch or (lambda: ask_llm(CATALOG_PROMPT, use_cache=False))
+        self.max_age = max_age
+        self._snapshot = CatalogSnapshot(seed)
+        self._seeded = True
+        self._refresh_task = None
+
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if self._seeded or time.monotonic() - snapshot.fetched_at > self.max_age:
+            self.refresh_in_background()
+        return snapshot
+
+    def refresh_in_background(self):
+        """Schedule one refresh on the running event loop, if none is in flight."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+
+    async def refresh(self) -> bool:
+        """Fetch and swap in a new snapshot; keeps the old one on failure."""
+        try:
+            recipes = parse_catalog(await self._fetch())
+            self._snapshot = CatalogSnapshot(recipes)
+            self._seeded = False
+            return True
+        except Exception as e:
+            print(f"Recipe catalog refresh failed: {e}")
+            # Don't retry on every request after a failure
+            self._snapshot.fetched_at = time.monotonic() - self.max_age + RETRY_AFTER
+            self._seeded = False
+            return False
+
+
+recipe_catalog = RecipeCatalog(max_age=float(os.getenv("RECIPE_CATALOG_MAX_AGE", 6 * 3600)))
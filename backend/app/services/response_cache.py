@@ -0,0 +1,348 @@
+# backend/app/services/response_cache.py
+"""Cache of LLM replies keyed on normalized prompt text.
+
+Prompts are keyed together with a fingerprint of their short history and
+of their recipe context (the documents, or the index build they come
+from); longer conversations bypass the cache.
+
+Prompts without history are also matched by similarity against entries
+with the same context, so "paneer butter masala recipe" can be answered
+from a cached "How to make Paneer Butter Masala?". A similar entry is only used if its words
+line up one to one with the prompt's, up to plurals and one-letter typos,
+and any modifier word (with, without, no, ...) is shared exactly. So
+"chicken curry without onion" never gets the "with onion" answer.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .metrics import register_collector, cache_metrics
+
+from .cache import TTLCache
+
+# Words that change the phrasing of a recipe request but not its answer
+FILLER_WORDS = {
+    "a", "an", "the", "me", "i", "you", "can", "could", "please", "give",
+    "show", "tell", "how", "to", "do", "make", "cook", "prepare", "recipe",
+    "recipes", "for", "of", "some", "want", "would", "like", "quick", "easy",
+}
+# Words that change the answer however similar the rest of the prompt is
+MODIFIER_WORDS = {
+    "with", "without", "no", "not", "non", "free", "less", "low", "high", "extra",
+    "more", "only", "instead", "vegan", "vegetarian", "veg", "spicy", "mild", "sweet",
+}
+SHORT_HISTORY = 2
+EMBED_DIM = 512
+
+
+def normalize_prompt(prompt: str) -> str:
+    words = re.sub(r"[^\w\s]", " ", prompt.lower()).split()
+    kept = [w for w in words if w not in FILLER_WORDS]
+    # A prompt made only of filler still needs a usable key
+    return " ".join(kept or words)
+
+
+def embed_prompt(text: str) -> np.ndarray:
+    """Cheap local embedding: hashed character trigrams, L2-normalized."""
+    vec = np.zeros(EMBED_DIM, dtype=np.float32)
+    padded = f"  {text} "
+    for i in range(len(padded) - 2):
+        h = int.from_bytes(hashlib.blake2b(padded[i:i + 3].encode(), digest_size=4).digest(), "little")
+        vec[h % EMBED_DIM] += 1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def history_fingerprint(history: list) -> str:
+    if not history:
+        return ""
+    digest = hashlib.sha1()
+    for msg in history:
+        digest.update(f"{msg['role']}\x00{msg['content']}\x01".encode())
+    return digest.hexdigest()
+
+
+def context_fingerprint(context: list) -> str:
+    if not context:
+        return ""
+    digest = hashlib.sha1()
+    for doc in context:
+        digest.update(f"{doc}\x01".encode())
+    return "ctx:" + digest.hexdigest()
+
+
+def _same_word(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    if a in MODIFIER_WORDS or b in MODIFIER_WORDS or a.isdigit() or b.isdigit():
+        return False
+    if a.rstrip("s") == b.rstrip("s") or a.removesuffix("es") == b.removesuffix("es"):
+        return True
+    # One-letter typo (substitution, insertion or deletion) in a longer word
+    if min(len(a), len(b)) < 5 or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) == 1
+    short, long = sorted((a, b), key=len)
+    return any(long[:i] + long[i + 1:] == short for i in range(len(long)))
+
+
+def words_align(a: str, b: str) -> bool:
+    """True if two normalized prompts have the same words, in any order,
+    allowing plurals and one-letter typos but not a different word."""
+    left, right = a.split(), b.split()
+    if len(left) != len(right):
+        return False
+    remaining = list(right)
+    for word in left:
+        match = next((i for i, other in enumerate(remaining) if _same_word(word, other)), None)
+        if match is None:
+            return False
+        remaining.pop(match)
+    return True
+
+
+# ===================== Storage backends =====================
+
+class MemoryStore:
+    blocking = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, value: str, normalized: str, fingerprint: str):
+        self._cache.set(key, value)
+
+    def entries(self):
+        return []
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def evictions(self):
+        return self._cache.evictions
+
+
+class DiskStore:
+    """SQLite-backed store so cached replies survive restarts.
+
+    Calls do file I/O, so async callers should run them in a thread. Hits
+    only read; their access times are written with the next set(), which
+    is the only call that evicts.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._accessed = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS replies ("
+                "key TEXT PRIMARY KEY, value TEXT, normalized TEXT, fingerprint TEXT,"
+                "expires REAL, accessed REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS replies_accessed ON replies (accessed)")
+            self._conn.execute("DELETE FROM replies WHERE expires <= ?", (time.time(),))
+            self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM replies WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row:
+                self._accessed[key] = now
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, normalized: str, fingerprint: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, normalized, fingerprint, now + self.ttl, now),
+            )
+            accessed, self._accessed = self._accessed, {}
+            accessed.pop(key, None)
+            self._conn.executemany(
+                "UPDATE replies SET accessed = ? WHERE key = ?", [(at, k) for k, at in accessed.items()]
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0] - self.maxsize
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM replies WHERE key IN "
+                    "(SELECT key FROM replies ORDER BY accessed LIMIT ?)", (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def entries(self):
+        """(key, normalized, context fingerprint) of live history-free entries, for the similarity index."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT key, normalized, fingerprint FROM replies "
+                "WHERE (fingerprint = '' OR fingerprint LIKE 'ctx:%') AND expires > ?", (time.time(),)
+            ).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+
+
+# ===================== Cache =====================
+
+class ResponseCache:
+    def __init__(self, store, similarity: float = 0.88, max_vectors: int = 5000):
+        self.store = store
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        # Ring buffer of prompt vectors; _slots maps a cache key to its row
+        self._vectors = np.zeros((max_vectors, EMBED_DIM), dtype=np.float32)
+        self._row_keys = [None] * max_vectors
+        self._row_texts = [None] * max_vectors
+        # Context of each row, as a small id into _scope_ids; -1 for free rows
+        self._row_scopes = np.full(max_vectors, -1, dtype=np.int32)
+        self._scope_ids = {}
+        self._slots = {}
+        self._next = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        for key, normalized, scope in store.entries():
+            self._index(key, normalized, scope)
+
+    def _key(self, normalized: str, fingerprint: str) -> str:
+        return hashlib.sha1(f"{normalized}\x00{fingerprint}".encode()).hexdigest()
+
+    def _index(self, key: str, normalized: str, scope: str):
+        vector = embed_prompt(normalized)
+        with self._lock:
+            if key in self._slots:
+                return
+            row = self._next
+            self._next = (row + 1) % len(self._row_keys)
+            self._slots.pop(self._row_keys[row], None)
+            self._row_keys[row] = key
+            self._row_texts[row] = normalized
+            self._row_scopes[row] = -1
+            if scope not in self._scope_ids and len(self._scope_ids) >= len(self._row_keys):
+                self._drop_unused_scopes()
+            self._row_scopes[row] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+            self._slots[key] = row
+            self._vectors[row] = vector
+
+    def _drop_unused_scopes(self):
+        # Caller holds _lock; renumber the scopes rows still use
+        used = sorted(set(self._row_scopes[self._row_scopes >= 0].tolist()))
+        remap = np.full(len(self._scope_ids), -1, dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        self._scope_ids = {scope: int(remap[i]) for scope, i in self._scope_ids.items() if remap[i] >= 0}
+        live = self._row_scopes >= 0
+        self._row_scopes[live] = remap[self._row_scopes[live]]
+
+    def _unindex(self, key: str):
+        with self._lock:
+            row = self._slots.pop(key, None)
+            if row is not None:
+                self._row_keys[row] = None
+                self._row_texts[row] = None
+                self._row_scopes[row] = -1
+                self._vectors[row] = 0
+
+    def cacheable(self, history: list) -> bool:
+        return not history or len(history) <= SHORT_HISTORY
+
+    def get(self, prompt: str, history: list = None, context: list = None):
+        if not self.cacheable(history):
+            self.bypassed += 1
+            return None
+        normalized = normalize_prompt(prompt)
+        past, scope = history_fingerprint(history), context_fingerprint(context)
+        reply = self.store.get(self._key(normalized, past + scope))
+        if reply is not None:
+            self.hits += 1
+            return reply
+        if not past and self._slots:
+            reply = self._similar(normalized, scope)
+            if reply is not None:
+                self.semantic_hits += 1
+                return reply
+        self.misses += 1
+        return None
+
+    def _similar(self, normalized: str, scope: str):
+        query = embed_prompt(normalized)
+        with self._lock:
+            scope_id = self._scope_ids.get(scope)
+            if scope_id is None:
+                return None
+            scores = self._vectors @ query
+            # Only entries answered with the same context are candidates
+            scores[self._row_scopes != scope_id] = -1.0
+            best = int(np.argmax(scores))
+            key, text = self._row_keys[best], self._row_texts[best]
+        if key is None or scores[best] < self.similarity or not words_align(normalized, text):
+            return None
+        reply = self.store.get(key)
+        if reply is None:
+            # Expired or evicted from the store; drop it from the index too
+            self._unindex(key)
+        return reply
+
+    def put(self, prompt: str, history: list, reply: str, context: list = None):
+        if not self.cacheable(history):
+            return
+        normalized = normalize_prompt(prompt)
+        past, scope = history_fingerprint(history), context_fingerprint(context)
+        key = self._key(normalized, past + scope)
+        self.store.set(key, reply, normalized, past + scope)
+        if not past:
+            self._index(key, normalized, scope)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self.store),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.store.evictions,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
+
+
+def _make_cache():
+    backend = os.getenv("RESPONSE_CACHE", "memory").lower()
+    if backend in ("off", "none", "0"):
+        return None
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600))
+    maxsize = int(os.getenv("RESPONSE_CACHE_SIZE", 5000))
+    if backend == "disk":
+        path = os.getenv("RESPONSE_CACHE_PATH", "data/cache/responses.sqlite3")
+        return ResponseCache(DiskStore(path, maxsize, ttl))
+    return ResponseCache(MemoryStore(maxsize, ttl))
+
+
+response_cache = _make_cache()
+
+
+@register_collector
+def _collect_metrics():
+    return cache_metrics("llm_responses", response_cache.stats()) if response_cache is not None else []
@@ -1,10 +1,295 @@
-from backend.app.services.llm import ask_llm  # ✅ fixed path
+# backend/app/services/retrieval.py
+"""Recipe retrieval over the embeddings written by scripts/embed_recipes.py.
 
-def handle_user_query(message: str, user_id: str = None):
+The index directory holds:
+- recipe_vectors.npy  float32 matrix, one row per recipe (memory-mapped)
+- recipe_meta.jsonl   one JSON object per row (name, category, doc)
+- recipe_ivf.npz      optional inverted-file index, built on first load
+                      for large corpora and reused afterwards
+- recipe_index.json   which embedder, model and dimension made the vectors
+
+Queries are embedded with EMBEDDING_MODEL, so an index made by any other
+embedder (the script's mock one included) is not used: its scores would
+be meaningless. Matches scoring under RETRIEVAL_MIN_SCORE are dropped, so
+a prompt unrelated to every recipe gets no context at all.
+"""
+import asyncio
+import json
+import os
+import threading
+
+import numpy as np
+
+from .context_builder import count_tokens
+from .llm import ask_llm, get_llm_client
+from .llm_gateway import llm_gateway
+from .metrics import log_event, stage
+from .taste_profiles import RERANK_POOL, get_taste_profiles, personalize
+
+INDEX_DIR = os.getenv(
+    "RECIPE_INDEX_DIR",
+    os.path.join(os.path.dirname(__file__), "../../../data/embeddings"),
+)
+VECTORS_FILE = "recipe_vectors.npy"
+META_FILE = "recipe_meta.jsonl"
+IVF_FILE = "recipe_ivf.npz"
+INFO_FILE = "recipe_index.json"
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Cosine similarity below which a recipe isn't worth showing the model
+MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.3"))
+
+# Rows scored per block, so a search never materializes N x batch scores at once
+BLOCK_ROWS = 65536
+# Corpora at least this large get an IVF index instead of exhaustive search
+IVF_MIN_ROWS = 50000
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _merge_top_k(best_scores, best_ids, scores, ids, k):
+    scores = np.concatenate([best_scores, scores], axis=1)
+    ids = np.concatenate([best_ids, ids], axis=1)
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        ids = np.take_along_axis(ids, part, axis=1)
+    return scores, ids
+
+
+class VectorIndex:
+    """Exhaustive cosine top-k search over a (possibly memory-mapped) matrix."""
+
+    def __init__(self, vectors: np.ndarray, meta: list):
+        if len(vectors) != len(meta):
+            raise ValueError(f"{len(vectors)} vectors but {len(meta)} metadata rows")
+        self.vectors = vectors
+        self.meta = meta
+        self.dim = vectors.shape[1]
+        # Inverse row norms, computed block by block to keep the mmap lazy
+        inv = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            norms = np.linalg.norm(vectors[start:start + BLOCK_ROWS], axis=1)
+            norms[norms == 0] = 1.0
+            inv[start:start + BLOCK_ROWS] = 1.0 / norms
+        self.inv_norms = inv
+
+    @classmethod
+    def load(cls, directory: str = INDEX_DIR, mmap: bool = True):
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = [json.loads(line) for line in f if line.strip()]
+        return cls(vectors, meta)
+
+    def _score_rows(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return (queries @ np.asarray(self.vectors[rows], dtype=np.float32).T) * self.inv_norms[rows]
+
+    def search(self, queries: np.ndarray, k: int = 5):
+        """Top-k rows for each query; returns (scores, ids), both shaped (B, k)."""
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        k = min(k, len(self.vectors))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.vectors), BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            scores = (queries @ block.T) * self.inv_norms[start:start + len(block)]
+            ids = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            best_scores, best_ids = _merge_top_k(best_scores, best_ids, scores, ids, k)
+        return _sorted(best_scores, best_ids)
+
+
+def _sorted(scores, ids):
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: rows are bucketed by nearest k-means centroid and
+    a query only scores the rows in its `nprobe` closest buckets."""
+
+    def __init__(self, vectors: np.ndarray, meta: list, centroids: np.ndarray,
+                 list_offsets: np.ndarray, list_rows: np.ndarray, nprobe: int = 8):
+        super().__init__(vectors, meta)
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = nprobe
+
+    @staticmethod
+    def train(vectors: np.ndarray, nlist: int = None, iterations: int = 10, sample: int = 20000, seed: int = 0):
+        """Cluster the corpus and return (centroids, list_offsets, list_rows)."""
+        rng = np.random.default_rng(seed)
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        picks = np.sort(rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False))
+        train = _normalize(np.asarray(vectors[picks], dtype=np.float32))
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = train[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+        return centroids.astype(np.float32), list_offsets, list_rows
+
+    @classmethod
+    def load(cls, directory: str = INDEX_DIR, mmap: bool = True, nprobe: int = 8):
+        base = VectorIndex.load(directory, mmap=mmap)
+        path = os.path.join(directory, IVF_FILE)
+        if os.path.exists(path):
+            data = np.load(path)
+            centroids, list_offsets, list_rows = data["centroids"], data["list_offsets"], data["list_rows"]
+        else:
+            centroids, list_offsets, list_rows = cls.train(base.vectors)
+            np.savez(path, centroids=centroids, list_offsets=list_offsets, list_rows=list_rows)
+        return cls(base.vectors, base.meta, centroids, list_offsets, list_rows, nprobe=nprobe)
+
+    def search(self, queries: np.ndarray, k: int = 5):
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.nprobe]
+        all_scores, all_ids = [], []
+        for query, lists in zip(queries, probes):
+            rows = np.sort(np.concatenate([
+                self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in lists
+            ]))
+            scores = self._score_rows(query[None, :], rows)
+            kk = min(k, len(rows))
+            part = np.argpartition(-scores[0], kk - 1)[:kk] if kk else np.array([], dtype=np.int64)
+            padded_scores = np.full(k, -np.inf, dtype=np.float32)
+            padded_ids = np.full(k, -1, dtype=np.int64)
+            padded_scores[:kk] = scores[0][part]
+            padded_ids[:kk] = rows[part]
+            all_scores.append(padded_scores)
+            all_ids.append(padded_ids)
+        return _sorted(np.array(all_scores), np.array(all_ids))
+
+
+# ===================== Query-time API =====================
+
+_index = None
+_index_checked = False
+_index_lock = threading.Lock()
+
+
+def _load_index():
+    vectors_path = os.path.join(INDEX_DIR, VECTORS_FILE)
+    if not os.path.exists(vectors_path):
+        return None
+    info_path = os.path.join(INDEX_DIR, INFO_FILE)
+    info = {}
+    if os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            info = json.load(f)
+    if info.get("model") != EMBEDDING_MODEL:
+        log_event("recipe_index_refused", directory=INDEX_DIR, embedder=info.get("embedder"),
+                  model=info.get("model"), expected=EMBEDDING_MODEL)
+        return None
+    vectors = np.load(vectors_path, mmap_mode="r")
+    loader = IVFIndex if len(vectors) >= IVF_MIN_ROWS else VectorIndex
+    index = loader.load(INDEX_DIR)
+    # Names this build of the index, for keying replies grounded in it
+    index.version = f"{info['model']}:{index.dim}:{len(vectors)}:{os.path.getmtime(vectors_path):.0f}"
+    return index
+
+
+def get_index():
+    """Load the recipe index once per process; None if it hasn't been built
+    or wasn't built with EMBEDDING_MODEL."""
+    global _index, _index_checked
+    if not _index_checked:
+        with _index_lock:
+            if not _index_checked:
+                _index = _load_index()
+                _index_checked = True
+    return _index
+
+
+async def embed_query(text: str, dim: int, user_id: str = None) -> np.ndarray:
+    # Through the gateway, so embeddings share the rate limits and retries
+    response = await llm_gateway.call(user_id, count_tokens(text), lambda: get_llm_client().embeddings.create(
+        model=EMBEDDING_MODEL, input=text, dimensions=dim,
+    ))
+    return np.asarray(response.data[0].embedding, dtype=np.float32)
+
+
+async def retrieve(query: str, k: int = 3, user_id: str = None) -> list:
+    """Return up to k recipes close to the query, best first.
+
+    With a taste profile for user_id, a larger pool is fetched and
+    reranked towards the user's taste.
+    """
+    if not query.strip():
+        return []
+    # Loading may norm the whole matrix or train the IVF index, and a search
+    # is seconds of numpy work at worst: neither runs on the event loop
+    index = await asyncio.to_thread(get_index)
+    if index is None:
+        return []
+    pool = k * RERANK_POOL if _personalized(user_id) else k
+    query_vector = await embed_query(query, index.dim, user_id)
+    scores, ids = await asyncio.to_thread(index.search, query_vector, pool)
+    results = [
+        {**index.meta[i], "score": float(score)}
+        for score, i in zip(scores[0], ids[0])
+        if i >= 0 and score >= MIN_SCORE
+    ]
+    return personalize(user_id, results, k, relevance=[r["score"] for r in results])
+
+
+def _personalized(user_id: str) -> bool:
+    profiles = get_taste_profiles()
+    return bool(user_id) and profiles is not None and profiles.has(user_id)
+
+
+class Grounding:
+    """Recipe context for one prompt, retrieved only if a reply is generated.
+
+    `key` names everything the context depends on besides the prompt (the
+    index build, and the user when results are personalized), so a reply
+    can be looked up in the response cache before paying for retrieval.
+    """
+
+    def __init__(self, message: str, user_id: str, key: str):
+        self.message = message
+        self.user_id = user_id
+        self.key = key
+        self.failed = False
+
+    async def documents(self):
+        """Recipe documents to ground the reply in; None if nothing matched or on failure."""
+        try:
+            with stage("retrieval"):
+                return [doc["doc"] for doc in await retrieve(self.message, user_id=self.user_id)] or None
+        except Exception as e:
+            # Grounding is best-effort; answer without it rather than fail
+            self.failed = True
+            log_event("retrieval_failed", error=str(e))
+            return None
+
+
+async def recipe_grounding(message: str, user_id: str = None):
+    """A Grounding for the message; None when there is no usable index."""
+    index = await asyncio.to_thread(get_index)
+    if index is None:
+        return None
+    key = f"{index.version}:{user_id}" if _personalized(user_id) else index.version
+    return Grounding(message, user_id, key)
+
+
+async def handle_user_query(message: str, user_id: str = None):
     """
     Process the user query and return an AI-generated response.
     """
     print(f"User {user_id} asked: {message}")
-
-    reply = ask_llm(message)
+    reply = await ask_llm(message, grounding=await recipe_grounding(message, user_id))
     return reply
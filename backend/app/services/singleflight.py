@@ -0,0 +1,119 @@
+# backend/app/services/singleflight.py
+"""Share one in-flight call between concurrent callers asking the same thing.
+
+SingleFlight.do(key, factory) runs factory() once per key at a time; other
+callers arriving while it runs await the same result, or get the same
+exception. StreamFlight.subscribe(key, factory) does the same for async
+generators: one upstream stream is consumed and every subscriber replays
+its chunks from the start, however late it joined.
+
+The shared work runs in its own task, so a caller that disconnects or is
+cancelled doesn't cancel it for the others.
+"""
+import asyncio
+import threading
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream = 0
+
+    def _count(self, leader: bool):
+        with self._lock:
+            self.calls += 1
+            if leader:
+                self.upstream += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "upstream": self.upstream,
+                "coalesced": self.calls - self.upstream,
+                "in_flight": len(self._flights),
+            }
+
+
+def _retrieve(task: asyncio.Task):
+    # Mark the exception as seen even if every waiter went away
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight(_Counters):
+    def __init__(self):
+        super().__init__()
+        self._flights = {}
+
+    async def do(self, key, factory):
+        task = self._flights.get(key)
+        self._count(task is None)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        _retrieve(task)
+
+
+class _Broadcast:
+    """Chunks of one upstream stream, kept so late subscribers can replay them."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, stream):
+        try:
+            async for chunk in stream:
+                self.chunks.append(chunk)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def replay(self):
+        i = 0
+        while True:
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class StreamFlight(_Counters):
+    def __init__(self):
+        super().__init__()
+        self._flights = {}
+
+    def subscribe(self, key, factory):
+        broadcast = self._flights.get(key)
+        self._count(broadcast is None)
+        if broadcast is None:
+            broadcast = self._flights[key] = _Broadcast()
+            task = asyncio.ensure_future(broadcast.pump(factory()))
+            task.add_done_callback(lambda t: self._forget(key, broadcast))
+        return broadcast.replay()
+
+    def _forget(self, key, broadcast):
+        # Once finished, new subscribers start a fresh upstream call
+        if self._flights.get(key) is broadcast:
+            del self._flights[key]
@@ -0,0 +1,267 @@
+# backend/app/services/static_assets.py
+"""Serve the React build from memory with proper HTTP caching.
+
+The build is listed once, and each file is read the first time it is
+requested (index.html by the startup prewarm); after that a page load
+costs no filesystem calls. Responses carry:
+
+- Cache-Control: a year and `immutable` for the content-hashed files
+  under static/, `no-cache` for index.html so a deploy is picked up on
+  the next load, an hour for everything else (favicon, manifest, ...);
+- a strong ETag, answered with 304 on a matching If-None-Match;
+- a br or gzip body when the client accepts it and the file compresses.
+  Precompressed `.br`/`.gz` siblings are used when the build has them,
+  otherwise the file is compressed once and the result kept;
+- single byte ranges (206/416, honouring If-Range), served uncompressed.
+
+The build is assumed not to change under a running process; restart
+after rebuilding. Precompress a build at maximum quality with:
+
+    python -m app.services.static_assets ../frontend/build
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from fastapi import Response
+
+# brotli is optional; without it only gzip variants are offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+SHORT_LIVED = "public, max-age=3600"
+
+MIN_COMPRESS_SIZE = 1024
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/manifest+json",
+                 "application/xml", "image/svg+xml", "image/x-icon", "image/vnd.microsoft.icon")
+# Preferred first when a client accepts both
+_ENCODINGS = ("br", "gzip")
+_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+def _compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    # Runtime compression happens on a request; the CLI can afford the best
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+    return brotli.compress(body, quality=11 if best else 5)
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (or is "*")."""
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _byte_range(header: str, size: int):
+    """(start, end) inclusive for a single `bytes=` range.
+
+    None means serve the whole file (no range, a malformed one or several);
+    ValueError means the range can't be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep:
+        return None
+    if not first:
+        # bytes=-N: the last N bytes
+        if not last.isdigit():
+            return None
+        if int(last) == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - int(last)), size - 1
+    if not first.isdigit() or (last and not last.isdigit()):
+        return None
+    start, end = int(first), int(last) if last else size - 1
+    if last and start > end:
+        return None
+    if start >= size:
+        raise ValueError("range starts past the end")
+    return start, min(end, size - 1)
+
+
+class Asset:
+    """One build file held in memory, with its lazily made compressed variants."""
+
+    def __init__(self, path: str, cache_control: str):
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.path = path
+        self.cache_control = cache_control
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type.endswith(("javascript", "json", "xml")):
+            self.content_type += "; charset=utf-8"
+        self._digest = hashlib.sha1(self.body).hexdigest()[:20]
+        self.etag = f'"{self._digest}"'
+        self.compressible = len(self.body) >= MIN_COMPRESS_SIZE and self.content_type.startswith(_COMPRESSIBLE)
+        self._variants = {}  # encoding -> (body, etag), or None if not worth it
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str):
+        if encoding not in self._variants:
+            with self._lock:
+                if encoding not in self._variants:
+                    self._variants[encoding] = self._load_variant(encoding)
+        return self._variants[encoding]
+
+    def _load_variant(self, encoding: str):
+        if not self.compressible:
+            return None
+        sibling = self.path + _SUFFIXES[encoding]
+        if os.path.exists(sibling):
+            with open(sibling, "rb") as f:
+                body = f.read()
+        elif encoding == "br" and brotli is None:
+            return None
+        else:
+            body = _compress(self.body, encoding)
+        if len(body) >= len(self.body):
+            return None
+        return body, f'"{self._digest}-{encoding}"'
+
+
+class FrontendBundle:
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self._files = None
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def _listing(self) -> set:
+        """Relative paths of every file in the build, read once."""
+        if self._files is None:
+            files = set()
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    files.add(os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/"))
+            self._files = files
+        return self._files
+
+    @property
+    def available(self) -> bool:
+        return "index.html" in self._listing()
+
+    def has(self, path: str) -> bool:
+        return path in self._listing()
+
+    def preload(self):
+        if self.available:
+            self.asset("index.html")
+
+    def asset(self, path: str):
+        """The in-memory Asset for a build-relative path, or None."""
+        asset = self._assets.get(path)
+        if asset is None and self.has(path):
+            with self._lock:
+                asset = self._assets.get(path)
+                if asset is None:
+                    if path == "index.html":
+                        cache_control = REVALIDATE
+                    elif path.startswith("static/"):
+                        cache_control = IMMUTABLE
+                    else:
+                        cache_control = SHORT_LIVED
+                    asset = self._assets[path] = Asset(os.path.join(self.root, path), cache_control)
+        return asset
+
+    def response(self, path: str, headers) -> Response:
+        """Response for `path` given the request headers; 404 if not in the build."""
+        asset = self.asset(path)
+        if asset is None:
+            return Response(status_code=404)
+
+        range_header = headers.get("range")
+        if range_header and (not headers.get("if-range") or headers["if-range"] == asset.etag):
+            try:
+                byte_range = _byte_range(range_header, len(asset.body))
+            except ValueError:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{len(asset.body)}"})
+            if byte_range is not None:
+                start, end = byte_range
+                return Response(content=asset.body[start:end + 1], status_code=206, media_type=asset.content_type,
+                                headers={"ETag": asset.etag, "Cache-Control": asset.cache_control,
+                                         "Accept-Ranges": "bytes",
+                                         "Content-Range": f"bytes {start}-{end}/{len(asset.body)}"})
+
+        body, etag, encoding = asset.body, asset.etag, None
+        if asset.compressible:
+            accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+            for candidate in _ENCODINGS:
+                variant = asset.variant(candidate) if candidate in accepted else None
+                if variant is not None:
+                    (body, etag), encoding = variant, candidate
+                    break
+
+        response_headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Accept-Ranges": "bytes"}
+        if asset.compressible:
+            response_headers["Vary"] = "Accept-Encoding"
+        if etag_matches(headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=response_headers)
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.content_type, headers=response_headers)
+
+
+# ===================== Precompression =====================
+
+def precompress(root: str) -> int:
+    """Write .gz (and .br, if brotli is installed) next to compressible build files."""
+    written = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.endswith((".gz", ".br")):
+                continue
+            path = os.path.join(dirpath, name)
+            asset = Asset(path, SHORT_LIVED)
+            if not asset.compressible:
+                continue
+            for encoding in _ENCODINGS:
+                if encoding == "br" and brotli is None:
+                    continue
+                body = _compress(asset.body, encoding, best=True)
+                if len(body) < len(asset.body):
+                    with open(path + _SUFFIXES[encoding], "wb") as f:
+                        f.write(body)
+                    written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress the frontend build for static serving")
+    parser.add_argument("build_dir", help="React build directory, e.g. ../frontend/build")
+    args = parser.parse_args()
+    written = precompress(args.build_dir)
+    print(f"Wrote {written} precompressed files" + ("" if brotli else " (gzip only; install brotli for .br)"))
+
+
+if __name__ == "__main__":
+    main()
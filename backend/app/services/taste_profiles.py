@@ -0,0 +1,371 @@
+# backend/app/services/taste_profiles.py
+"""Per-user taste vectors for personalized recipe ranking.
+
+An offline job streams every user's chat history, finds the recipes
+they talk about, and averages those recipes' embeddings into a taste
+vector per user. The embeddings come from the same `embed_text`
+interface as scripts/embed_recipes.py:
+- recipes in data/embeddings reuse their stored vectors;
+- other known recipes are embedded by name, for example MealDB meals
+  from the ingredient index.
+
+Requests then rerank candidate recipes with one matrix-vector product
+(candidate vectors @ taste vector). That costs microseconds, not an LLM
+call.
+
+The profile directory holds:
+- profiles.npy        float16, one unit taste vector per user (memory-mapped)
+- recipe_vectors.npy  float16, one unit vector per known recipe; widened
+                      to float32 on load, since converting the gathered
+                      rows on every request would cost more than the product
+- taste_meta.json     user IDs and recipe names, in row order
+
+Rebuild it periodically; a running process keeps the profiles it loaded:
+
+    python -m app.services.taste_profiles --embedder mock
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../../../data")
+PROFILE_DIR = os.getenv("TASTE_PROFILE_DIR", os.path.join(DATA_DIR, "taste_profiles"))
+PROFILES_FILE = "profiles.npy"
+RECIPE_VECTORS_FILE = "recipe_vectors.npy"
+META_FILE = "taste_meta.json"
+
+# How much taste can move a candidate relative to its relevance score
+TASTE_WEIGHT = float(os.getenv("TASTE_WEIGHT", "0.3"))
+# Callers fetch this many times the candidates they return, then rerank
+RERANK_POOL = 4
+
+# A recipe the user asked about says more than one the assistant suggested
+MENTION_WEIGHTS = {"user": 1.0, "assistant": 0.5}
+FAVORITE_WEIGHT = 2.0
+DISLIKED_WEIGHT = -1.0
+# Recipe names longer than this many words are not looked for in messages
+MAX_NAME_WORDS = 8
+USERS_PER_CHUNK = 1024
+
+
+def _words(text: str) -> list:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def recipe_key(name: str) -> str:
+    """'Paneer Butter-Masala!' -> 'paneer butter masala'."""
+    return " ".join(_words(name))
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ===================== Request time =====================
+
+class TasteProfiles:
+    def __init__(self, users: list, profiles: np.ndarray, recipes: list, recipe_vectors: np.ndarray):
+        if len(users) != len(profiles) or len(recipes) != len(recipe_vectors):
+            raise ValueError("taste profile metadata does not match its matrices")
+        self.users = {user_id: row for row, user_id in enumerate(users)}
+        self.profiles = profiles
+        self.names = {name: row for row, name in enumerate(recipes)}
+        self.recipes = {recipe_key(name): row for row, name in enumerate(recipes)}
+        self.recipe_vectors = np.asarray(recipe_vectors, dtype=np.float32)
+
+    @classmethod
+    def load(cls, directory: str = PROFILE_DIR, mmap: bool = True):
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        profiles = np.load(os.path.join(directory, PROFILES_FILE), mmap_mode="r" if mmap else None)
+        return cls(meta["users"], profiles, meta["recipes"], np.load(os.path.join(directory, RECIPE_VECTORS_FILE)))
+
+    def recipe_row(self, name: str) -> int:
+        row = self.names.get(name)
+        return row if row is not None else self.recipes.get(recipe_key(name or ""), -1)
+
+    def has(self, user_id: str) -> bool:
+        return user_id in self.users
+
+    def scores(self, user_id: str, names: list):
+        """Cosine between the user's taste and each named recipe; 0 for recipes
+        without a vector. None if the user has no profile."""
+        row = self.users.get(user_id)
+        if row is None:
+            return None
+        rows = np.array([self.recipe_row(name) for name in names], dtype=np.int64)
+        known = rows >= 0
+        scores = np.zeros(len(rows), dtype=np.float32)
+        if known.any():
+            scores[known] = self.recipe_vectors[rows[known]] @ self.profiles[row].astype(np.float32)
+        return scores
+
+    def rerank(self, user_id: str, candidates: list, relevance=None, name_key: str = "name",
+               weight: float = TASTE_WEIGHT) -> list:
+        """Candidates ordered by relevance + weight * taste, best first.
+
+        `relevance` defaults to the candidates' current order. Each
+        returned candidate gains a "taste" score. Users without a profile
+        get the candidates back unchanged.
+        """
+        scores = self.scores(user_id, [c.get(name_key) for c in candidates]) if candidates else None
+        if scores is None:
+            return candidates
+        if relevance is None:
+            relevance = 1.0 - np.arange(len(candidates)) / len(candidates)
+        combined = np.asarray(relevance, dtype=np.float32) + weight * scores
+        order = np.argsort(-combined, kind="stable").tolist()
+        taste = scores.round(4).tolist()
+        return [{**candidates[i], "taste": taste[i]} for i in order]
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_taste_profiles():
+    """Load the taste profiles once per process; None if they haven't been built."""
+    global _profiles
+    if _profiles is None:
+        with _profiles_lock:
+            if _profiles is None:
+                if not os.path.exists(os.path.join(PROFILE_DIR, META_FILE)):
+                    return None
+                _profiles = TasteProfiles.load(PROFILE_DIR)
+    return _profiles
+
+
+def personalize(user_id: str, candidates: list, limit: int, relevance=None, name_key: str = "name") -> list:
+    """The best `limit` candidates for user_id; plain truncation without a profile."""
+    profiles = get_taste_profiles()
+    if user_id and profiles is not None and profiles.has(user_id):
+        candidates = profiles.rerank(user_id, candidates, relevance=relevance, name_key=name_key)
+    return candidates[:limit]
+
+
+# ===================== Offline job =====================
+
+class RecipeMatcher:
+    """Finds known recipe names in free text, longest name first."""
+
+    def __init__(self, names: list):
+        self.rows = {}
+        for row, name in enumerate(names):
+            self.rows.setdefault(recipe_key(name), row)
+        self.rows.pop("", None)
+        self.max_words = min(MAX_NAME_WORDS, max((key.count(" ") + 1 for key in self.rows), default=0))
+
+    def lookup(self, name: str):
+        return self.rows.get(recipe_key(name))
+
+    def find(self, text: str) -> set:
+        """Rows of the recipes mentioned in text."""
+        words, found, i = _words(text), set(), 0
+        while i < len(words):
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                row = self.rows.get(" ".join(words[i:i + n]))
+                if row is not None:
+                    found.add(row)
+                    i += n
+                    break
+            else:
+                i += 1
+        return found
+
+
+def _embedders():
+    """scripts/embed_recipes.py's batch embedders; the repo root isn't on sys.path."""
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    from scripts.embed_recipes import EMBEDDERS
+    return EMBEDDERS
+
+
+def recipe_vocabulary(embed_batch, batch_size: int = 64):
+    """(names, float16 unit vectors) for every recipe we can rank.
+
+    Recipes in the retrieval index keep their stored vectors; the rest of
+    the ingredient index (CSV and MealDB recipes) is embedded by name.
+    """
+    from .ingredient_index import get_ingredient_index
+    from .retrieval import INDEX_DIR, META_FILE as INDEX_META_FILE, VECTORS_FILE
+
+    names, blocks, seen = [], [], set()
+    vectors_path = os.path.join(INDEX_DIR, VECTORS_FILE)
+    if os.path.exists(vectors_path):
+        stored = np.load(vectors_path, mmap_mode="r")
+        with open(os.path.join(INDEX_DIR, INDEX_META_FILE), encoding="utf-8") as f:
+            meta = [json.loads(line) for line in f if line.strip()]
+        rows = []
+        for row, item in enumerate(meta):
+            key = recipe_key(item["name"])
+            if key and key not in seen:
+                seen.add(key)
+                names.append(item["name"])
+                rows.append(row)
+        for start in range(0, len(rows), 65536):
+            blocks.append(_unit_rows(stored[rows[start:start + 65536]]).astype(np.float16))
+
+    index = get_ingredient_index()
+    todo = []
+    for recipe in index.recipes if index is not None else []:
+        key = recipe_key(recipe["name"])
+        if key and key not in seen:
+            seen.add(key)
+            todo.append(recipe["name"])
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        blocks.append(_unit_rows(embed_batch(batch)).astype(np.float16))
+        names.extend(batch)
+
+    if not names:
+        raise SystemExit("No recipes to rank: build data/embeddings or the ingredient index first")
+    dims = {block.shape[1] for block in blocks}
+    if len(dims) > 1:
+        raise SystemExit(f"Embedder dimension does not match the stored recipe vectors: {sorted(dims)}")
+    return names, np.concatenate(blocks)
+
+
+async def user_mentions(user_ref, matcher: RecipeMatcher):
+    """(recipe rows, weights) from one user's preferences and chat messages."""
+    from .chat_export import _pages
+
+    rows, weights = [], []
+    snapshot = await user_ref.get()
+    preferences = (snapshot.to_dict() or {}).get("preferences", {}) if snapshot.exists else {}
+    for field, weight in (("favorite_recipes", FAVORITE_WEIGHT), ("disliked_recipes", DISLIKED_WEIGHT)):
+        for name in preferences.get(field, []):
+            row = matcher.lookup(name)
+            if row is not None:
+                rows.append(row)
+                weights.append(weight)
+
+    async for chats in _pages(user_ref.collection("conversations").order_by("__name__")):
+        for chat in chats:
+            if chat.to_dict().get("deleted"):
+                continue
+            async for messages in _pages(chat.reference.collection("messages").order_by("__name__")):
+                for message in messages:
+                    data = message.to_dict()
+                    weight = MENTION_WEIGHTS.get(data.get("sender"))
+                    if weight:
+                        for row in matcher.find(data.get("content", "")):
+                            rows.append(row)
+                            weights.append(weight)
+    return rows, weights
+
+
+def taste_vectors(user_rows: np.ndarray, recipe_rows: np.ndarray, weights: np.ndarray,
+                  recipe_vectors: np.ndarray, n_users: int) -> np.ndarray:
+    """(n_users, dim) unit taste vectors from (user, recipe, weight) mentions.
+
+    Repeated mentions are summed per (user, recipe) first. The weighted
+    recipe vectors are then summed per user with one gather and one
+    reduceat, with no Python loop over users.
+    """
+    profiles = np.zeros((n_users, recipe_vectors.shape[1]), dtype=np.float32)
+    if not len(user_rows):
+        return profiles
+    keys = user_rows.astype(np.int64) * len(recipe_vectors) + recipe_rows
+    keys, inverse = np.unique(keys, return_inverse=True)
+    pair_weights = np.bincount(inverse, weights=weights).astype(np.float32)
+    users, recipes = np.divmod(keys, len(recipe_vectors))
+    weighted = np.asarray(recipe_vectors[recipes], dtype=np.float32) * pair_weights[:, None]
+    # keys are sorted, so each user's pairs are contiguous
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    profiles[users[starts]] = np.add.reduceat(weighted, starts, axis=0)
+    return _unit_rows(profiles)
+
+
+async def build(embed_batch, out_dir: str = PROFILE_DIR, concurrency: int = 8, batch_size: int = 64,
+                vocabulary=None) -> dict:
+    """Compute every user's taste vector and write the profile directory.
+
+    `vocabulary` is a precomputed (names, float16 vectors) pair; by
+    default it is built with recipe_vocabulary().
+    """
+    from .firestore_db import db
+
+    started = time.perf_counter()
+    names, recipe_vectors = vocabulary or recipe_vocabulary(embed_batch, batch_size)
+    matcher = RecipeMatcher(names)
+    os.makedirs(out_dir, exist_ok=True)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def mentions(ref):
+        async with limit:
+            return await user_mentions(ref, matcher)
+
+    async def write_chunk(refs, out):
+        results = await asyncio.gather(*(mentions(ref) for ref in refs))
+        kept = [(ref.id, rows, weights) for ref, (rows, weights) in zip(refs, results) if rows]
+        if not kept:
+            return []
+        user_rows = np.repeat(np.arange(len(kept)), [len(rows) for _, rows, _ in kept])
+        recipe_rows = np.concatenate([rows for _, rows, _ in kept]).astype(np.int64)
+        weights = np.concatenate([w for _, _, w in kept]).astype(np.float32)
+        chunk = taste_vectors(user_rows, recipe_rows, weights, recipe_vectors, len(kept))
+        # A user whose likes and dislikes cancel out has no usable taste
+        usable = np.linalg.norm(chunk, axis=1) > 0
+        out.write(chunk[usable].astype(np.float16).tobytes())
+        return [user_id for (user_id, _, _), ok in zip(kept, usable) if ok]
+
+    # Rows are streamed to a raw file, then copied into an .npy of the final size
+    raw_path = os.path.join(out_dir, PROFILES_FILE + ".raw")
+    users, refs, scanned = [], [], 0
+    with open(raw_path, "wb") as out:
+        async for ref in db.collection("users").list_documents():
+            refs.append(ref)
+            if len(refs) == USERS_PER_CHUNK:
+                users += await write_chunk(refs, out)
+                scanned += len(refs)
+                refs = []
+        users += await write_chunk(refs, out)
+        scanned += len(refs)
+
+    dim = recipe_vectors.shape[1]
+    raw = np.memmap(raw_path, dtype=np.float16, mode="r", shape=(len(users), dim)) if users else None
+    profiles = np.lib.format.open_memmap(os.path.join(out_dir, PROFILES_FILE + ".tmp.npy"), mode="w+",
+                                         dtype=np.float16, shape=(len(users), dim))
+    for start in range(0, len(users), 65536):
+        profiles[start:start + 65536] = raw[start:start + 65536]
+    profiles.flush()
+    del profiles, raw
+    os.remove(raw_path)
+
+    np.save(os.path.join(out_dir, RECIPE_VECTORS_FILE + ".tmp.npy"), recipe_vectors)
+    with open(os.path.join(out_dir, META_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "users": users, "recipes": names}, f, ensure_ascii=False)
+    # Meta last, so a reader never pairs new matrices with old names
+    os.replace(os.path.join(out_dir, PROFILES_FILE + ".tmp.npy"), os.path.join(out_dir, PROFILES_FILE))
+    os.replace(os.path.join(out_dir, RECIPE_VECTORS_FILE + ".tmp.npy"), os.path.join(out_dir, RECIPE_VECTORS_FILE))
+    os.replace(os.path.join(out_dir, META_FILE + ".tmp"), os.path.join(out_dir, META_FILE))
+    return {"users_scanned": scanned, "profiles": len(users), "recipes": len(names),
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build per-user taste vectors from chat histories")
+    parser.add_argument("--embedder", choices=sorted(_embedders()), default="mock")
+    parser.add_argument("--out", default=PROFILE_DIR)
+    parser.add_argument("--concurrency", type=int, default=8, help="users read from Firestore at once")
+    parser.add_argument("--batch-size", type=int, default=64, help="recipe names per embedding call")
+    args = parser.parse_args()
+    result = asyncio.run(build(_embedders()[args.embedder], args.out, args.concurrency, args.batch_size))
+    print(f"Built {result['profiles']} taste profiles from {result['users_scanned']} users "
+          f"over {result['recipes']} recipes in {result['seconds']}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
-from .firestore_db import db
-from google.cloud import firestore
-
-# Save a test chat message
-doc_ref = db.collection("chats").document()
-doc_ref.set({
-    "user_id": "test_user",
-    "message": "Hello!",
-    "bot_reply": "Hi there!",
-    "timestamp": firestore.SERVER_TIMESTAMP
-})
-
-print("✅ Test document saved to Firestore")
\ No newline at end of file
+# backend/app/services/test_firestore.py
+"""Manual check that the configured Firestore accepts writes.
+
+Writes one document to the real database, so it only runs when invoked
+directly (never on import or test collection):
+
+    cd backend
+    python -m app.services.test_firestore
+"""
+import asyncio
+from .firestore_db import db, firestore
+
+
+async def main():
+    # Save a test chat message
+    doc_ref = db.collection("chats").document()
+    await doc_ref.set({
+        "user_id": "test_user",
+        "message": "Hello!",
+        "bot_reply": "Hi there!",
+        "timestamp": firestore.SERVER_TIMESTAMP
+    })
+    print("✅ Test document saved to Firestore")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
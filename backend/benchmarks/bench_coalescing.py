@@ -0,0 +1,105 @@
+# backend/benchmarks/bench_coalescing.py
+"""Load test for single-flight coalescing of identical prompts.
+
+Simulates a trending dish: many users send the same first message at
+once, split between /chat/message and /chat/message/stream. Reports how
+many completions actually reached the (fake) OpenAI server, with
+coalescing on and off:
+
+    cd backend
+    python -m benchmarks.bench_coalescing --users 200 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from .bench_concurrency import percentile
+from .fake_openai import FakeOpenAIConfig, start_server
+
+PROMPTS = ["How do I make birria tacos?", "how to make Birria tacos", "Recipe for dalgona coffee"]
+
+
+async def send(client, user_id: str, message: str, stream: bool, latencies: list):
+    start = time.perf_counter()
+    if stream:
+        async with client.stream("POST", "/chat/message/stream", json={"user_id": user_id, "message": message}) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_lines():
+                pass
+    else:
+        response = await client.post("/chat/message", json={"user_id": user_id, "message": message})
+        response.raise_for_status()
+    latencies.append(time.perf_counter() - start)
+
+
+async def bench(users: int, coalesce: bool):
+    import httpx
+    from app.main import app
+    from app.services import llm
+    from app.services.conversation_service import write_queue
+    from app.services.singleflight import SingleFlight, StreamFlight
+
+    class NoFlight(SingleFlight):
+        async def do(self, key, factory):
+            self._count(True)
+            return await factory()
+
+    class NoStreamFlight(StreamFlight):
+        def subscribe(self, key, factory):
+            self._count(True)
+            return factory()
+
+    llm.llm_flights = SingleFlight() if coalesce else NoFlight()
+    llm.stream_flights = StreamFlight() if coalesce else NoStreamFlight()
+    write_queue.start()
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            send(client, f"user{i}", PROMPTS[i % len(PROMPTS)], i % 2 == 1, latencies)
+            for i in range(users)
+        ))
+        elapsed = time.perf_counter() - start
+    await write_queue.stop()
+    return elapsed, latencies, llm.llm_flights.stats(), llm.stream_flights.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream call reduction from request coalescing")
+    parser.add_argument("--users", type=int, default=200, help="simultaneous users")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake OpenAI seconds per completion")
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(latency=args.llm_latency, tokens_per_sec=400)
+    server = start_server(config)
+    os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    # Measure coalescing alone, not the response cache
+    os.environ["RESPONSE_CACHE"] = "off"
+
+    async def run_both():
+        from app.main import prewarm
+
+        # One event loop for both runs: the OpenAI client's pool is bound to it
+        await prewarm()
+        results = []
+        for coalesce in (False, True):
+            config.requests = 0
+            results.append((coalesce, *await bench(args.users, coalesce), config.requests))
+        return results
+
+    for coalesce, elapsed, latencies, flights, streams, upstream in asyncio.run(run_both()):
+        print(f"coalescing={'on' if coalesce else 'off'} users={args.users} elapsed={elapsed:.2f}s")
+        print(f"  upstream requests={upstream} "
+              f"(message {flights['upstream']}/{flights['calls']}, stream {streams['upstream']}/{streams['calls']})")
+        print("  latency p50={:.1f}ms p95={:.1f}ms p99={:.1f}ms".format(
+            *(percentile(latencies, p) * 1000 for p in (50, 95, 99))
+        ))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# backend/benchmarks/bench_concurrency.py
+"""Concurrency benchmark for the chat routes.
+
+Runs N simultaneous chats through the real FastAPI app with the in-memory
+Firestore fake and the local fake OpenAI server, and reports throughput
+and latency percentiles:
+
+    cd backend
+    python -m benchmarks.bench_concurrency --chats 100 --turns 3 --llm-latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from .fake_openai import FakeOpenAIConfig, start_server
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_chat(client, user_id: str, turns: int, latencies: list):
+    async def timed(method, url, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        return response.json()
+
+    chat_id = (await timed("POST", "/chat/new", json={"user_id": user_id}))["chat_id"]
+    for turn in range(turns):
+        await timed("POST", "/chat/message", json={
+            "user_id": user_id, "chat_id": chat_id, "message": f"How do I make dish {turn} for {user_id}?",
+        })
+    await timed("GET", f"/chat/chats/{user_id}")
+
+
+async def bench(chats: int, turns: int):
+    import httpx
+    from app.main import app, prewarm
+    from app.services.conversation_service import write_queue
+
+    # What the startup hooks would do; ASGITransport doesn't run them
+    await prewarm()
+    write_queue.start()
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_chat(client, f"user{i}", turns, latencies) for i in range(chats)))
+        elapsed = time.perf_counter() - start
+    await write_queue.stop()
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat benchmark against in-memory fakes")
+    parser.add_argument("--chats", type=int, default=50, help="simultaneous chats")
+    parser.add_argument("--turns", type=int, default=3, help="messages per chat")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake OpenAI seconds per completion")
+    args = parser.parse_args()
+
+    server = start_server(FakeOpenAIConfig(latency=args.llm_latency))
+    os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    # Every prompt is unique anyway; keep the cache out of the measurement
+    os.environ.setdefault("RESPONSE_CACHE", "off")
+
+    elapsed, latencies = asyncio.run(bench(args.chats, args.turns))
+    server.shutdown()
+
+    print(f"chats={args.chats} turns={args.turns} requests={len(latencies)} elapsed={elapsed:.2f}s")
+    print(f"throughput={len(latencies) / elapsed:.1f} req/s")
+    print("latency p50={:.1f}ms p95={:.1f}ms p99={:.1f}ms".format(
+        *(percentile(latencies, p) * 1000 for p in (50, 95, 99))
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/benchmarks/bench_export.py
+"""Memory and speed of the chat export/import against the in-memory Firestore.
+
+Seeds one user with a long chat history, then measures peak traced memory
+(tracemalloc) for the streaming export, for reading the same history with
+get_chat_messages (one list per chat), and for importing the export. The
+export's peak should stay flat as --messages grows; the list-based read
+grows with it. The fake keeps every document in memory, so the seeded
+data itself is excluded from the peaks. Its timings are not Firestore's
+either: the fake re-sorts a collection for every cursor page, which an
+indexed query does not.
+
+    cd backend
+    python -m benchmarks.bench_export --chats 20 --messages 20000
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+
+async def seed(user_id: str, chats: int, messages: int):
+    from app.services.conversation_service import _new_turn, _turn_writes, create_new_chat
+    from app.services.firestore_db import db
+
+    turns_per_chat = max(1, messages // chats // 2)
+    for _ in range(chats):
+        chat_id = await create_new_chat(user_id)
+        chat_ref = db.collection("users").document(user_id).collection("conversations").document(chat_id)
+        for start in range(0, turns_per_chat, 200):
+            batch = db.batch()
+            turns = [_new_turn(f"How long do I simmer dal batch {start + i}?", "About 25 minutes. " * 20)
+                     for i in range(min(200, turns_per_chat - start))]
+            writes, _ = _turn_writes(chat_ref, chat_id, turns, first_turn=start == 0)
+            for ref, data, merge in writes:
+                batch.set(ref, data, merge=merge)
+            await batch.commit()
+
+
+async def measure(label: str, coro_factory):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await coro_factory()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:22} {elapsed * 1000:8.1f}ms  peak={peak / 1024:9.1f}KB  {result}")
+
+
+async def bench(chats: int, messages: int):
+    from app.services.chat_export import export_chats, import_chats
+    from app.services.conversation_service import get_chat_messages, get_user_chats
+
+    await seed("export-user", chats, messages)
+    path = "/tmp/recipe-genie-bench-export.ndjson"
+
+    async def export():
+        size = 0
+        with open(path, "w", encoding="utf-8") as f:
+            async for chunk in export_chats("export-user"):
+                size += len(chunk)
+                f.write(chunk)
+        return f"{size / 1e6:.1f}MB"
+
+    async def read_lists():
+        count = 0
+        for chat in await get_user_chats("export-user", limit=10 ** 6):
+            count += len(await get_chat_messages("export-user", chat["id"]))
+        return f"{count} messages"
+
+    async def import_():
+        async def chunks():
+            with open(path, "rb") as f:
+                while data := f.read(1 << 16):
+                    yield data
+        return await import_chats("import-user", chunks())
+
+    await measure("export (streaming)", export)
+    await measure("get_chat_messages", read_lists)
+    await measure("import (batched)", import_)
+    os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat export/import memory benchmark")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=10000, help="total messages across the chats")
+    args = parser.parse_args()
+    os.environ["FIRESTORE_BACKEND"] = "memory"
+    asyncio.run(bench(args.chats, args.messages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# backend/benchmarks/bench_markdown.py
+"""Golden-output check and microbenchmark for the markdown cleaner.
+
+benchmarks/markdown_corpus holds LLM recipe replies (*.md) next to the
+text the chat should show for them (*.txt). Each reply is cleaned whole
+and streamed in token-sized and random chunks; all three must match the
+golden text. Then both the cleaner and the six-regex version it replaced
+are timed on every reply, along with streaming it in its token chunks;
+the per-chunk cost should stay flat however long a line gets:
+
+    cd backend
+    python -m benchmarks.bench_markdown
+    python -m benchmarks.bench_markdown --update   # rewrite the .txt files
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import time
+
+from .fake_openai import _tokens
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "markdown_corpus")
+
+
+def legacy_clean(text: str):
+    """The per-construct regex passes the cleaner replaced (for comparison)."""
+    if not text: return text
+    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)
+    text = re.sub(r"\*(.*?)\*", r"\1", text)
+    text = re.sub(r"_(.*?)_", r"\1", text)
+    text = re.sub(r"^#+[ \t]*(.*?)$", r"\1", text, flags=re.MULTILINE)
+    text = re.sub(r"`(.*?)`", r"\1", text)
+    text = re.sub(r"\[(.*?)\]\(.*?\)", r"\1", text)
+    return text.strip()
+
+
+def stream_clean(text: str, chunks) -> str:
+    from app.services.markdown import MarkdownStream
+
+    stream = MarkdownStream()
+    return "".join(stream.feed(chunk) for chunk in chunks) + stream.close()
+
+
+def random_chunks(text: str, rng: random.Random):
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 16)
+        yield text[i:i + n]
+        i += n
+
+
+def timeit(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown cleaner golden check and microbenchmark")
+    parser.add_argument("--repeat", type=int, default=2000, help="timing iterations per reply")
+    parser.add_argument("--update", action="store_true", help="rewrite golden .txt files from the current output")
+    args = parser.parse_args()
+
+    from app.services.markdown import clean_all_markdown
+
+    rng = random.Random(0)
+    failures = 0
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.md"))):
+        with open(path, encoding="utf-8") as f:
+            reply = f.read()
+        golden_path = path[:-3] + ".txt"
+        cleaned = clean_all_markdown(reply)
+        if args.update:
+            with open(golden_path, "w", encoding="utf-8") as f:
+                f.write(cleaned)
+
+        with open(golden_path, encoding="utf-8") as f:
+            golden = f.read()
+        outputs = {
+            "whole": cleaned,
+            "tokens": stream_clean(reply, _tokens(reply)),
+            "random": stream_clean(reply, random_chunks(reply, rng)),
+        }
+        bad = [mode for mode, output in outputs.items() if output != golden]
+        failures += bool(bad)
+
+        new = timeit(clean_all_markdown, reply, args.repeat)
+        old = timeit(legacy_clean, reply, args.repeat)
+        chunks = list(_tokens(reply))
+        streamed = timeit(lambda text: stream_clean(text, chunks), reply, max(1, args.repeat // 10))
+        print(f"{os.path.basename(path):32} {len(reply):5d} chars  "
+              f"{'FAIL ' + ','.join(bad) if bad else 'ok':10} "
+              f"clean={new * 1e6:7.1f}us legacy={old * 1e6:7.1f}us "
+              f"stream={streamed * 1e6:7.1f}us ({streamed / len(chunks) * 1e6:.1f}us/chunk)")
+
+    # A long unbroken line must stream in time linear in its length
+    for length in (2000, 20000):
+        line = ("Simmer the dal until soft, " * (length // 27 + 1))[:length]
+        chunks = [line[i:i + 4] for i in range(0, length, 4)]
+        streamed = timeit(lambda text: stream_clean(text, chunks), line, 20)
+        print(f"{'one line, 4-char chunks':32} {length:5d} chars  {'':10} "
+              f"stream={streamed * 1e6:7.1f}us ({streamed / len(chunks) * 1e6:.1f}us/chunk)")
+
+    if failures:
+        raise SystemExit(f"{failures} corpus replies differ from their golden output")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/benchmarks/bench_rate_limit.py
+"""Burst test for the LLM gateway against a rate-limited fake OpenAI.
+
+One heavy user fires a burst of messages while a few light users send a
+couple each. The fake server answers 429 (with retry-after) above its
+requests/min limit. The burst runs once with throttling and retries
+switched off and once through a gateway configured for that limit:
+
+    cd backend
+    python -m benchmarks.bench_rate_limit --rpm-limit 1200 --heavy 60 --light 10
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from .bench_concurrency import percentile
+from .fake_openai import DEFAULT_REPLY, FakeOpenAIConfig, start_server
+
+
+async def send(user_id: str, n: int, latencies: list, results: list):
+    from app.services.llm import ask_llm
+
+    async def one(i):
+        start = time.perf_counter()
+        reply = await ask_llm(f"Dish {i} for {user_id}?", user_id=user_id, use_cache=False)
+        latencies.append(time.perf_counter() - start)
+        results.append(reply == DEFAULT_REPLY.strip())
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def bench(gateway, heavy: int, light: int):
+    from app.services import llm
+
+    llm.llm_gateway = gateway
+    heavy_lat, light_lat, results = [], [], []
+    start = time.perf_counter()
+    await asyncio.gather(
+        send("heavy", heavy, heavy_lat, results),
+        *(send(f"light{i}", 2, light_lat, results) for i in range(light)),
+    )
+    return time.perf_counter() - start, heavy_lat, light_lat, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM gateway under a rate-limited upstream")
+    parser.add_argument("--rpm-limit", type=int, default=1200, help="fake server requests/min")
+    parser.add_argument("--heavy", type=int, default=60, help="messages in the heavy user's burst")
+    parser.add_argument("--light", type=int, default=10, help="light users sending 2 messages each")
+    parser.add_argument("--llm-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(latency=args.llm_latency, rpm_limit=args.rpm_limit)
+    server = start_server(config)
+    os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["RESPONSE_CACHE"] = "off"
+
+    from app.services.llm_gateway import LLMGateway
+
+    async def run_both():
+        from app.main import prewarm
+
+        await prewarm()
+        runs = []
+        for name, gateway in (
+            ("unthrottled", LLMGateway(rpm=10 ** 6, tpm=10 ** 9, max_concurrency=10 ** 6, max_retries=0)),
+            # A few slots: the fair queue only matters once callers wait
+            ("gateway", LLMGateway(rpm=args.rpm_limit, tpm=10 ** 9, max_concurrency=4, base_delay=0.1)),
+        ):
+            config.requests = config.rate_limited = 0
+            config.recent.clear()
+            await asyncio.sleep(1.0)  # let the server's window drain between runs
+            runs.append((name, gateway, *await bench(gateway, args.heavy, args.light),
+                         config.requests, config.rate_limited))
+        return runs
+
+    for name, gateway, elapsed, heavy_lat, light_lat, results, upstream, limited in asyncio.run(run_both()):
+        print(f"{name}: ok={sum(results)}/{len(results)} elapsed={elapsed:.2f}s "
+              f"upstream={upstream} 429s={limited}")
+        print("  light users p50={:.0f}ms p95={:.0f}ms, heavy user p50={:.0f}ms p95={:.0f}ms".format(
+            percentile(light_lat, 50) * 1000, percentile(light_lat, 95) * 1000,
+            percentile(heavy_lat, 50) * 1000, percentile(heavy_lat, 95) * 1000,
+        ))
+        print(f"  {gateway.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# backend/benchmarks/bench_startup.py
+"""Cold-start check: how long `import app.main` takes, and what it pulls in.
+
+Imports the app in fresh interpreters under `python -X importtime`,
+reports the median total and the slowest top-level packages, and fails
+if a module that should only load on first use (the OpenAI SDK,
+firebase_admin, tiktoken) was imported eagerly or the median is over
+--budget-ms:
+
+    cd backend
+    python -m benchmarks.bench_startup --runs 5 --top 15
+    python -m benchmarks.bench_startup --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Loaded on first use or by the startup prewarm, never by the import
+DEFERRED = ("openai", "firebase_admin", "google.cloud.firestore", "tiktoken")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile():
+    """Run one cold import; returns total us, {module app.main imports: cumulative us}, all names."""
+    env = dict(os.environ, FIRESTORE_BACKEND=os.getenv("FIRESTORE_BACKEND", "firebase"), PREWARM="0")
+    # The app must import without credentials; they are only read on first use
+    env.pop("OPENAI_API_KEY", None)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"import app.main failed:\n{result.stderr[-2000:]}")
+    total, children, modules = 0, {}, set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        modules.add(name)
+        # Children are listed before their parent, one level (2 spaces) deeper
+        if indent == 3:
+            children[name] = cumulative
+        elif indent == 1:
+            if name == "app.main":
+                total = cumulative
+                break
+            children.clear()
+    return total, children, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report for app.main")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to sample")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports of app.main to list")
+    parser.add_argument("--budget-ms", type=float, default=0, help="fail if the median exceeds this (0 = no budget)")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    args = parser.parse_args()
+
+    totals, profiles, eager = [], [], set()
+    for _ in range(args.runs):
+        total, children, modules = import_profile()
+        totals.append(total / 1000)
+        profiles.append(children)
+        eager |= {name for name in DEFERRED if name in modules}
+
+    median = statistics.median(totals)
+    slowest = sorted(profiles[-1].items(), key=lambda item: item[1], reverse=True)
+    print(f"import app.main: median={median:.0f}ms min={min(totals):.0f}ms max={max(totals):.0f}ms "
+          f"over {args.runs} runs")
+    for name, us in slowest[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"median_ms": round(median, 1), "runs_ms": [round(t, 1) for t in totals],
+                       "top_imports_ms": {name: round(us / 1000, 1) for name, us in slowest[:args.top]},
+                       "eager_deferred": sorted(eager)}, f, indent=2)
+            f.write("\n")
+
+    problems = []
+    if eager:
+        problems.append(f"imported at startup but meant to load lazily: {', '.join(sorted(eager))}")
+    if args.budget_ms and median > args.budget_ms:
+        problems.append(f"median {median:.0f}ms is over the {args.budget_ms:.0f}ms budget")
+    if problems:
+        raise SystemExit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
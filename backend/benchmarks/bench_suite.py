@@ -0,0 +1,353 @@
+# backend/benchmarks/bench_suite.py
+"""End-to-end benchmark suite with machine-readable results.
+
+Boots the real FastAPI app against the in-memory Firestore fake, the fake
+OpenAI server and the fake TheMealDB, then runs each workload in turn:
+
+    new_chat      first message of a fresh chat
+    multi_turn    follow-up message in an existing short chat
+    long_history  follow-up in a chat with many earlier turns
+    stream        streamed (NDJSON) reply, read to the end
+    listing       sidebar chat list
+    messages      one page of a chat's messages
+    delete        delete a chat
+    recipes       GET /recipes
+    mealdb        ingredient suggestions through the TheMealDB client
+
+Every workload reports throughput and p50/p95/p99 latency from a
+concurrent timed pass, then allocation per request from a short
+sequential pass under tracemalloc (peak traced memory above the starting
+point, and what was still held afterwards). The fakes run in-process, so
+their share of the allocations is included.
+
+    cd backend
+    python -m benchmarks.bench_suite --requests 200 --concurrency 20
+    python -m benchmarks.bench_suite --json results.json
+    python -m benchmarks.bench_suite --baseline results.json --threshold 0.25
+
+With --baseline, workloads whose p95 or allocation grew by more than
+--threshold are listed and the run exits non-zero, so the suite can gate
+a commit in CI.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from .bench_concurrency import percentile
+from .fake_mealdb import FakeMealDBConfig, INGREDIENTS, start_server as start_mealdb
+from .fake_openai import FakeOpenAIConfig, start_server as start_openai
+
+# ===================== Workloads =====================
+# Each workload has an optional setup(client, n) that prepares n units of
+# state and returns them, and an op(client, i, state) that is timed.
+
+
+async def _post_json(client, url: str, payload: dict):
+    response = await client.post(url, json=payload)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _new_chats(client, prefix: str, n: int, turns: int = 0):
+    """Create n chats (one user each) with `turns` earlier messages."""
+    from app.services.conversation_service import save_chat_message
+
+    chats = []
+    for i in range(n):
+        user_id = f"{prefix}{i}"
+        chat_id = (await _post_json(client, "/chat/new", {"user_id": user_id}))["chat_id"]
+        for turn in range(turns):
+            # Seed directly; going through the LLM would dominate setup time
+            await save_chat_message(user_id, chat_id, f"Question {turn} about dal tadka?",
+                                    f"Answer {turn}: temper cumin and garlic in ghee, then add the dal. " * 4)
+        chats.append((user_id, chat_id))
+    return chats
+
+
+async def op_new_chat(client, i, state):
+    await _post_json(client, "/chat/message", {"user_id": f"new{i}", "message": f"What can I cook with {i} eggs?"})
+
+
+async def setup_multi_turn(client, n):
+    return await _new_chats(client, "multi", n, turns=2)
+
+
+async def op_multi_turn(client, i, state):
+    user_id, chat_id = state[i]
+    await _post_json(client, "/chat/message", {
+        "user_id": user_id, "chat_id": chat_id, "message": f"Can I make it spicier, version {i}?",
+    })
+
+
+async def setup_long_history(client, n):
+    return await _new_chats(client, "long", n, turns=40)
+
+
+async def op_long_history(client, i, state):
+    user_id, chat_id = state[i]
+    await _post_json(client, "/chat/message", {
+        "user_id": user_id, "chat_id": chat_id, "message": f"Summarize what we changed, take {i}.",
+    })
+
+
+async def op_stream(client, i, state):
+    payload = {"user_id": f"stream{i}", "message": f"Stream me a recipe for {i} people."}
+    async with client.stream("POST", "/chat/message/stream", json=payload) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_lines():
+            pass
+
+
+async def setup_listing(client, n):
+    # A few users with a full sidebar, listed over and over
+    users = [chat[0] for chat in await _new_chats(client, "list", 10)]
+    for user_id in users:
+        for _ in range(24):
+            await _post_json(client, "/chat/new", {"user_id": user_id})
+    return users
+
+
+async def op_listing(client, i, state):
+    response = await client.get(f"/chat/chats/{state[i % len(state)]}")
+    response.raise_for_status()
+
+
+async def setup_messages(client, n):
+    return await _new_chats(client, "read", 10, turns=20)
+
+
+async def op_messages(client, i, state):
+    user_id, chat_id = state[i % len(state)]
+    response = await client.get(f"/chat/messages/{user_id}/{chat_id}", params={"limit": 20})
+    response.raise_for_status()
+
+
+async def setup_delete(client, n):
+    return await _new_chats(client, "delete", n, turns=3)
+
+
+async def op_delete(client, i, state):
+    user_id, chat_id = state[i]
+    response = await client.delete(f"/chat/{user_id}/{chat_id}")
+    response.raise_for_status()
+
+
+async def op_recipes(client, i, state):
+    response = await client.get("/recipes/", params={"limit": 10})
+    response.raise_for_status()
+
+
+async def op_mealdb(client, i, state):
+    from app.services.recipe_api import suggest_recipe_by_ingredients
+
+    pantry = [INGREDIENTS[(i + k) % len(INGREDIENTS)] for k in range(3)]
+    await suggest_recipe_by_ingredients(pantry, limit=5)
+
+
+WORKLOADS = {
+    "new_chat": (None, op_new_chat),
+    "multi_turn": (setup_multi_turn, op_multi_turn),
+    "long_history": (setup_long_history, op_long_history),
+    "stream": (None, op_stream),
+    "listing": (setup_listing, op_listing),
+    "messages": (setup_messages, op_messages),
+    "delete": (setup_delete, op_delete),
+    "recipes": (None, op_recipes),
+    "mealdb": (None, op_mealdb),
+}
+
+
+# ===================== Runner =====================
+
+async def timed_pass(client, op, state, requests: int, concurrency: int, offset: int = 0):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await op(client, offset + i, state)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    print(f"  first error: {e!r}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return time.perf_counter() - start, latencies, errors
+
+
+async def alloc_pass(client, op, state, requests: int, offset: int):
+    """Mean peak and retained traced bytes per request, run one at a time."""
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for i in range(requests):
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await op(client, offset + i, state)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks), sum(retained) / len(retained)
+
+
+async def run_workload(client, name: str, requests: int, concurrency: int, alloc_requests: int):
+    from app.services.conversation_service import write_queue
+
+    setup, op = WORKLOADS[name]
+    warmup = requests + alloc_requests
+    state = await setup(client, warmup + 1) if setup else None
+    # One untimed request warms imports and connection pools
+    await op(client, warmup, state)
+    await write_queue.flush()
+    elapsed, latencies, errors = await timed_pass(client, op, state, requests, concurrency)
+    await write_queue.flush()
+    peak, retained = await alloc_pass(client, op, state, alloc_requests, offset=requests)
+    await write_queue.flush()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "alloc_retained_kb": round(retained / 1024, 1),
+    }
+
+
+async def run_suite(names, requests: int, concurrency: int, alloc_requests: int):
+    import httpx
+    from app.main import app, prewarm
+    from app.services.conversation_service import write_queue
+    from app.services.recipe_api import meal_db
+
+    # What the startup hooks would do; ASGITransport doesn't run them
+    await prewarm()
+    write_queue.start()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name in names:
+            results[name] = await run_workload(client, name, requests, concurrency, alloc_requests)
+            print(format_row(name, results[name]))
+    await write_queue.stop()
+    await meal_db.aclose()
+    return results
+
+
+# ===================== Reporting =====================
+
+def format_row(name: str, r: dict) -> str:
+    return (f"{name:13} {r['throughput_rps']:8.1f} req/s  p50={r['p50_ms']:7.1f}ms "
+            f"p95={r['p95_ms']:7.1f}ms p99={r['p99_ms']:7.1f}ms  "
+            f"alloc peak={r['alloc_peak_kb']:8.1f}KB retained={r['alloc_retained_kb']:7.1f}KB"
+            + (f"  errors={r['errors']}" if r["errors"] else ""))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Sub-millisecond routes jitter by more than any sane threshold
+MIN_LATENCY_DELTA_MS = 2.0
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Workload/metric pairs that regressed by more than `threshold`."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "alloc_peak_kb"):
+            old, new = previous.get(metric), current[metric]
+            if metric.endswith("_ms") and new - (old or 0) < MIN_LATENCY_DELTA_MS:
+                continue
+            if old and new > old * (1 + threshold):
+                regressions.append(f"{name}.{metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+        if current["errors"] > previous.get("errors", 0):
+            regressions.append(f"{name}.errors: {previous.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark suite against local fakes")
+    parser.add_argument("workloads", nargs="*", help=f"workloads to run (default: all of {', '.join(WORKLOADS)})")
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per workload")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight at once")
+    parser.add_argument("--alloc-requests", type=int, default=10, help="requests traced for allocations")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake OpenAI seconds before the first byte")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="fake OpenAI token rate (0 = unlimited)")
+    parser.add_argument("--mealdb-latency", type=float, default=0.01, help="fake TheMealDB seconds per request")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+    names = args.workloads or list(WORKLOADS)
+    unknown = [name for name in names if name not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+
+    openai_config = FakeOpenAIConfig(latency=args.llm_latency, tokens_per_sec=args.tokens_per_sec)
+    openai_server = start_openai(openai_config)
+    mealdb_server = start_mealdb(FakeMealDBConfig(latency=args.mealdb_latency))
+    os.environ["FIRESTORE_BACKEND"] = "memory"
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_server.server_address[1]}/v1"
+    os.environ["MEALDB_BASE_URL"] = f"http://127.0.0.1:{mealdb_server.server_address[1]}/api/json/v1/1"
+    # Prompts repeat across requests; measure the full path, not the cache
+    os.environ["RESPONSE_CACHE"] = "off"
+    # The gateway's production limits would throttle the benchmark itself
+    os.environ.setdefault("OPENAI_RPM", "1000000")
+    os.environ.setdefault("OPENAI_TPM", "1000000000")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    results = asyncio.run(run_suite(names, args.requests, args.concurrency, args.alloc_requests))
+    openai_server.shutdown()
+    mealdb_server.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline", "workloads")},
+        "llm_calls": openai_config.requests,
+        "workloads": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("Regressions against", args.baseline)
+            for line in regressions:
+                print("  " + line)
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
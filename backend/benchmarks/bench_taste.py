@@ -0,0 +1,98 @@
+# backend/benchmarks/bench_taste.py
+"""Taste-profile job throughput and the per-request cost of reranking.
+
+Seeds --users users in the in-memory Firestore, each with chats that
+mention recipes from a synthetic catalog. It then runs the offline job
+into a temporary directory, loads the result the way the server does
+(memory-mapped float16), and times rerank() on --candidates candidates.
+The p99 should stay well under a millisecond:
+
+    cd backend
+    python -m benchmarks.bench_taste --users 2000 --recipes 20000 --candidates 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from .bench_concurrency import percentile
+
+DISHES = ["masala", "biryani", "dal", "tikka", "korma", "dosa", "paneer", "chole", "pulao", "kheer",
+          "halwa", "vindaloo", "saag", "rogan", "josh", "kofta", "pakora", "idli", "upma", "rasam"]
+
+
+def catalog(count: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    names = [f"{DISHES[i % 20]} {DISHES[(i // 20) % 20]} no {i}" for i in range(count)]
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return names, vectors.astype(np.float16)
+
+
+async def seed(users: int, names: list, chats: int, messages: int):
+    from app.services.firestore_db import db
+
+    rng = random.Random(0)
+    for u in range(users):
+        conversations = db.collection("users").document(f"user-{u}").collection("conversations")
+        for c in range(chats):
+            chat = conversations.document(f"chat-{c}")
+            batch = db.batch()
+            batch.set(chat, {"id": chat.id, "title": "Dinner ideas", "message_count": messages})
+            for m in range(messages):
+                sender = "user" if m % 2 == 0 else "assistant"
+                batch.set(chat.collection("messages").document(f"m{m:04d}"), {
+                    "sender": sender,
+                    "content": f"How about {rng.choice(names)}? It goes well with rice and a quick raita.",
+                })
+            await batch.commit()
+
+
+async def bench(args):
+    from app.services.taste_profiles import TasteProfiles, build
+
+    names, vectors = catalog(args.recipes, args.dim)
+    await seed(args.users, names, args.chats, args.messages)
+    with tempfile.TemporaryDirectory() as out_dir:
+        result = await build(None, out_dir, vocabulary=(names, vectors))
+        mentions = args.users * args.chats * args.messages
+        print(f"job: {result['profiles']} profiles from {mentions} messages in {result['seconds']}s "
+              f"({args.users / max(result['seconds'], 1e-9):.0f} users/s)")
+        profile_bytes = os.path.getsize(os.path.join(out_dir, "profiles.npy"))
+        print(f"profiles.npy: {profile_bytes / 1024:.0f}KB ({profile_bytes / max(result['profiles'], 1):.0f} B/user)")
+
+        profiles = TasteProfiles.load(out_dir)
+        rng = random.Random(1)
+        timings = []
+        for i in range(args.iterations):
+            user_id = f"user-{rng.randrange(args.users)}"
+            candidates = [{"name": name, "score": 1.0 - j / args.candidates}
+                          for j, name in enumerate(rng.sample(names, args.candidates))]
+            start = time.perf_counter()
+            profiles.rerank(user_id, candidates, relevance=[c["score"] for c in candidates])
+            timings.append(time.perf_counter() - start)
+        timings = timings[len(timings) // 10:]  # drop warmup (page faults on the mmap)
+        print(f"rerank {args.candidates} candidates: p50={percentile(timings, 50) * 1e6:.0f}us "
+              f"p99={percentile(timings, 99) * 1e6:.0f}us max={max(timings) * 1e6:.0f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taste profile job and rerank benchmark")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=2)
+    parser.add_argument("--messages", type=int, default=20, help="messages per chat")
+    parser.add_argument("--recipes", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+    os.environ["FIRESTORE_BACKEND"] = "memory"
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# backend/benchmarks/fake_mealdb.py
+"""Local stand-in for TheMealDB's filter.php and lookup.php endpoints.
+
+    python -m benchmarks.fake_mealdb --port 8020 --latency 0.05
+    MEALDB_BASE_URL=http://127.0.0.1:8020/api/json/v1/1 uvicorn app.main:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer as _ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INGREDIENTS = [
+    "chicken", "rice", "onion", "garlic", "tomato", "paneer", "butter",
+    "potato", "spinach", "lentils", "ginger", "cumin", "yogurt", "egg",
+    "beef", "pasta", "cheese", "mushroom", "pepper", "coconut milk",
+]
+
+
+def make_meals(count: int = 500, seed: int = 0) -> dict:
+    """Generate a reproducible catalog of fake meals keyed by idMeal."""
+    rng = random.Random(seed)
+    meals = {}
+    for i in range(count):
+        meal_id = str(52000 + i)
+        meal = {"idMeal": meal_id, "strMeal": f"Fake Meal {i}", "strCategory": "Miscellaneous",
+                "strMealThumb": f"https://example.com/{meal_id}.jpg", "strInstructions": "Cook it."}
+        for n, ingredient in enumerate(rng.sample(INGREDIENTS, rng.randint(3, 8)), start=1):
+            meal[f"strIngredient{n}"] = ingredient
+            meal[f"strMeasure{n}"] = "1 cup"
+        meals[meal_id] = meal
+    return meals
+
+
+class FakeMealDBConfig:
+    def __init__(self, latency: float = 0.0, meals: dict = None, status: int = 200):
+        self.latency = latency
+        self.meals = meals or make_meals()
+        self.status = status  # anything but 200 answers every request with that error
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+
+class ThreadingHTTPServer(_ThreadingHTTPServer):
+    # The stdlib default backlog of 5 drops connections under benchmark load
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def make_handler(config: FakeMealDBConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            with config.lock:
+                config.requests += 1
+                config.in_flight += 1
+                config.max_in_flight = max(config.max_in_flight, config.in_flight)
+            try:
+                self._answer()
+            finally:
+                with config.lock:
+                    config.in_flight -= 1
+
+        def _answer(self):
+            if config.latency:
+                time.sleep(config.latency)
+            if config.status != 200:
+                body = b"Service Unavailable"
+                self.send_response(config.status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            url = urlparse(self.path)
+            query = parse_qs(url.query).get("i", [""])[0].lower()
+            if url.path.endswith("/filter.php"):
+                meals = [
+                    {"idMeal": m["idMeal"], "strMeal": m["strMeal"], "strMealThumb": m["strMealThumb"]}
+                    for m in config.meals.values()
+                    if query in (m.get(f"strIngredient{n}", "") for n in range(1, 21))
+                ]
+            elif url.path.endswith("/lookup.php"):
+                meals = [config.meals[query]] if query in config.meals else []
+            else:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps({"meals": meals or None}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def start_server(config: FakeMealDBConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Start the fake server on a background thread and return it."""
+    server = ThreadingHTTPServer((host, port), make_handler(config or FakeMealDBConfig()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake TheMealDB server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8020)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--meals", type=int, default=500)
+    args = parser.parse_args()
+
+    config = FakeMealDBConfig(latency=args.latency, meals=make_meals(args.meals))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Fake TheMealDB listening on http://{args.host}:{args.port}/api/json/v1/1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# backend/benchmarks/fake_openai.py
+"""Local stand-in for the OpenAI chat completions API.
+
+Run it and point the backend at it:
+
+    python -m benchmarks.fake_openai --port 8010 --latency 0.2 --tokens-per-sec 50
+    OPENAI_BASE_URL=http://127.0.0.1:8010/v1 OPENAI_API_KEY=test uvicorn app.main:app
+
+Both plain and streamed (SSE) completions are supported, plus embeddings
+(deterministic vectors derived from the input text). The reply is a
+canned markdown recipe, so markdown cleaning is exercised too. With
+--rpm-limit the server rate limits like OpenAI does, answering 429 with
+retry-after headers once the requests of the last second exceed rpm/60.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer as _ThreadingHTTPServer
+
+DEFAULT_REPLY = """Here's a quick **Paneer Butter Masala** you can make tonight!
+
+📝 Ingredients
+• 250 g paneer, cubed
+• 2 tbsp _butter_
+• 1 cup tomato puree
+
+👨‍🍳 Instructions
+1. Melt the butter and add the tomato puree.
+2. Simmer for 10 minutes, then add the `paneer`.
+
+💡 Tips & Notes
+• See [this guide](https://example.com) for a richer gravy."""
+
+
+def _tokens(text: str):
+    # Roughly word-sized pieces that keep their whitespace, like real deltas
+    piece = ""
+    for ch in text:
+        piece += ch
+        if ch in " \n":
+            yield piece
+            piece = ""
+    if piece:
+        yield piece
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency: float = 0.0, tokens_per_sec: float = 0.0, reply: str = DEFAULT_REPLY,
+                 rpm_limit: int = 0, fail_after: int = 0):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.reply = reply
+        self.rpm_limit = rpm_limit
+        self.fail_after = fail_after  # drop streams after this many tokens (0 = never)
+        self.requests = 0
+        self.rate_limited = 0
+        self.recent = deque()
+        self.lock = threading.Lock()
+
+    def admit(self) -> float:
+        """Count a request; returns 0 if allowed, else seconds to retry after."""
+        with self.lock:
+            self.requests += 1
+            if not self.rpm_limit:
+                return 0.0
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] >= 1.0:
+                self.recent.popleft()
+            if len(self.recent) >= max(1, self.rpm_limit // 60):
+                self.rate_limited += 1
+                return 1.0 - (now - self.recent[0])
+            self.recent.append(now)
+            return 0.0
+
+
+class ThreadingHTTPServer(_ThreadingHTTPServer):
+    # The stdlib default backlog of 5 drops connections under benchmark load
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def make_handler(config: FakeOpenAIConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.endswith("/embeddings"):
+                self._embed(request)
+                return
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            retry_after = config.admit()
+            if retry_after:
+                self._send_json(429, {"error": {
+                    "message": "Rate limit reached for requests",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }}, {"retry-after-ms": str(int(retry_after * 1000)), "retry-after": f"{retry_after:.3f}"})
+                return
+            if config.latency:
+                time.sleep(config.latency)
+            if request.get("stream"):
+                self._stream(request)
+            else:
+                self._complete(request)
+
+        def _embed(self, request: dict):
+            inputs = request.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            dim = request.get("dimensions") or 1536
+            data = []
+            for i, text in enumerate(inputs):
+                rng = random.Random(hashlib.sha256(str(text).encode()).digest())
+                data.append({"object": "embedding", "index": i,
+                             "embedding": [rng.uniform(-1, 1) for _ in range(dim)]})
+            self._send_json(200, {"object": "list", "data": data, "model": request.get("model"),
+                                  "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+
+        def _complete(self, request: dict):
+            tokens = list(_tokens(config.reply))
+            if config.tokens_per_sec:
+                time.sleep(len(tokens) / config.tokens_per_sec)
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": config.reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+            })
+
+        def _stream(self, request: dict):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            delay = 1 / config.tokens_per_sec if config.tokens_per_sec else 0
+
+            def send(payload):
+                data = f"data: {payload}\n\n".encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            for sent, token in enumerate(_tokens(config.reply)):
+                if config.fail_after and sent == config.fail_after:
+                    # Hang up mid-reply, without the terminating chunk
+                    self.close_connection = True
+                    return
+                if delay:
+                    time.sleep(delay)
+                send(json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "gpt-4o-mini"),
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }))
+            send(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def start_server(config: FakeOpenAIConfig = None, host: str = "127.0.0.1", port: int = 0):
+    """Start the fake server on a background thread and return it.
+
+    The bound address is ``server.server_address``; call ``server.shutdown()``
+    when done.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config or FakeOpenAIConfig()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="0 streams as fast as possible")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="answer 429 above this many requests/min")
+    parser.add_argument("--fail-after", type=int, default=0, help="drop streams after this many tokens")
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(latency=args.latency, tokens_per_sec=args.tokens_per_sec, rpm_limit=args.rpm_limit,
+                              fail_after=args.fail_after)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Fake OpenAI listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
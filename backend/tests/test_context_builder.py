@@ -0,0 +1,67 @@
+# backend/tests/test_context_builder.py
+import datetime
+
+from app.services import context_builder
+from app.services.context_builder import HISTORY_TOKEN_BUDGET, build_context, count_tokens
+
+START = datetime.datetime(2024, 1, 1)
+
+
+def turns(count: int, start: int = 0):
+    """`count` user/assistant pairs, each reply long enough to fill the budget in a few turns."""
+    reply = "Here is a recipe you could try tonight. " * 40
+    messages = []
+    for i in range(start, start + count):
+        at = START + datetime.timedelta(minutes=i)
+        messages.append({"role": "user", "content": f"Question {i}", "timestamp": at})
+        messages.append({"role": "assistant", "content": f"Dish {i}\n{reply}",
+                         "timestamp": at + datetime.timedelta(seconds=1)})
+    return messages
+
+
+def test_overflow_is_summarized_not_dropped():
+    history = turns(12)
+    messages, usage = build_context("system", "next", history, chat_key=("u", "overflow"))
+    assert usage["summarized_messages"] > 0
+    assert messages[0]["content"] == "system"
+    assert messages[1]["role"] == "system" and "User: Question 0" in messages[1]["content"]
+    assert usage["history"] <= HISTORY_TOKEN_BUDGET
+
+
+def test_summary_is_stable_until_the_next_fold():
+    key = ("u", "rolling")
+    history = turns(12)
+    first, _ = build_context("system", "next", history, chat_key=key)
+    history += turns(1, start=12)
+    second, usage = build_context("system", "next", history, chat_key=key)
+    # The new turn is appended to the history; the prefix is unchanged
+    assert second[:len(first) - 1] == first[:-1]
+    assert usage["summarized_messages"] > 0
+
+
+def test_folded_turns_outside_the_window_keep_their_summary():
+    key = ("u", "window")
+    history = turns(12)
+    build_context("system", "next", history, chat_key=key)
+    summary = context_builder._summaries.get(key)[1]
+    # The fetch window slid past the oldest folded turns
+    messages, _ = build_context("system", "next", history[6:], chat_key=key)
+    assert messages[1]["content"] == context_builder._summary_text(summary)
+
+
+def test_summary_stays_in_budget():
+    _, usage = build_context("system", "next", turns(200), chat_key=("u", "long"))
+    assert usage["summary"] <= context_builder.SUMMARY_TOKEN_BUDGET + count_tokens("Earlier in this conversation:")
+
+
+def test_naive_and_aware_histories_share_a_summary():
+    # Turns remembered in process are naive UTC; the same turns reloaded
+    # from Firestore are aware
+    key = ("u", "mixed-tz")
+    naive = turns(12)
+    aware = [{**m, "timestamp": m["timestamp"].replace(tzinfo=datetime.timezone.utc)} for m in naive]
+    first, _ = build_context("system", "next", naive, chat_key=key)
+    reloaded, _ = build_context("system", "next", aware, chat_key=key)
+    assert reloaded == first
+    again, _ = build_context("system", "next", naive + turns(1, start=12), chat_key=key)
+    assert again[1] == first[1]
@@ -0,0 +1,46 @@
+# backend/tests/test_conversation_service.py
+import asyncio
+import os
+
+os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+
+from app.services import conversation_service  # noqa: E402
+from app.services.conversation_service import (  # noqa: E402
+    get_recent_messages, queue_chat_message, save_chat_message, write_queue,
+)
+
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+
+def test_cold_load_includes_queued_turns(monkeypatch):
+    async def scenario():
+        await save_chat_message("carol", "c1", "first", "reply 1", first_turn=True)
+        # Pretend the background flusher is running so the next turn stays queued
+        monkeypatch.setattr(write_queue, "_task", object())
+        await queue_chat_message("carol", "c1", "second", "reply 2", first_turn=False)
+        conversation_service._recent_messages.clear()
+        try:
+            return await get_recent_messages("carol", "c1")
+        finally:
+            write_queue.discard("carol")
+
+    assert contents(asyncio.run(scenario())) == ["first", "reply 1", "second", "reply 2"]
+
+
+def test_cached_history_is_reloaded_after_the_ttl(monkeypatch):
+    async def scenario():
+        await save_chat_message("dave", "c1", "first", "reply 1", first_turn=True)
+        await get_recent_messages("dave", "c1")
+        # Another instance saves a turn that this one's cache never sees
+        entry = conversation_service._recent_messages.pop(("dave", "c1"))
+        await save_chat_message("dave", "c1", "elsewhere", "reply 2", first_turn=False)
+        conversation_service._recent_messages[("dave", "c1")] = entry
+        fresh = await get_recent_messages("dave", "c1")
+        monkeypatch.setattr(conversation_service, "RECENT_MESSAGES_TTL", 0)
+        return fresh, await get_recent_messages("dave", "c1")
+
+    fresh, expired = asyncio.run(scenario())
+    assert contents(fresh) == ["first", "reply 1"]
+    assert contents(expired) == ["first", "reply 1", "elsewhere", "reply 2"]
@@ -0,0 +1,92 @@
+# backend/tests/test_llm_gateway.py
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.services.llm_gateway import LLMGateway
+
+TPM = 60_000
+
+
+def gateway(**kwargs):
+    gw = LLMGateway(rpm=10 ** 6, tpm=TPM, base_delay=0.001, max_delay=0.001, **kwargs)
+    # No refill during the test, so the bucket shows exactly what was charged
+    gw.tokens.rate = 0
+    return gw
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://test"))
+
+
+def failing(times: int):
+    calls = {"n": 0}
+
+    async def factory():
+        calls["n"] += 1
+        if calls["n"] <= times:
+            raise connection_error()
+        return "reply"
+    return factory, calls
+
+
+def tokens_left(gw):
+    gw.tokens._refill()
+    return gw.tokens._tokens
+
+
+def test_retries_charge_tokens_once():
+    gw = gateway()
+    factory, calls = failing(2)
+    assert asyncio.run(gw.call("u", 1000, factory)) == "reply"
+    assert calls["n"] == 3
+    assert tokens_left(gw) == TPM - 1000
+
+
+def test_failed_call_refunds_its_charge():
+    gw = gateway(max_retries=2)
+    factory, _ = failing(10)
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(gw.call("u", 1000, factory))
+    assert tokens_left(gw) == TPM
+
+
+def test_non_retryable_failure_refunds_its_charge():
+    gw = gateway()
+
+    async def factory():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(gw.call("u", 1000, factory))
+    assert tokens_left(gw) == TPM
+
+
+def test_stream_retries_charge_once_and_refund_if_it_never_starts():
+    async def drain(gw, factory):
+        return [chunk async for chunk in gw.stream("u", 1000, factory)]
+
+    def stream_factory(fail_opens: int):
+        opens = {"n": 0}
+
+        async def factory():
+            opens["n"] += 1
+            if opens["n"] <= fail_opens:
+                raise connection_error()
+
+            async def chunks():
+                yield "a"
+                yield "b"
+            return chunks()
+        return factory
+
+    gw = gateway()
+    assert asyncio.run(drain(gw, stream_factory(2))) == ["a", "b"]
+    assert tokens_left(gw) == TPM - 1000
+
+    gw = gateway(max_retries=1)
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(drain(gw, stream_factory(5)))
+    assert tokens_left(gw) == TPM
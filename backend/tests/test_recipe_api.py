@@ -0,0 +1,116 @@
+# backend/tests/test_recipe_api.py
+import asyncio
+
+import pytest
+
+from app.services.recipe_api import MealDBClient
+from benchmarks.fake_mealdb import FakeMealDBConfig, start_server
+
+
+def meal(meal_id: str, name: str, *ingredients):
+    data = {"idMeal": meal_id, "strMeal": name, "strMealThumb": "", "strInstructions": "Cook it."}
+    for n, ingredient in enumerate(ingredients, start=1):
+        data[f"strIngredient{n}"] = ingredient
+    return data
+
+
+MEALS = {m["idMeal"]: m for m in [
+    meal("1", "Chicken Biryani", "chicken", "rice", "onion"),
+    meal("2", "Chicken Curry", "chicken", "onion"),
+    meal("3", "Jeera Rice", "rice", "cumin"),
+    meal("4", "Aloo Gobi", "potato", "cauliflower"),
+    meal("5", "Butter Chicken", "chicken", "butter", "onion"),
+]}
+
+
+@pytest.fixture
+def mealdb():
+    config = FakeMealDBConfig(meals=dict(MEALS))
+    server = start_server(config)
+    host, port = server.server_address
+    yield config, f"http://{host}:{port}/api/json/v1/1"
+    server.shutdown()
+
+
+def run(client: MealDBClient, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_meals_are_ranked_by_matched_ingredients(mealdb):
+    _, url = mealdb
+    client = MealDBClient(url)
+    meals = run(client, client.suggest_recipe_by_ingredients(["Chicken", "rice", "onion", " "]))
+    assert [(m["strMeal"], m["matchedIngredients"]) for m in meals] == [
+        ("Chicken Biryani", 3),
+        ("Butter Chicken", 2),  # ties are ordered by name
+        ("Chicken Curry", 2),
+        ("Jeera Rice", 1),
+    ]
+
+
+def test_limit_caps_detail_lookups(mealdb):
+    config, url = mealdb
+    client = MealDBClient(url)
+    meals = run(client, client.suggest_recipe_by_ingredients(["chicken", "onion"], limit=1))
+    assert [m["strMeal"] for m in meals] == ["Butter Chicken"]
+    assert config.requests == 2 + 1  # one filter per ingredient, one lookup
+
+
+def test_repeated_calls_are_served_from_cache(mealdb):
+    config, url = mealdb
+    client = MealDBClient(url)
+
+    async def twice():
+        first = await client.suggest_recipe_by_ingredients(["rice", "cumin"])
+        requests = config.requests
+        second = await client.suggest_recipe_by_ingredients(["cumin", "RICE"])
+        return first, second, requests
+
+    first, second, requests = run(client, twice())
+    assert second == first
+    assert config.requests == requests
+
+
+def test_concurrency_is_bounded(mealdb):
+    config, url = mealdb
+    config.latency = 0.05
+    config.meals.update({str(100 + i): meal(str(100 + i), f"Dal {i}", "lentils") for i in range(20)})
+    client = MealDBClient(url, max_concurrency=3)
+    meals = run(client, client.suggest_recipe_by_ingredients(["lentils"], limit=20))
+    assert len(meals) == 20
+    assert config.max_in_flight == 3
+
+
+def test_errors_and_empty_results(mealdb):
+    config, url = mealdb
+    client = MealDBClient(url)
+
+    async def calls():
+        empty = await client.suggest_recipe_by_ingredients(["saffron"])
+        missing = await client.get_meal_details("999")
+        config.status = 503
+        failed = await client.suggest_recipe_by_ingredients(["tofu"])
+        failed_lookup = await client.get_meal_details("4")
+        return empty, missing, failed, failed_lookup
+
+    assert run(client, calls()) == ([], None, [], None)
+
+
+def test_failed_filters_are_not_cached(mealdb):
+    config, url = mealdb
+    config.status = 503
+    client = MealDBClient(url)
+
+    async def calls():
+        failed = await client.search_meals_by_ingredient("rice")
+        config.status = 200
+        return failed, await client.search_meals_by_ingredient("rice")
+
+    failed, recovered = run(client, calls())
+    assert failed == []
+    assert {m["strMeal"] for m in recovered} == {"Chicken Biryani", "Jeera Rice"}
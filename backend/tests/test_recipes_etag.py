@@ -0,0 +1,33 @@
+# backend/tests/test_recipes_etag.py
+import os
+
+import pytest
+
+os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def get(client, if_none_match=None):
+    headers = {"If-None-Match": if_none_match} if if_none_match is not None else {}
+    return client.get("/recipes/", params={"limit": 2}, headers=headers)
+
+
+def test_matching_etags_get_304(client):
+    etag = get(client).headers["etag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', f' "other" ,W/{etag} ', "*"):
+        assert get(client, header).status_code == 304, header
+
+
+def test_partial_or_mangled_etags_get_200(client):
+    etag = get(client).headers["etag"]
+    tag = etag.strip('"')
+    for header in (tag, f'"{tag[:-1]}"', f'"x{tag}"', f"{etag}{etag}", f'"{tag}-gzip"', ""):
+        assert get(client, header).status_code == 200, header
@@ -0,0 +1,64 @@
+# backend/tests/test_response_cache.py
+import pytest
+
+from app.services.response_cache import DiskStore, MemoryStore, ResponseCache
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(MemoryStore(maxsize=100, ttl=60))
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("How to make Paneer Butter Masala?", "paneer butter masala recipe"),
+    ("chicken biryani recipe", "Recipe for chicken biryanis"),
+    ("paneer butter masala", "panner butter masala"),
+    ("masala dosa with chutney", "chutney with masala dosa"),
+])
+def test_rephrased_prompts_hit(cache, cached, asked):
+    cache.put(cached, None, "reply")
+    assert cache.get(asked) == "reply"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("chicken curry with onion", "chicken curry without onion"),
+    ("chicken curry without onion", "chicken curry with onion"),
+    ("gluten free brownies", "brownies"),
+    ("vegan lasagna", "vegetarian lasagna"),
+    ("chicken biryani", "mutton biryani"),
+    ("paneer tikka masala", "paneer tikka"),
+    ("beef curry", "beet curry"),
+    ("spicy chicken wings", "mild chicken wings"),
+    ("dal for 2 people", "dal for 4 people"),
+])
+def test_near_miss_prompts_do_not_hit(cache, cached, asked):
+    cache.put(cached, None, "reply")
+    assert cache.get(asked) is None
+
+
+def test_context_is_part_of_the_key(cache):
+    cache.put("paneer butter masala", None, "grounded", context=["Paneer doc A"])
+    assert cache.get("paneer butter masala") is None
+    assert cache.get("paneer butter masala", context=["Paneer doc B"]) is None
+    assert cache.get("paneer butter masala", context=["Paneer doc A"]) == "grounded"
+
+
+def test_semantic_matches_stay_within_their_context(cache):
+    cache.put("How to make Paneer Butter Masala?", None, "grounded", context=["index v1"])
+    assert cache.get("paneer butter masala recipe", context=["index v1"]) == "grounded"
+    assert cache.get("panner butter masala", context=["index v1"]) == "grounded"
+    assert cache.get("panner butter masala", context=["index v2"]) is None
+    assert cache.get("panner butter masala") is None
+    assert cache.get("paneer butter masala without butter", context=["index v1"]) is None
+
+
+def test_disk_hits_do_not_write_but_still_count_for_eviction(tmp_path):
+    store = DiskStore(str(tmp_path / "replies.sqlite3"), maxsize=2, ttl=60)
+    store.set("old", "1", "old", "")
+    store.set("new", "2", "new", "")
+    assert store.get("old") == "1"
+    assert not store._conn.in_transaction
+    # The hit on "old" is recorded by this set, so "new" is the one evicted
+    store.set("third", "3", "third", "")
+    assert store.get("old") == "1"
+    assert store.get("new") is None
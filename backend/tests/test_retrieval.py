@@ -0,0 +1,76 @@
+# backend/tests/test_retrieval.py
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.services import retrieval
+from app.services.response_cache import MemoryStore, ResponseCache
+
+DIM = 8
+
+
+def write_index(directory, model):
+    vectors = np.eye(3, DIM, dtype=np.float32)
+    np.save(os.path.join(directory, retrieval.VECTORS_FILE), vectors)
+    with open(os.path.join(directory, retrieval.META_FILE), "w", encoding="utf-8") as f:
+        for name in ("dal", "biryani", "kheer"):
+            f.write(json.dumps({"name": name, "category": "", "doc": f"{name} doc"}) + "\n")
+    if model is not None:
+        with open(os.path.join(directory, retrieval.INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({"embedder": "test", "model": model, "dim": DIM}, f)
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(retrieval, "INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(retrieval, "_index", None)
+    monkeypatch.setattr(retrieval, "_index_checked", False)
+    return tmp_path
+
+
+@pytest.fixture
+def query_vector(monkeypatch):
+    vector = {"value": None}
+
+    async def embed_query(text, dim, user_id=None):
+        return vector["value"]
+
+    monkeypatch.setattr(retrieval, "embed_query", embed_query)
+    return vector
+
+
+@pytest.mark.parametrize("model", [None, "mock"])
+def test_index_from_another_embedder_is_not_used(index_dir, model):
+    write_index(index_dir, model)
+    assert retrieval.get_index() is None
+    assert asyncio.run(retrieval.recipe_grounding("dal")) is None
+
+
+def test_unrelated_prompts_get_no_context(index_dir, query_vector):
+    write_index(index_dir, retrieval.EMBEDDING_MODEL)
+    grounding = asyncio.run(retrieval.recipe_grounding("dal"))
+
+    query_vector["value"] = np.array([1, 0.2, 0, 0, 0, 0, 0, 0], dtype=np.float32)
+    assert asyncio.run(grounding.documents()) == ["dal doc"]
+
+    query_vector["value"] = np.array([0, 0, 0, 1, 0, 0, 0, 0], dtype=np.float32)
+    assert asyncio.run(grounding.documents()) is None
+
+
+def test_cached_replies_skip_retrieval(index_dir, monkeypatch):
+    from app.services import llm
+
+    write_index(index_dir, retrieval.EMBEDDING_MODEL)
+    cache = ResponseCache(MemoryStore(100, 60))
+    monkeypatch.setattr(llm, "response_cache", cache)
+    grounding = asyncio.run(retrieval.recipe_grounding("dal"))
+    cache.put("dal", None, "cached dal", context=[grounding.key])
+
+    async def documents():
+        raise AssertionError("retrieval ran despite a cached reply")
+
+    grounding.documents = documents
+    assert asyncio.run(llm.ask_llm("dal", grounding=grounding)) == "cached dal"
@@ -0,0 +1,31 @@
+# backend/tests/test_users.py
+import os
+
+import pytest
+
+os.environ.setdefault("FIRESTORE_BACKEND", "memory")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.services.firestore_db import UserProfile  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_preferences_round_trip(client):
+    assert client.put("/users/alice/preferences", json={"diet": "veg"}).status_code == 200
+    assert client.put("/users/alice/preferences", json={"spice": "hot"}).status_code == 200
+    body = client.get("/users/me", params={"user_id": "alice"}).json()
+    assert body["preferences"] == {"diet": "veg", "spice": "hot"}
+
+
+def test_failed_preference_write_is_reported(client, monkeypatch):
+    async def broken_flush(self):
+        raise RuntimeError("firestore unavailable")
+
+    monkeypatch.setattr(UserProfile, "flush", broken_flush)
+    assert client.put("/users/bob/preferences", json={"diet": "veg"}).status_code == 500
@@ -3,47 +3,242 @@
 import os
 import csv
 import json
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np
 
 # Directory for saving embeddings
 EMBED_DIR = "data/embeddings"
-os.makedirs(EMBED_DIR, exist_ok=True)
+MANIFEST_FILE = "manifest.json"
+# Tells the backend which embedder made the vectors; it only uses an index
+# whose model matches the one it embeds queries with
+INFO_FILE = "recipe_index.json"
+EMBED_DIM = 768
 
 def embed_text(text):
     """
     Mock embedding function.
     Replace this with real LLM embeddings (OpenAI / HuggingFace etc.)
     """
-    # For demo, return a fixed-size random vector
-    return np.random.rand(768).tolist()
+    # For demo, return a fixed-size random vector, seeded by the text so
+    # re-runs produce the same embedding for the same recipe
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).random(EMBED_DIM, dtype=np.float32)
 
-def main():
-    csv_path = "data/recipes.csv"
-    embeddings = []
+def mock_embed_batch(texts):
+    return np.stack([embed_text(text) for text in texts])
+
+_openai_client = None
+
+def openai_embed_batch(texts):
+    global _openai_client
+    if _openai_client is None:
+        from openai import OpenAI
+        _openai_client = OpenAI()
+    response = _openai_client.embeddings.create(
+        model="text-embedding-3-small", input=list(texts), dimensions=EMBED_DIM
+    )
+    return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+# Batch embedders take a list of documents and return a (len, EMBED_DIM) array
+EMBEDDERS = {
+    "mock": mock_embed_batch,
+    "openai": openai_embed_batch,
+}
+EMBEDDER_MODELS = {
+    "mock": "mock",
+    "openai": "text-embedding-3-small",
+}
 
+def recipe_doc(row):
+    # Compose document text
+    return f"{row['name']}\nIngredients: {row['ingredients']}\nSteps: {row['steps']}"
+
+def embedding_id(embedder, dim=EMBED_DIM):
+    """What made a vector: the embedder, its model and the dimension."""
+    return {"embedder": embedder, "model": EMBEDDER_MODELS[embedder], "dim": dim}
+
+def content_hash(doc, category, made_by):
+    # A vector is stale if its text changed or a different embedding made it
+    source = f"{made_by['embedder']}\x00{made_by['model']}\x00{made_by['dim']}"
+    return hashlib.sha256(f"{source}\x00{category}\x00{doc}".encode("utf-8")).hexdigest()
+
+def read_chunks(csv_path, chunk_size):
+    """Yield lists of at most chunk_size CSV rows without loading the whole file."""
     # Open CSV with utf-8-sig to remove BOM automatically
     with open(csv_path, newline="", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
-        for row in reader:
-            # Compose document text
-            doc = f"{row['name']}\nIngredients: {row['ingredients']}\nSteps: {row['steps']}"
-
-            # Generate embedding
-            vector = embed_text(doc)
-
-            embeddings.append({
-                "name": row['name'],
-                "category": row.get("category", ""),
-                "doc": doc,
-                "embedding": vector
-            })
-
-    # Save embeddings to JSON
-    out_path = os.path.join(EMBED_DIR, "recipe_embeddings.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(embeddings, f, ensure_ascii=False, indent=2)
-
-    print(f"Saved {len(embeddings)} embeddings to {out_path}")
+        while True:
+            chunk = list(itertools.islice(reader, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+# ===================== Manifest =====================
+# manifest.json records the embedder, model and dimension of its vectors,
+# every shard written so far and, per recipe name, the content hash and
+# (shard, row) of its latest vector. It is rewritten atomically after each
+# shard, so an interrupted run resumes where it stopped. A run with a
+# different embedder starts the manifest over, re-embedding every recipe.
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"dim": EMBED_DIM, "shards": [], "rows": {}}
+
+def reset_manifest(out_dir, manifest, made_by):
+    """Drop every shard made by another embedder and start the manifest over."""
+    for shard in manifest["shards"]:
+        for ext in (".npy", ".jsonl"):
+            path = os.path.join(out_dir, shard["name"] + ext)
+            if os.path.exists(path):
+                os.remove(path)
+    return {**made_by, "shards": [], "rows": {}}
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+def write_shard(out_dir, manifest, vectors, meta):
+    """Append a new shard (vectors + metadata) and point the manifest at it."""
+    shard = len(manifest["shards"])
+    name = f"shard-{shard:05d}"
+    np.save(os.path.join(out_dir, name + ".npy"), vectors)
+    with open(os.path.join(out_dir, name + ".jsonl"), "w", encoding="utf-8") as f:
+        for item in meta:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    manifest["shards"].append({"name": name, "rows": len(meta)})
+    for row, item in enumerate(meta):
+        manifest["rows"][item["name"]] = {"hash": item["hash"], "shard": shard, "row": row}
+    save_manifest(out_dir, manifest)
+
+# ===================== Build =====================
+
+def build(csv_path, out_dir, embedder="mock", chunk_size=1000, batch_size=64, workers=4, use_processes=False):
+    """Embed new or changed recipes into shards and drop recipes no longer in
+    the CSV; returns (embedded, skipped, removed) counts.
+
+    `embedder` names one of EMBEDDERS. If the index was made by another
+    embedder, model or dimension, every recipe is embedded again.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    embed_batch = EMBEDDERS[embedder]
+    made_by = embedding_id(embedder)
+    manifest = load_manifest(out_dir)
+    if any(manifest.get(field) != value for field, value in made_by.items()):
+        manifest = reset_manifest(out_dir, manifest, made_by)
+        save_manifest(out_dir, manifest)
+    pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    seen, embedded, skipped = set(), 0, 0
+
+    with pool_cls(max_workers=workers) as pool:
+        for chunk in read_chunks(csv_path, chunk_size):
+            todo = []
+            for row in chunk:
+                doc = recipe_doc(row)
+                category = row.get("category", "")
+                digest = content_hash(doc, category, made_by)
+                seen.add(row["name"])
+                entry = manifest["rows"].get(row["name"])
+                if entry and entry["hash"] == digest:
+                    skipped += 1
+                    continue
+                todo.append({"name": row["name"], "category": category, "doc": doc, "hash": digest})
+            if not todo:
+                continue
+
+            batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+            results = pool.map(embed_batch, [[item["doc"] for item in batch] for batch in batches])
+            vectors = np.concatenate(list(results)).astype(np.float32, copy=False)
+            write_shard(out_dir, manifest, vectors, todo)
+            embedded += len(todo)
+
+    # Recipes that disappeared from the CSV drop out of the index
+    removed = [name for name in manifest["rows"] if name not in seen]
+    for name in removed:
+        del manifest["rows"][name]
+    if removed:
+        save_manifest(out_dir, manifest)
+    return embedded, skipped, len(removed)
+
+def write_info(out_dir, manifest):
+    path = os.path.join(out_dir, INFO_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({field: manifest.get(field) for field in ("embedder", "model", "dim")}, f)
+    os.replace(path + ".tmp", path)
+
+def compact(out_dir):
+    """Write the live rows of all shards into recipe_vectors.npy / recipe_meta.jsonl.
+
+    Rows are copied shard by shard into a memory-mapped output, so memory
+    stays bounded by one shard regardless of catalog size.
+    """
+    manifest = load_manifest(out_dir)
+    by_shard = {}
+    for entry in manifest["rows"].values():
+        by_shard.setdefault(entry["shard"], []).append(entry["row"])
+
+    vectors_path = os.path.join(out_dir, "recipe_vectors.npy")
+    meta_path = os.path.join(out_dir, "recipe_meta.jsonl")
+    total = len(manifest["rows"])
+    out = np.lib.format.open_memmap(vectors_path + ".tmp.npy", mode="w+", dtype=np.float32,
+                                    shape=(total, manifest["dim"]))
+    offset = 0
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as meta_out:
+        for shard in sorted(by_shard):
+            rows = sorted(by_shard[shard])
+            name = manifest["shards"][shard]["name"]
+            shard_vectors = np.load(os.path.join(out_dir, name + ".npy"), mmap_mode="r")
+            out[offset:offset + len(rows)] = shard_vectors[rows]
+            offset += len(rows)
+            wanted = set(rows)
+            with open(os.path.join(out_dir, name + ".jsonl"), encoding="utf-8") as f:
+                for row, line in enumerate(f):
+                    if row in wanted:
+                        item = json.loads(line)
+                        item.pop("hash", None)
+                        meta_out.write(json.dumps(item, ensure_ascii=False) + "\n")
+    out.flush()
+    del out
+    os.replace(vectors_path + ".tmp.npy", vectors_path)
+    os.replace(meta_path + ".tmp", meta_path)
+    write_info(out_dir, manifest)
+
+    # The IVF index describes the old matrix; the backend rebuilds it on load
+    ivf_path = os.path.join(out_dir, "recipe_ivf.npz")
+    if os.path.exists(ivf_path):
+        os.remove(ivf_path)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed recipes incrementally")
+    parser.add_argument("--csv", default="data/recipes.csv")
+    parser.add_argument("--out", default=EMBED_DIR)
+    parser.add_argument("--embedder", choices=sorted(EMBEDDERS), default="mock")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="CSV rows per shard")
+    parser.add_argument("--batch-size", type=int, default=64, help="documents per embedding call")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="use a process pool instead of threads")
+    args = parser.parse_args()
+
+    embedded, skipped, removed = build(
+        args.csv, args.out, args.embedder,
+        chunk_size=args.chunk_size, batch_size=args.batch_size,
+        workers=args.workers, use_processes=args.processes,
+    )
+    print(f"Embedded {embedded} recipes, {skipped} unchanged, {removed} removed")
+
+    if embedded or removed or not all(
+        os.path.exists(os.path.join(args.out, name)) for name in ("recipe_vectors.npy", INFO_FILE)
+    ):
+        total = compact(args.out)
+        print(f"Saved {total} embeddings to {os.path.join(args.out, 'recipe_vectors.npy')}")
 
 if __name__ == "__main__":
     main()